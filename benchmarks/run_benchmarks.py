@@ -0,0 +1,257 @@
+"""
+Benchmark harness for the simulation engine and the web endpoints.
+
+Runs locally without Redis: the simulation task is called in-process and the
+web benchmarks use the Flask test client against a temporary SQLite database
+seeded with stored results.
+
+    python benchmarks/run_benchmarks.py                      # full run
+    python benchmarks/run_benchmarks.py --quick              # smaller sizes
+    python benchmarks/run_benchmarks.py --compare old.json   # show ratios vs a previous run
+
+Results are written as JSON (default: benchmarks/results/<commit>.json) so runs
+from different commits can be compared.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from concurrent.futures import Future
+from datetime import datetime, UTC
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+STRATEGY_PATH = os.path.join(ROOT, 'blackjack_simulator', 'data', 'strategies', 'h17_basic_strategy.json')
+
+RULE_SETS = {
+    '6d_h17_das_ls': {
+        'deck_count': 6, 'dealer_stands_on_soft_17': False, 'blackjack_payout': 1.5,
+        'allow_late_surrender': True, 'allow_early_surrender': False, 'allow_resplit_to_hands': 4,
+        'allow_double_after_split': True, 'allow_double_on_any_two': True, 'reshuffle_penetration': 0.75,
+        'offer_insurance': False, 'dealer_checks_for_blackjack': True
+    },
+    '1d_s17_6to5': {
+        'deck_count': 1, 'dealer_stands_on_soft_17': True, 'blackjack_payout': 1.2,
+        'allow_late_surrender': False, 'allow_early_surrender': False, 'allow_resplit_to_hands': 2,
+        'allow_double_after_split': False, 'allow_double_on_any_two': False, 'reshuffle_penetration': 0.6,
+        'offer_insurance': False, 'dealer_checks_for_blackjack': True
+    },
+    '8d_enhc': {
+        'deck_count': 8, 'dealer_stands_on_soft_17': True, 'blackjack_payout': 1.5,
+        'allow_late_surrender': False, 'allow_early_surrender': False, 'allow_resplit_to_hands': 4,
+        'allow_double_after_split': True, 'allow_double_on_any_two': True, 'reshuffle_penetration': 0.8,
+        'offer_insurance': False, 'dealer_checks_for_blackjack': False
+    },
+}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_strategy():
+    with open(STRATEGY_PATH) as f:
+        data = json.load(f)
+    return {'hard': data['hard_totals'], 'soft': data['soft_totals'], 'pairs': data['pairs']}
+
+
+def simulation_config(rules, iterations, log_hands, hand_history_dir):
+    return {
+        'player': {'name': 'bench_player', 'bankroll': 10000},
+        'casino': {'name': 'bench_casino', 'rules': dict(rules)},
+        'playing_strategy_name': 'h17_basic_strategy',
+        'strategy': load_strategy(),
+        'betting_strategy': {'name': 'flat', 'min_bet': 10, 'bet_ramp': {'-100': 1}},
+        'iterations': iterations,
+        'log_hands': log_hands,
+        'hand_history_dir': hand_history_dir,
+        'simulation_id': 0,
+        'seed': 12345,
+    }
+
+
+def bench_engine(iteration_counts, log_hands_counts, repeat):
+    from blackjack_simulator.celery_worker import run_jost_simulation_task
+
+    results = []
+    with tempfile.TemporaryDirectory() as history_dir:
+        cases = [(name, n, False) for name in RULE_SETS for n in iteration_counts]
+        cases += [(name, n, True) for name in RULE_SETS for n in log_hands_counts]
+        for rule_name, iterations, log_hands in cases:
+            config = json.dumps(simulation_config(RULE_SETS[rule_name], iterations, log_hands, history_dir))
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run_jost_simulation_task.run(config)
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            results.append({
+                'rules': rule_name, 'iterations': iterations, 'log_hands': log_hands,
+                'best_seconds': best, 'median_seconds': statistics.median(timings),
+                'hands_per_second': iterations / best if best else None,
+            })
+            print(f"engine  {rule_name:15s} {iterations:>9,} log_hands={log_hands!s:5s} "
+                  f"{iterations / best:>14,.0f} hands/s")
+    return results
+
+
+def seed_results(db, count):
+    from blackjack_simulator.models import Player, Casino, PlayingStrategy, BettingStrategy, Simulation, Result
+
+    player = Player(name='bench_player', bankroll=10000, is_default=True)
+    casino = Casino(name='bench_casino', is_default=True, **{
+        k: v for k, v in RULE_SETS['6d_h17_das_ls'].items()
+    })
+    strategy = load_strategy()
+    playing = PlayingStrategy(name='bench_strategy', is_default=True,
+                              hard_total_actions=json.dumps(strategy['hard']),
+                              soft_total_actions=json.dumps(strategy['soft']),
+                              pair_splitting_actions=json.dumps(strategy['pairs']))
+    betting = BettingStrategy(name='bench_flat', is_default=True, min_bet=10, bet_ramp='{"-100": 1}')
+    db.session.add_all([player, casino, playing, betting])
+    sim = Simulation(title='bench', player=player, casino=casino, playing_strategy=playing,
+                     betting_strategy=betting, iterations=100000)
+    db.session.add(sim)
+    db.session.flush()
+
+    outcomes = json.dumps({'final_bankroll': 9500.0, 'net_gain_loss': -500.0, 'total_wagered': 1000000.0,
+                           'player_edge': -0.0005, 'player_win_rate': 0.43, 'rounds_played': 100000})
+    history = json.dumps([{'hand': i, 'net': 10} for i in range(200)])
+    db.session.add_all(
+        Result(simulation_id=sim.id, player_name='bench_player', casino_name='bench_casino',
+               strategy='bench_strategy', betting_strategy_name='bench_flat', starting_bankroll=10000,
+               iterations=100000, outcomes=outcomes, hand_history=history if i % 10 == 0 else None,
+               rounds_played=100000)
+        for i in range(count)
+    )
+    db.session.commit()
+    return sim
+
+
+def time_request(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+    return {'url': url, 'best_ms': min(timings) * 1000, 'median_ms': statistics.median(timings) * 1000}
+
+
+def bench_web(result_count, repeat):
+    from blackjack_simulator.app import create_app, db
+    from blackjack_simulator.config import TestingConfig
+    from blackjack_simulator.executors import LocalResult
+    from blackjack_simulator.models import Result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+            SIMULATION_EXECUTOR = 'local'
+            HAND_HISTORY_DIR = os.path.join(tmp, 'hand_histories')
+
+        app = create_app(config_class=BenchConfig)
+        results = []
+        with app.app_context():
+            db.create_all()
+            sim = seed_results(db, result_count)
+            client = app.test_client()
+            executor = app.extensions['simulation_executor']
+
+            result_id = db.session.query(Result.id).order_by(Result.id.desc()).first()[0]
+            results.append(dict(time_request(client, '/results', repeat), endpoint='results_list'))
+            results.append(dict(time_request(client, f'/results/{result_id}', repeat), endpoint='result_page'))
+
+            pending = Future()
+            executor._results['local-bench-pending'] = LocalResult('local-bench-pending', [pending], 10000)
+            results.append(dict(time_request(client, '/task_status/local-bench-pending', repeat),
+                                endpoint='task_status_pending'))
+
+            done = Future()
+            done.set_result({'bench_player': json.loads(db.session.get(Result, result_id).outcomes)})
+            executor._results['local-bench-done'] = LocalResult('local-bench-done', [done], 10000)
+            sim.task_id = 'local-bench-done'
+            db.session.commit()
+            results.append(dict(time_request(client, '/task_status/local-bench-done', repeat),
+                                endpoint='task_status_success'))
+            db.drop_all()
+
+    for r in results:
+        print(f"web     {r['endpoint']:22s} {r['median_ms']:>9.2f} ms median ({result_count:,} stored results)")
+    return results
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\n--- Compared with {previous.get('commit')} ({previous_path}) ---")
+    old_engine = {(r['rules'], r['iterations'], r['log_hands']): r for r in previous.get('engine', [])}
+    for r in current['engine']:
+        old = old_engine.get((r['rules'], r['iterations'], r['log_hands']))
+        if old and old['hands_per_second']:
+            print(f"engine  {r['rules']:15s} {r['iterations']:>9,} log_hands={r['log_hands']!s:5s} "
+                  f"x{r['hands_per_second'] / old['hands_per_second']:.2f} throughput")
+    old_web = {r['endpoint']: r for r in previous.get('web', [])}
+    for r in current['web']:
+        old = old_web.get(r['endpoint'])
+        if old:
+            print(f"web     {r['endpoint']:22s} x{r['median_ms'] / old['median_ms']:.2f} latency")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', default='10000,100000,1000000',
+                        help='comma-separated iteration counts for the engine benchmark')
+    parser.add_argument('--log-hands-iterations', default='1000,10000',
+                        help='comma-separated iteration counts for runs with log_hands on')
+    parser.add_argument('--results', type=int, default=5000, help='stored results to seed for the web benchmark')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='small sizes for a fast smoke run')
+    parser.add_argument('--skip-engine', action='store_true')
+    parser.add_argument('--skip-web', action='store_true')
+    parser.add_argument('--output', help='JSON output path (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='previous JSON output to compare against')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.iterations, args.log_hands_iterations, args.results = '10000,100000', '1000', 500
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(UTC).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'engine': [],
+        'web': [],
+    }
+    if not args.skip_engine:
+        report['engine'] = bench_engine([int(n) for n in args.iterations.split(',') if n],
+                                        [int(n) for n in args.log_hands_iterations.split(',') if n],
+                                        args.repeat)
+    if not args.skip_web:
+        report['web'] = bench_web(args.results, max(args.repeat, 5))
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved benchmark results to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
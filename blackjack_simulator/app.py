@@ -1,15 +1,23 @@
 
 import os
+import sys
 import json
+import time
 import click
 import logging
 from logging.handlers import RotatingFileHandler
 
-from flask import Flask
+from flask import Flask, current_app
 from flask.cli import with_appcontext
+from sqlalchemy import inspect, literal, text, Index
 
-from .models import db, Player, Casino, BettingStrategy, PlayingStrategy, Simulation
+from .models import db, Player, Casino, BettingStrategy, PlayingStrategy, Simulation, Result
 from .celery_worker import celery
+from .executors import create_executor
+from .results import store_task_result
+from .profiles import (read_directory, read_jsonl, import_profiles, export_profiles, jsonl_lines, write_directory,
+                       save_optimal_strategy, PROFILE_KINDS)
+from .shoe_pool import generate_shoe_pool, pool_path
 from .config import config
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -74,6 +82,45 @@ def init_db():
 
     db.session.commit()
 
+def upgrade_db():
+    """
+    Brings a database created by an older version up to the current models and
+    returns the `table.column` names it added.
+
+    `create_all` only creates missing tables, so columns added to existing
+    tables since are added here with ALTER TABLE, followed by their indexes
+    and unique constraints (as unique indexes, which SQLite can add in place).
+    Columns with a scalar default get it as the column default, so existing
+    rows read the same value new rows would.
+    """
+    db.create_all()
+    dialect = db.engine.dialect
+    existing = {name: {c['name'] for c in inspect(db.engine).get_columns(name)}
+                for name in inspect(db.engine).get_table_names()}
+    added = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            new_columns = [c for c in table.columns if c.name not in existing[table.name]]
+            for column in new_columns:
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}'
+                if column.default is not None and column.default.is_scalar:
+                    value = literal(column.default.arg, column.type).compile(
+                        dialect=dialect, compile_kwargs={'literal_binds': True})
+                    ddl += f' NOT NULL DEFAULT {value}' if not column.nullable else f' DEFAULT {value}'
+                connection.execute(text(ddl))
+                added.append(f'{table.name}.{column.name}')
+            if not new_columns:
+                continue
+            new_names = {c.name for c in new_columns}
+            for index in table.indexes:
+                if new_names & {c.name for c in index.columns}:
+                    index.create(connection, checkfirst=True)
+            for constraint in table.constraints:
+                names = [c.name for c in getattr(constraint, 'columns', ())]
+                if constraint.__visit_name__ == 'unique_constraint' and new_names & set(names):
+                    Index(f"uq_{table.name}_{'_'.join(names)}", *constraint.columns, unique=True).create(connection)
+    return added
+
 @click.command('init-db')
 @with_appcontext
 def init_db_command():
@@ -112,6 +159,113 @@ def check_db_command():
 
     click.echo("--- Check Complete ---")
 
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Add the tables and columns that newer versions need to an existing database."""
+    added = upgrade_db()
+    for name in added:
+        click.echo(f"  - Added column {name}")
+    click.echo(f'Database is up to date ({len(added)} columns added).')
+
+@click.command('backfill-result-metrics')
+@click.option('--batch-size', default=500, show_default=True, help='Rows updated per transaction.')
+@with_appcontext
+def backfill_result_metrics_command(batch_size):
+    """Fill the numeric metric columns of results stored before they existed."""
+    # Databases from before the metric columns need them added first
+    upgrade_db()
+    updated = 0
+    last_id = 0
+    while True:
+        batch = Result.query.filter(Result.player_edge.is_(None), Result.id > last_id) \
+            .order_by(Result.id).limit(batch_size).all()
+        if not batch:
+            break
+        for result in batch:
+            try:
+                result.set_metrics(json.loads(result.outcomes))
+                updated += 1
+            except (json.JSONDecodeError, TypeError, ValueError):
+                click.echo(f"  - Skipping result {result.id}: outcomes could not be parsed.")
+        last_id = batch[-1].id
+        db.session.commit()
+    click.echo(f'Backfilled metrics for {updated} results.')
+
+@click.command('import-profiles')
+@click.argument('source')
+@with_appcontext
+def import_profiles_command(source):
+    """Upsert profiles from a library directory, a .jsonl file, or '-' for JSONL on stdin."""
+    started = time.perf_counter()
+    try:
+        if source == '-':
+            summary = import_profiles(read_jsonl(sys.stdin))
+        elif os.path.isdir(source):
+            summary = import_profiles(read_directory(source))
+        else:
+            with open(source) as f:
+                summary = import_profiles(read_jsonl(f))
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e))
+    for kind, counts in summary.items():
+        click.echo(f"  - {kind}: {counts['created']} created, {counts['updated']} updated, "
+                   f"{counts['skipped']} default profiles left unchanged")
+    click.echo(f'Imported profiles in {time.perf_counter() - started:.3f}s.')
+
+@click.command('export-profiles')
+@click.argument('destination')
+@click.option('--kind', 'kinds', multiple=True, type=click.Choice(list(PROFILE_KINDS)),
+              help='Only export these kinds (repeatable).')
+@with_appcontext
+def export_profiles_command(destination, kinds):
+    """Dump profiles to a library directory, a .jsonl file, or '-' for JSONL on stdout."""
+    records = export_profiles(kinds)
+    if destination == '-':
+        for line in jsonl_lines(records):
+            sys.stdout.write(line)
+        return
+    if destination.endswith('.jsonl'):
+        with open(destination, 'w') as f:
+            f.writelines(jsonl_lines(records))
+        click.echo(f'Exported profiles to {destination}.')
+    else:
+        count = write_directory(destination, records)
+        click.echo(f'Exported {count} profiles to {destination}.')
+
+@click.command('optimal-strategy')
+@click.argument('casino')
+@click.option('--name', default=None, help='Name of the saved strategy (default: "<casino> Optimal Strategy").')
+@with_appcontext
+def optimal_strategy_command(casino, name):
+    """Save the EV-maximizing playing strategy for a casino (by name or id)."""
+    row = Casino.query.filter_by(name=casino).first()
+    if row is None and casino.isdigit():
+        row = db.session.get(Casino, int(casino))
+    if row is None:
+        raise click.ClickException(f"No casino named '{casino}'.")
+    try:
+        strategy, ev = save_optimal_strategy(row, name)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Saved playing strategy '{strategy.name}' (EV {ev:+.3%} per initial bet).")
+
+@click.command('generate-shoe-pool')
+@click.option('--decks', 'deck_count', default=6, show_default=True, help='Decks per shoe.')
+@click.option('--count', default=100000, show_default=True, help='Number of shoes in the pool.')
+@click.option('--seed', type=int, default=None, help='Seed for a reproducible pool.')
+@click.option('--output', default=None, help='Pool file (default: the shoes_<decks>d.npy file in SHOE_POOL_DIR).')
+@with_appcontext
+def generate_shoe_pool_command(deck_count, count, seed, output):
+    """Write a pool of pre-shuffled shoes for the workers to map."""
+    if output is None:
+        if not current_app.config.get('SHOE_POOL_DIR'):
+            raise click.ClickException('Set SHOE_POOL_DIR or pass --output.')
+        output = pool_path(current_app.config['SHOE_POOL_DIR'], deck_count)
+    started = time.perf_counter()
+    generate_shoe_pool(output, count, deck_count, seed)
+    click.echo(f'Wrote {count} shuffled {deck_count}-deck shoes to {output} in {time.perf_counter() - started:.1f}s.')
+
 def create_app(config_name='default', config_class=None):
     """
     Creates and configures a Flask application instance.
@@ -133,16 +287,39 @@ def create_app(config_name='default', config_class=None):
             broker_url=app.config['CELERY_BROKER_URL'],
             result_backend=app.config['CELERY_RESULT_BACKEND']
         )
+    def complete_local_task(task_id, results_data, simulation_config):
+        """Stores a finished local task; true once nothing needs the executor's copy of it."""
+        from .sweeps import complete_sweep_task
+        with app.app_context():
+            if simulation_config.get('sweep_id') is not None:
+                complete_sweep_task(simulation_config['sweep_id'], simulation_config['sweep_point_ids'], results_data)
+                return True
+            result, _ = store_task_result(task_id, results_data, simulation_config['simulation_id'])
+            return result is not None
+
+    app.extensions['simulation_executor'] = create_executor(
+        app.config.get('SIMULATION_EXECUTOR', 'celery'),
+        app.config.get('SIMULATION_LOCAL_WORKERS'),
+        on_complete=complete_local_task
+    )
 
     # --- Register Blueprints ---
     from .routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
     from .management import management_bp
     app.register_blueprint(management_bp)
+    from .sweeps import sweeps_bp
+    app.register_blueprint(sweeps_bp)
     
     # --- Register Commands ---
     app.cli.add_command(init_db_command)
     app.cli.add_command(check_db_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(backfill_result_metrics_command)
+    app.cli.add_command(import_profiles_command)
+    app.cli.add_command(export_profiles_command)
+    app.cli.add_command(optimal_strategy_command)
+    app.cli.add_command(generate_shoe_pool_command)
 
     # --- Configure Logging ---
     if not app.debug and not app.testing:
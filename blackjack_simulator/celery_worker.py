@@ -2,9 +2,14 @@
 import os
 import sys
 import json
+import uuid
+import random
 import logging
-from celery import Celery
+from contextlib import contextmanager
+from celery import Celery, chord, group
+from celery.utils import uuid as task_uuid
 from celery.signals import worker_ready
+from celery.exceptions import SoftTimeLimitExceeded
 
 # Configure a logger for the Celery worker
 # This will also capture logs from the jost_engine library
@@ -28,10 +33,25 @@ from jost_engine.simulation_logger import SimulationLogger
 from jost_engine.playing_strategy import BasicPlayingStrategy
 from jost_engine.betting_strategy import BettingStrategy as BettingStrategyABC
 
+from .simulation import (run_simulation, run_paired_simulation, run_table_simulation, merge_outcomes, shard_seeds,
+                         plan_shards, MAX_SEATS, BetRamp)
+from .counting import DEFAULT_COUNTING_SYSTEM
+from .hand_history import write_history, FILE_EXTENSION
+from .payloads import RESULT_SERIALIZER, register_result_serializer
+from .config import Config
+
 celery = Celery(
     'frontend.blackjack_simulator.celery_worker',
-    broker='redis://localhost:6379/0',
-    backend='redis://localhost:6379/0'
+    broker=Config.CELERY_BROKER_URL,
+    backend=Config.CELERY_RESULT_BACKEND
+)
+
+# Results (and the callbacks that receive them) use the binary format; task arguments stay JSON.
+register_result_serializer()
+celery.conf.update(
+    result_serializer=RESULT_SERIALIZER,
+    accept_content=['json', RESULT_SERIALIZER],
+    result_accept_content=['json', RESULT_SERIALIZER]
 )
 
 @worker_ready.connect
@@ -41,14 +61,138 @@ def log_registered_tasks(sender, **kwargs):
 class RampBettingStrategy(BettingStrategyABC):
     def __init__(self, min_bet: float, ramp: list):
         self.min_bet = min_bet
-        self.ramp = sorted(ramp, key=lambda x: x['count_threshold'], reverse=True)
+        # Compiled once into a true count -> bet lookup table
+        self.ramp = BetRamp(min_bet, ramp)
 
     def get_bet(self, player, game: 'Game') -> float:
-        true_count = game.get_true_count()
-        for tier in self.ramp:
-            if true_count >= tier['count_threshold']:
-                return self.min_bet * tier['bet_multiplier']
-        return self.min_bet
+        return self.ramp.bet(game.get_true_count())
+
+# The local executor shard running in this process, if any: its stop Event and where it reports progress
+_local_shard = {'stop': None, 'reports': None, 'index': None}
+
+@contextmanager
+def local_shard(stop=None, reports=None, index=None):
+    """
+    Runs a local executor shard in this process. Its progress reports are
+    written to `reports[index]` (a shared dict), and once `stop` (an Event) is
+    set, the next report ends the run with the rounds played so far, as a
+    stop key does for a Celery task (see `request_stop`).
+    """
+    _local_shard.update(stop=stop, reports=reports, index=index)
+    try:
+        yield
+    finally:
+        _local_shard.update(stop=None, reports=None, index=None)
+
+STOP_KEY_TTL = 24 * 60 * 60  # seconds a stop request outlives the task it names
+
+def stop_key(task_id):
+    """Result-backend key that asks the running task `task_id` to stop."""
+    return f"jost-stop-{task_id}"
+
+def request_stop(task_ids):
+    """
+    Asks running simulation tasks to stop at their next progress report; they
+    return the rounds played so far as a normal result. False on result
+    backends without a Redis client.
+    """
+    client = getattr(celery.backend, 'client', None)
+    if client is None:
+        return False
+    try:
+        for task_id in task_ids:
+            client.set(stop_key(task_id), 1, ex=STOP_KEY_TTL)
+    except Exception as e:
+        logging.warning(f"Could not request a stop of tasks {list(task_ids)}: {e}")
+        return False
+    return True
+
+def stop_requested(task_id):
+    client = getattr(celery.backend, 'client', None)
+    if client is None:
+        return False
+    try:
+        return bool(client.exists(stop_key(task_id)))
+    except Exception as e:
+        logging.warning(f"Could not check the stop request of task {task_id}: {e}")
+        return False
+
+def report_progress(progress):
+    """
+    Publishes a progress report as the running task's PROGRESS state, or as its
+    local shard's report. A requested stop ends the run here instead.
+    """
+    stop = _local_shard['stop']
+    if stop is not None and stop.is_set():
+        raise SoftTimeLimitExceeded()
+    if _local_shard['reports'] is not None:
+        _local_shard['reports'][_local_shard['index']] = progress
+    task_id = run_jost_simulation_task.request.id
+    if task_id:
+        if stop_requested(task_id):
+            raise SoftTimeLimitExceeded()
+        run_jost_simulation_task.update_state(state='PROGRESS', meta=progress)
+
+def table_seats(simulation_config):
+    """
+    The seats of a simulation config in seat order: the config's own player,
+    strategy and betting strategy first, then its `seats` list. Players seated
+    more than once get their seat number appended to their name, since results
+    are keyed by player name.
+    """
+    seats = [{
+        'player': dict(simulation_config['player']),
+        'playing_strategy_name': simulation_config['playing_strategy_name'],
+        'strategy': simulation_config['strategy'],
+        'strategy_hash': simulation_config.get('strategy_hash'),
+        'betting_strategy': simulation_config['betting_strategy'],
+    }]
+    seats += [dict(seat, player=dict(seat['player'])) for seat in simulation_config.get('seats') or []]
+    if len(seats) > MAX_SEATS:
+        raise ValueError(f'A table has at most {MAX_SEATS} seats.')
+    names = [seat['player'].get('name') for seat in seats]
+    for number, seat in enumerate(seats, start=1):
+        if names.count(seat['player'].get('name')) > 1:
+            seat['player']['name'] = f"{seat['player'].get('name')} (seat {number})"
+    return seats
+
+def build_player(seat, player_id):
+    """Builds the jost_engine Player for one seat of a simulation config."""
+    strategy_config = seat['strategy']
+    strategy_data = {
+        "name": seat['playing_strategy_name'],
+        "description": strategy_config.get("description", "Strategy loaded from frontend"),
+        "strategy": {
+            "hard": strategy_config.get("hard", {}),
+            "soft": strategy_config.get("soft", {}),
+            "pairs": strategy_config.get("pairs", {})
+        }
+    }
+
+    playing_strategy = BasicPlayingStrategy(
+        strategy_data=strategy_data,
+        strategy_name=seat['playing_strategy_name']
+    )
+
+    betting_strategy_details = seat['betting_strategy']
+    bet_ramp_dict = betting_strategy_details.get("bet_ramp", {})
+    bet_ramp_list = [
+        {'count_threshold': int(k), 'bet_multiplier': v}
+        for k, v in bet_ramp_dict.items()
+    ]
+
+    betting_strategy = RampBettingStrategy(
+        min_bet=betting_strategy_details.get("min_bet", 10),
+        ramp=bet_ramp_list
+    )
+
+    return Player(
+        player_id=player_id,
+        name=seat['player'].get("name"),
+        bankroll=seat['player'].get("bankroll"),
+        playing_strategy=playing_strategy,
+        betting_strategy=betting_strategy
+    )
 
 @celery.task(name='jost_simulation_task')
 def run_jost_simulation_task(simulation_config):
@@ -73,39 +217,77 @@ def run_jost_simulation_task(simulation_config):
             logging.error(f"Incomplete simulation configuration received: {simulation_config}")
             return {"error": "Incomplete simulation configuration."}
 
-        strategy_data = {
-            "name": playing_strategy_name,
-            "description": strategy_config.get("description", "Strategy loaded from frontend"),
-            "strategy": {
-                "hard": strategy_config.get("hard", {}),
-                "soft": strategy_config.get("soft", {}),
-                "pairs": strategy_config.get("pairs", {})
-            }
-        }
-        
-        playing_strategy = BasicPlayingStrategy(
-            strategy_data=strategy_data,
-            strategy_name=playing_strategy_name
-        )
-        
-        bet_ramp_dict = betting_strategy_details.get("bet_ramp", {})
-        bet_ramp_list = [
-            {'count_threshold': int(k), 'bet_multiplier': v}
-            for k, v in bet_ramp_dict.items()
-        ]
-        
-        betting_strategy = RampBettingStrategy(
-            min_bet=betting_strategy_details.get("min_bet", 10),
-            ramp=bet_ramp_list
-        )
+        # --- FEATURE: Paired comparison; every configuration plays the same shoes ---
+        paired_configs = simulation_config.get('paired_configs')
+        if paired_configs:
+            logging.info(f"Running paired simulation of {len(paired_configs)} configurations for {iterations} rounds.")
+            outcomes = run_paired_simulation(
+                bankroll=player_details.get("bankroll"),
+                iterations=iterations,
+                configs=paired_configs,
+                seed=simulation_config.get("seed"),
+                shoe_pool=simulation_config.get("shoe_pool"),
+                progress_callback=report_progress,
+                stop_exceptions=(SoftTimeLimitExceeded,)
+            )
+            logging.info("--- Jost Simulation Task Finished ---")
+            return {'paired': outcomes}
 
-        player = Player(
-            player_id=1,
-            name=player_details.get("name"),
-            bankroll=player_details.get("bankroll"),
-            playing_strategy=playing_strategy,
-            betting_strategy=betting_strategy
-        )
+        # --- FEATURE: Several players at one table; the config's own player takes the first seat ---
+        seats = table_seats(simulation_config)
+
+        # --- FEATURE: Batched NumPy engine when no hand history is requested ---
+        if not simulation_config.get('log_hands', False) and len(seats) > 1:
+            logging.info(f"Running vectorized simulation of {len(seats)} seats for {iterations} rounds.")
+            outcomes = run_table_simulation(
+                iterations=iterations,
+                rules=casino_config['rules'],
+                seats=[{
+                    'bankroll': seat['player'].get('bankroll'),
+                    'strategy': seat['strategy'],
+                    'strategy_hash': seat.get('strategy_hash'),
+                    'min_bet': seat['betting_strategy'].get('min_bet', 10),
+                    'bet_ramp': seat['betting_strategy'].get('bet_ramp', {}),
+                    'counting_system': seat['betting_strategy'].get('counting_system'),
+                } for seat in seats],
+                seed=simulation_config.get("seed"),
+                shoe_pool=simulation_config.get("shoe_pool"),
+                progress_callback=report_progress,
+                stop_exceptions=(SoftTimeLimitExceeded,),
+                target_std_error=simulation_config.get("target_std_error"),
+                hand_capture=simulation_config.get("hand_capture")
+            )
+            logging.info("--- Jost Simulation Task Finished ---")
+            return {seat['player']['name']: seat_outcomes for seat, seat_outcomes in zip(seats, outcomes)}
+
+        if not simulation_config.get('log_hands', False):
+            logging.info(f"Running vectorized simulation for {iterations} rounds.")
+            outcomes = run_simulation(
+                bankroll=player_details.get("bankroll"),
+                iterations=iterations,
+                rules=casino_config['rules'],
+                strategy=strategy_config,
+                min_bet=betting_strategy_details.get("min_bet", 10),
+                bet_ramp=betting_strategy_details.get("bet_ramp", {}),
+                seed=simulation_config.get("seed"),
+                shoe_pool=simulation_config.get("shoe_pool"),
+                strategy_hash=simulation_config.get("strategy_hash"),
+                progress_callback=report_progress,
+                stop_exceptions=(SoftTimeLimitExceeded,),
+                target_std_error=simulation_config.get("target_std_error"),
+                counting_system=betting_strategy_details.get("counting_system"),
+                hand_capture=simulation_config.get("hand_capture")
+            )
+            logging.info("--- Jost Simulation Task Finished ---")
+            return {player_details.get("name"): outcomes}
+
+        # The game engine only keeps a Hi-Lo count for its bets
+        counting_systems = {seat['betting_strategy'].get('counting_system') or DEFAULT_COUNTING_SYSTEM for seat in seats}
+        if counting_systems != {DEFAULT_COUNTING_SYSTEM}:
+            logging.error(f"Hand-history runs cannot bet on {', '.join(sorted(counting_systems))} counts.")
+            return {"error": "Hand-history runs only support the Hi-Lo counting system."}
+
+        players = [build_player(seat, player_id) for player_id, seat in enumerate(seats, start=1)]
 
         dealer = Dealer()
         
@@ -114,17 +296,192 @@ def run_jost_simulation_task(simulation_config):
         game_config['log_hands'] = simulation_config.get('log_hands', False)
 
         game = Game(
-            players=[player],
+            players=players,
             dealer=dealer,
             config=game_config
         )
 
-        logging.info(f"Running simulation for {iterations} rounds.")
-        results = game.run_simulation(num_rounds=iterations)
+        # The game engine draws from the process-wide `random` generator; seed it so these runs replay too,
+        # and restore it afterwards so nothing else in the worker process inherits the seeded stream.
+        saved_random_state = random.getstate()
+        if simulation_config.get('seed') is not None:
+            random.seed(simulation_config['seed'])
+        try:
+            logging.info(f"Running simulation for {iterations} rounds.")
+            results = game.run_simulation(num_rounds=iterations)
+        finally:
+            random.setstate(saved_random_state)
+
+        # --- FEATURE: Write hand histories to disk instead of the result backend ---
+        hand_history_dir = simulation_config.get('hand_history_dir')
+        if hand_history_dir:
+            for outcomes in results.values():
+                history = outcomes.pop('hand_history', None) if isinstance(outcomes, dict) else None
+                if history:
+                    path = os.path.join(
+                        hand_history_dir,
+                        f"sim{simulation_config.get('simulation_id')}_{uuid.uuid4().hex}{FILE_EXTENSION}"
+                    )
+                    index = write_history(path, history)
+                    outcomes['hand_history_file'] = {'path': path, 'index': index, 'count': len(history)}
+                    logging.info(f"Wrote {len(history)} hand records to {path}")
 
         logging.info("--- Jost Simulation Task Finished ---")
-        return json.loads(json.dumps(results, default=str))
+        # Encoded once by the result serializer; values it cannot pack travel as strings.
+        return results
 
     except Exception as e:
         logging.error(f"An unexpected error occurred in the Jost simulation task: {e}", exc_info=True)
         raise
+
+def merge_shard_results(shard_results, starting_bankroll, seat_bankrolls=None):
+    """
+    Merges per-shard task results ({player_name: outcomes}, one entry per seat)
+    into one task result. `seat_bankrolls` gives each seat's starting bankroll
+    in seat order; without it every seat starts with `starting_bankroll`.
+    """
+    errors = [r for r in shard_results if not isinstance(r, dict) or 'error' in r]
+    if errors:
+        logging.error(f"Simulation shard failed: {errors[0]}")
+        return errors[0]
+
+    bankrolls = seat_bankrolls or [starting_bankroll] * len(shard_results[0])
+    return {player_name: merge_outcomes([r[player_name] for r in shard_results], bankroll)
+            for player_name, bankroll in zip(shard_results[0], bankrolls)}
+
+@celery.task(name='jost_merge_shards_task')
+def merge_simulation_shards_task(shard_results, starting_bankroll, seat_bankrolls=None):
+    """Chord callback: merges the per-shard outcome dicts into one result per seat."""
+    logging.info(f"--- Merging {len(shard_results)} simulation shards ---")
+    return merge_shard_results(shard_results, starting_bankroll, seat_bankrolls)
+
+_flask_app = None
+
+def flask_app():
+    """The Flask app the worker uses for database access, created on first use."""
+    global _flask_app
+    if _flask_app is None:
+        from .app import create_app
+        _flask_app = create_app(os.environ.get('FLASK_CONFIG', 'default'))
+    return _flask_app
+
+def task_events_channel(task_id):
+    """Redis channel on which the result-store hook announces a stored Result to status streams."""
+    return f"jost-task-events-{task_id}"
+
+def publish_task_event(task_id):
+    """Wakes the status streams watching `task_id`; a no-op on result backends without pub/sub."""
+    client = getattr(celery.backend, 'client', None)
+    if client is None:
+        return
+    try:
+        client.publish(task_events_channel(task_id), 'stored')
+    except Exception as e:
+        logging.warning(f"Could not publish the stored event of task {task_id}: {e}")
+
+@celery.task(name='jost_store_result_task', bind=True, max_retries=3, default_retry_delay=5)
+def store_simulation_result_task(self, results_data, task_id, simulation_id):
+    """
+    Link callback of a simulation task (or of its chord's merge task): writes
+    the Result row on the worker, so the web process never handles the payload.
+    """
+    from .results import store_task_result
+    with flask_app().app_context():
+        try:
+            result, error = store_task_result(task_id, results_data, simulation_id)
+        except Exception as e:
+            logging.error(f"Storing the result of task {task_id} failed: {e}", exc_info=True)
+            raise self.retry(exc=e)
+    publish_task_event(task_id)
+    if error:
+        logging.error(f"Could not store the result of task {task_id}: {error}")
+        return None
+    return result.id
+
+@celery.task(name='jost_sweep_result_task', bind=True, max_retries=3, default_retry_delay=5)
+def store_sweep_result_task(self, results_data, sweep_id, point_ids):
+    """
+    Link callback of a sweep task: records the outcomes of its grid points and
+    submits the sweep's next pending points.
+    """
+    from .sweeps import complete_sweep_task
+    with flask_app().app_context():
+        try:
+            complete_sweep_task(sweep_id, point_ids, results_data)
+        except Exception as e:
+            logging.error(f"Completing sweep {sweep_id} points {point_ids} failed: {e}", exc_info=True)
+            raise self.retry(exc=e)
+
+@celery.task(name='jost_sweep_failure_task')
+def sweep_failure_task(failed_task_id, *, sweep_id, point_ids):
+    """Error callback of a sweep task: marks its grid points failed so the sweep moves on."""
+    from .sweeps import complete_sweep_task
+    with flask_app().app_context():
+        complete_sweep_task(sweep_id, point_ids, {"error": f"Simulation task {failed_task_id} failed."})
+
+def build_shard_configs(simulation_config, max_shards=1, min_rounds_per_shard=1):
+    """
+    Splits a simulation config into independently seeded shard configs.
+
+    Runs with hand logging, paired comparisons (which must share one shoe
+    sequence), or runs too small to be worth splitting, come back as a single
+    unchanged config.
+    """
+    shard_sizes = plan_shards(simulation_config['iterations'], max_shards, min_rounds_per_shard)
+    if simulation_config.get('log_hands') or simulation_config.get('paired_configs') or len(shard_sizes) == 1:
+        return [simulation_config]
+    seeds = shard_seeds(len(shard_sizes), simulation_config.get('seed'))
+    shard_configs = [dict(simulation_config, iterations=size, seed=seed) for size, seed in zip(shard_sizes, seeds)]
+    if simulation_config.get('target_std_error'):
+        # k equal shards at standard error s pool to s / sqrt(k)
+        for shard_config in shard_configs:
+            shard_config['target_std_error'] = simulation_config['target_std_error'] * len(shard_configs) ** 0.5
+    return shard_configs
+
+def seat_bankrolls(simulation_config):
+    """Starting bankroll of every seat, in seat order; None for single-seat runs."""
+    if not simulation_config.get('seats'):
+        return None
+    return [simulation_config['player']['bankroll']] + [seat['player']['bankroll'] for seat in simulation_config['seats']]
+
+def send_simulation(simulation_config, max_shards=1, min_rounds_per_shard=1):
+    """
+    Sends a simulation to the workers and returns the AsyncResult to poll.
+
+    Large runs execute as a chord of shards; the merge callback's result has
+    the same shape as a single `jost_simulation_task` result. Runs that belong
+    to a Simulation link `jost_store_result_task`, which stores the Result as
+    soon as the final task succeeds; sweep tasks link `jost_sweep_result_task`
+    (and `jost_sweep_failure_task` on errors), which schedule the sweep's next points.
+    """
+    task_id = task_uuid()
+    link = link_error = None
+    if simulation_config.get('simulation_id') is not None:
+        link = celery.signature('jost_store_result_task',
+                                kwargs={'task_id': task_id, 'simulation_id': simulation_config['simulation_id']},
+                                serializer=RESULT_SERIALIZER)
+    elif simulation_config.get('sweep_id') is not None:
+        sweep_point = {'sweep_id': simulation_config['sweep_id'], 'point_ids': simulation_config['sweep_point_ids']}
+        link = celery.signature('jost_sweep_result_task', kwargs=sweep_point, serializer=RESULT_SERIALIZER)
+        link_error = celery.signature('jost_sweep_failure_task', kwargs=sweep_point)
+
+    shard_configs = build_shard_configs(simulation_config, max_shards, min_rounds_per_shard)
+    if len(shard_configs) == 1:
+        return celery.send_task('jost_simulation_task', args=[json.dumps(shard_configs[0])],
+                                task_id=task_id, link=link, link_error=link_error)
+
+    header = group(
+        celery.signature('jost_simulation_task', args=[json.dumps(shard_config)])
+        for shard_config in shard_configs
+    )
+    callback = celery.signature('jost_merge_shards_task',
+                                kwargs={'starting_bankroll': simulation_config['player']['bankroll'],
+                                        'seat_bankrolls': seat_bankrolls(simulation_config)},
+                                serializer=RESULT_SERIALIZER)
+    callback.set(task_id=task_id)
+    if link is not None:
+        callback.link(link)
+    if link_error is not None:
+        callback.link_error(link_error)
+    logging.info(f"Dispatching simulation as {len(shard_configs)} shards.")
+    return chord(header)(callback)
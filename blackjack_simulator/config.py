@@ -15,6 +15,29 @@ class Config:
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
 
+    # Chunked hand-history files written by the workers
+    HAND_HISTORY_DIR = os.environ.get('HAND_HISTORY_DIR') or os.path.join(basedir, 'hand_histories')
+
+    # Pre-shuffled shoe pools (see `flask generate-shoe-pool`), one file per deck count; unset to shuffle in the workers
+    SHOE_POOL_DIR = os.environ.get('SHOE_POOL_DIR')
+
+    # Server-sent task events are pushed from the Redis result backend's pub/sub (or the local shards' futures).
+    # Minimum seconds between two reads of a woken stream, the first poll interval (doubling up to 15s)
+    # when there is nothing to subscribe to, and the stream lifetime before the browser reconnects.
+    # Each open stream holds a connection: run the app under a threaded or async server.
+    TASK_EVENTS_INTERVAL = float(os.environ.get('TASK_EVENTS_INTERVAL') or 1.0)
+    TASK_EVENTS_POLL_INTERVAL = float(os.environ.get('TASK_EVENTS_POLL_INTERVAL') or 3.0)
+    TASK_EVENTS_MAX_SECONDS = int(os.environ.get('TASK_EVENTS_MAX_SECONDS') or 300)
+
+    # Sharding: large runs are split across workers as a Celery chord
+    SIMULATION_MAX_SHARDS = int(os.environ.get('SIMULATION_MAX_SHARDS') or 8)
+    SIMULATION_MIN_SHARD_ROUNDS = int(os.environ.get('SIMULATION_MIN_SHARD_ROUNDS') or 100000)
+
+    # Executor: 'celery' (Redis broker), 'local' (process pool) or 'auto' (Celery, local fallback).
+    # Local tasks are tracked inside the web process: 'local' and 'auto' need a single-process server.
+    SIMULATION_EXECUTOR = os.environ.get('SIMULATION_EXECUTOR') or 'celery'
+    SIMULATION_LOCAL_WORKERS = int(os.environ.get('SIMULATION_LOCAL_WORKERS') or os.cpu_count() or 1)
+
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use in-memory SQLite database for tests
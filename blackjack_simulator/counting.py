@@ -0,0 +1,54 @@
+"""
+Card counting systems for count-based bet ramps.
+
+Each system is a per-rank weight array indexed by card value (2-10, 11 for
+aces, the engine's card encoding), so keeping a running count is one lookup
+and one add per card dealt. Balanced systems bet on the true count (running
+count per deck remaining); unbalanced ones such as KO bet on the running
+count itself, started at an initial count that depends on the number of decks.
+
+Betting strategies name their system in `BettingStrategy.counting_system`.
+"""
+import numpy as np
+
+DEFAULT_COUNTING_SYSTEM = 'hi_lo'
+
+
+class CountingSystem:
+    def __init__(self, key, name, weights, balanced=True, pivot=0):
+        self.key = key
+        self.name = name
+        self.weights = np.zeros(12, dtype=np.int8)
+        for card, weight in weights.items():
+            self.weights[card] = weight
+        self.balanced = balanced
+        self.pivot = pivot
+
+    def initial_count(self, deck_count):
+        """Running count at the start of a shoe. Unbalanced systems start low enough to end the shoe at `pivot`."""
+        if self.balanced:
+            return 0
+        return self.pivot - self.deck_total() * deck_count
+
+    def deck_total(self):
+        """Sum of the weights over one 52-card deck (zero for balanced systems)."""
+        ranks = np.arange(2, 12)
+        copies = np.where(ranks == 10, 16, 4)
+        return int((self.weights[ranks].astype(np.int64) * copies).sum())
+
+
+COUNTING_SYSTEMS = {system.key: system for system in (
+    CountingSystem('hi_lo', 'Hi-Lo', {2: 1, 3: 1, 4: 1, 5: 1, 6: 1, 10: -1, 11: -1}),
+    CountingSystem('ko', 'Knock-Out (KO)', {2: 1, 3: 1, 4: 1, 5: 1, 6: 1, 7: 1, 10: -1, 11: -1},
+                   balanced=False, pivot=4),
+    CountingSystem('omega_ii', 'Omega II', {2: 1, 3: 1, 4: 2, 5: 2, 6: 2, 7: 1, 9: -1, 10: -2}),
+    CountingSystem('zen', 'Zen Count', {2: 1, 3: 1, 4: 2, 5: 2, 6: 2, 7: 1, 10: -2, 11: -1}),
+)}
+
+
+def counting_system(key):
+    """Returns the `CountingSystem` named by `key` (None selects Hi-Lo); raises ValueError for unknown systems."""
+    system = COUNTING_SYSTEMS.get(key or DEFAULT_COUNTING_SYSTEM)
+    if system is None:
+        raise ValueError(f"Unknown counting system '{key}'. Choose one of: {', '.join(COUNTING_SYSTEMS)}.")
+    return system
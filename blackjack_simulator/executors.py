@@ -0,0 +1,368 @@
+"""
+Pluggable simulation executors.
+
+`CeleryExecutor` sends work to the Redis-backed Celery workers. `LocalExecutor`
+runs the same task function on a process pool inside the web process, for
+single-box deployments and benchmark machines without a broker. Both hand
+back objects that `task_status` can poll like a Celery `AsyncResult`, and
+both store a Simulation's Result as soon as its task finishes.
+
+Local tasks live in the memory of the web process that submitted them, so
+the local and auto executors need a single-process server (one worker,
+threads for concurrency); a status poll that reaches another process finds
+no such task.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from celery.result import GroupResult
+
+from .celery_worker import (celery, send_simulation, build_shard_configs, merge_shard_results, seat_bankrolls,
+                            task_events_channel, request_stop)
+from .simulation import merge_progress
+
+LOCAL_TASK_PREFIX = 'local-'
+
+
+def shard_task_ids(task):
+    """Returns the ids of a chord's shard tasks, or an empty list for a single task."""
+    parent = getattr(task, 'parent', None)
+    return [r.id for r in parent.results] if isinstance(parent, GroupResult) else []
+
+
+def finished_progress(task_result, total_rounds=None):
+    """Expresses a finished shard's outcomes as a progress report, so it can be merged with running ones."""
+    if not isinstance(task_result, dict) or not task_result or 'error' in task_result:
+        return None
+    # Every seat plays the same rounds; the first seat stands in for the table.
+    outcomes = list(task_result.values())[0]
+    rounds = outcomes.get('rounds_played', 0)
+    return {
+        'rounds_done': rounds, 'total_rounds': total_rounds or rounds, 'hands_per_second': 0.0,
+        'net_gain_loss': outcomes['net_gain_loss'], 'total_wagered': outcomes['total_wagered'],
+        'edge_std_error': outcomes.get('edge_std_error'),
+    }
+
+
+def _run_shard(simulation_config_json, stop=None, reports=None, index=None):
+    from .celery_worker import run_jost_simulation_task, local_shard
+    with local_shard(stop, reports, index):
+        return run_jost_simulation_task.run(simulation_config_json)
+
+
+class PubSubWatch:
+    """Wakes a status stream when something is published on one of `channels`."""
+    announces_store = True  # the result-store hook publishes once the Result exists
+
+    def __init__(self, pubsub, channels):
+        self.pubsub = pubsub
+        self.pubsub.subscribe(*channels)
+
+    def wait(self, timeout):
+        """Blocks until a message arrives or `timeout` seconds pass; True if one arrived. Drains any backlog."""
+        deadline = time.monotonic() + timeout
+        changed = False
+        while True:
+            remaining = 0.0 if changed else deadline - time.monotonic()
+            if remaining < 0:
+                return False
+            message = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                changed = True
+            elif changed:
+                return True
+
+    def close(self):
+        self.pubsub.close()
+
+
+class FutureWatch:
+    """Wakes a status stream when one of a local task's shards finishes."""
+    announces_store = False
+
+    def __init__(self, futures):
+        self.pending = set(futures)
+
+    def wait(self, timeout):
+        if not self.pending:
+            time.sleep(timeout)
+            return False
+        done, self.pending = wait(self.pending, timeout, return_when=FIRST_COMPLETED)
+        return bool(done)
+
+    def close(self):
+        self.pending = set()
+
+
+class LocalResult:
+    """A minimal `AsyncResult` stand-in backed by `concurrent.futures` futures."""
+
+    def __init__(self, task_id, futures=None, starting_bankroll=0, error=None, shard_sizes=None, seat_bankrolls=None,
+                 stop=None, reports=None):
+        self.id = task_id
+        self.futures = futures or []
+        self.stop = stop
+        self.reports = reports  # shard index -> latest progress report of a running shard
+        self.starting_bankroll = starting_bankroll
+        self.seat_bankrolls = seat_bankrolls
+        self.error = error
+        self.shard_sizes = shard_sizes or [None] * len(self.futures)
+
+    def _live(self):
+        return [f for f in self.futures if not f.cancelled()]
+
+    @property
+    def state(self):
+        if self.error is not None:
+            return 'FAILURE'
+        live = self._live()
+        if not live:
+            return 'REVOKED'
+        if any(f.done() and f.exception() is not None for f in live):
+            return 'FAILURE'
+        if all(f.done() for f in live):
+            return 'SUCCESS'
+        if any(f.running() or f.done() for f in live):
+            return 'STARTED'
+        return 'PENDING'
+
+    @property
+    def info(self):
+        if self.error is not None:
+            return self.error
+        for f in self._live():
+            if f.done() and f.exception() is not None:
+                return f.exception()
+        return None
+
+    def ready(self):
+        return self.state in ('SUCCESS', 'FAILURE', 'REVOKED')
+
+    def get(self, timeout=None):
+        if self.error is not None:
+            raise self.error
+        results = [f.result(timeout=timeout) for f in self._live()]
+        if len(results) == 1:
+            return results[0]
+        return merge_shard_results(results, self.starting_bankroll, self.seat_bankrolls)
+
+    def progress(self):
+        running = dict(self.reports or {})
+        reports = []
+        for index, (future, size) in enumerate(zip(self.futures, self.shard_sizes)):
+            if future.cancelled():
+                continue
+            if future.done() and future.exception() is None:
+                reports.append(finished_progress(future.result(), size))
+            elif index in running:
+                reports.append(running[index])
+            elif size:
+                reports.append({'rounds_done': 0, 'total_rounds': size, 'hands_per_second': 0.0,
+                                'net_gain_loss': 0.0, 'total_wagered': 0.0, 'edge_std_error': None})
+        return merge_progress(reports)
+
+    def cancel(self):
+        """
+        Cancels shards that have not started and sets the `stop` Event, which
+        ends running shards at their next progress report with the rounds
+        played so far. Hand-history runs report no progress and play to the end.
+        """
+        cancelled = sum(1 for f in self.futures if f.cancel())
+        running = self.stop is not None and any(not f.done() for f in self.futures)
+        if running:
+            self.stop.set()
+        return bool(cancelled or running)
+
+
+class CeleryExecutor:
+    name = 'celery'
+
+    def submit(self, simulation_config, max_shards=1, min_rounds_per_shard=1):
+        return send_simulation(simulation_config, max_shards, min_rounds_per_shard)
+
+    def result(self, task_id):
+        return celery.AsyncResult(task_id)
+
+    def progress(self, task, shard_ids=()):
+        """Merges the PROGRESS reports of a running task or of its chord shards."""
+        reports = []
+        for shard in ([celery.AsyncResult(i) for i in shard_ids] or [task]):
+            if shard.state == 'PROGRESS' and isinstance(shard.info, dict):
+                reports.append(shard.info)
+            elif shard.state == 'SUCCESS':
+                reports.append(finished_progress(shard.result))
+        return merge_progress(reports)
+
+    def watch(self, task_id, shard_ids=()):
+        """
+        A `PubSubWatch` on the Redis result backend's task-meta channels of the
+        task and its shards (published on every state and PROGRESS update) and
+        on the result-store hook's channel; None when the backend has no pub/sub.
+        """
+        backend = celery.backend
+        client = getattr(backend, 'client', None)
+        if client is None or not hasattr(backend, 'get_key_for_task'):
+            return None
+        channels = [backend.get_key_for_task(i) for i in (task_id, *shard_ids)] + [task_events_channel(task_id)]
+        try:
+            return PubSubWatch(client.pubsub(), channels)
+        except Exception as e:
+            logging.warning(f"Cannot subscribe to the events of task {task_id}: {e}")
+            return None
+
+    def abort(self, task_id, shard_ids=()):
+        """
+        Stops a running simulation cooperatively: each shard (or the single
+        task) finds its stop key at its next progress report and returns the
+        rounds played so far, so the task succeeds and a chord merges the
+        partial shards into a Result as usual. Hand-history runs report no
+        progress and play to the end.
+        """
+        return request_stop(list(shard_ids) or [task_id])
+
+
+class LocalExecutor:
+    name = 'local'
+
+    def __init__(self, max_workers=None, on_complete=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.on_complete = on_complete
+        self._pool = None
+        self._manager = None
+        self._results = {}
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    @property
+    def manager(self):
+        """Serves the stop Events and progress dicts the pool's processes share with this one."""
+        if self._manager is None:
+            self._manager = multiprocessing.Manager()
+        return self._manager
+
+    def submit(self, simulation_config, max_shards=1, min_rounds_per_shard=1):
+        # Shard at least as wide as the local pool so every core gets work.
+        shard_configs = build_shard_configs(simulation_config, max(max_shards, self.max_workers),
+                                            min_rounds_per_shard)
+        stop, reports = self.manager.Event(), self.manager.dict()
+        futures = [self.pool.submit(_run_shard, json.dumps(shard_config), stop, reports, index)
+                   for index, shard_config in enumerate(shard_configs)]
+        task_id = f"{LOCAL_TASK_PREFIX}{uuid.uuid4()}"
+        self._results[task_id] = LocalResult(task_id, futures, simulation_config['player']['bankroll'],
+                                             shard_sizes=[c['iterations'] for c in shard_configs],
+                                             seat_bankrolls=seat_bankrolls(simulation_config), stop=stop,
+                                             reports=reports)
+        if self.on_complete and (simulation_config.get('simulation_id') is not None
+                                 or simulation_config.get('sweep_id') is not None):
+            self._call_on_complete(self._results[task_id], simulation_config)
+        logging.info(f"Submitted {len(futures)} local shard(s) as task {task_id}")
+        return self._results[task_id]
+
+    def _call_on_complete(self, task, simulation_config):
+        """
+        Calls `on_complete(task_id, results, simulation_config)` once every shard
+        of a task is done; a failed task reports `{"error": ...}` as its results.
+        Once the hook has stored the results (it returns true), the task is
+        forgotten; otherwise it stays, so status polls can still report or
+        store it.
+        """
+        remaining = [len(task.futures)]
+        lock = threading.Lock()
+
+        def shard_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            results = task.get() if task.state == 'SUCCESS' else {"error": str(task.info or task.state)}
+            try:
+                stored = self.on_complete(task.id, results, simulation_config)
+            except Exception as e:
+                logging.error(f"Completing local task {task.id} failed: {e}", exc_info=True)
+                return
+            if stored:
+                self.forget(task.id)
+
+        for future in task.futures:
+            future.add_done_callback(shard_done)
+
+    def result(self, task_id):
+        if task_id not in self._results:
+            return LocalResult(task_id, error=LookupError(
+                f"Unknown local task {task_id}; was the server restarted, or is it running more than one process?"))
+        return self._results[task_id]
+
+    def progress(self, task, shard_ids=()):
+        return task.progress() if isinstance(task, LocalResult) else None
+
+    def watch(self, task_id, shard_ids=()):
+        task = self._results.get(task_id)
+        return FutureWatch(task.futures) if task else None
+
+    def abort(self, task_id, shard_ids=()):
+        task = self._results.get(task_id)
+        return bool(task and task.cancel())
+
+    def forget(self, task_id):
+        self._results.pop(task_id, None)
+
+
+class AutoExecutor:
+    """Uses Celery when a broker is reachable and falls back to the local pool otherwise."""
+    name = 'auto'
+
+    def __init__(self, max_workers=None, on_complete=None):
+        self.celery = CeleryExecutor()
+        self.local = LocalExecutor(max_workers, on_complete)
+
+    def submit(self, simulation_config, max_shards=1, min_rounds_per_shard=1):
+        try:
+            return self.celery.submit(simulation_config, max_shards, min_rounds_per_shard)
+        except Exception as e:
+            logging.warning(f"Celery broker unavailable ({e}); running simulation locally.")
+            return self.local.submit(simulation_config, max_shards, min_rounds_per_shard)
+
+    def _for(self, task_id):
+        return self.local if task_id.startswith(LOCAL_TASK_PREFIX) else self.celery
+
+    def result(self, task_id):
+        return self._for(task_id).result(task_id)
+
+    def progress(self, task, shard_ids=()):
+        return self._for(task.id).progress(task, shard_ids)
+
+    def watch(self, task_id, shard_ids=()):
+        return self._for(task_id).watch(task_id, shard_ids)
+
+    def abort(self, task_id, shard_ids=()):
+        return self._for(task_id).abort(task_id, shard_ids)
+
+
+EXECUTORS = {
+    'celery': CeleryExecutor,
+    'local': LocalExecutor,
+    'auto': AutoExecutor,
+}
+
+
+def create_executor(name, max_workers=None, on_complete=None):
+    """
+    `on_complete(task_id, results, simulation_config)` is the completion hook for
+    in-process executors, returning true once it has stored the results;
+    Celery runs complete through linked tasks instead.
+    """
+    if name not in EXECUTORS:
+        raise ValueError(f"Unknown simulation executor '{name}'. Choose one of: {', '.join(EXECUTORS)}")
+    if name == 'celery':
+        return CeleryExecutor()
+    return EXECUTORS[name](max_workers, on_complete)
@@ -1,8 +1,10 @@
 import json
 from flask_wtf import FlaskForm
-from wtforms import StringField, IntegerField, SubmitField, BooleanField, FloatField, TextAreaField
+from wtforms import StringField, IntegerField, SubmitField, BooleanField, FloatField, TextAreaField, SelectField
 from wtforms.validators import DataRequired, ValidationError
 
+from .counting import COUNTING_SYSTEMS, DEFAULT_COUNTING_SYSTEM
+
 # Custom validator for Bet Ramp JSON field
 def validate_json(form, field):
     try:
@@ -39,4 +41,6 @@ class BettingStrategyForm(FlaskForm):
     name = StringField('Strategy Name', validators=[DataRequired()])
     min_bet = IntegerField('Minimum Bet', validators=[DataRequired()])
     bet_ramp = TextAreaField('Bet Ramp (JSON)', validators=[DataRequired(), validate_json])
+    counting_system = SelectField('Counting System', default=DEFAULT_COUNTING_SYSTEM,
+                                  choices=[(key, system.name) for key, system in COUNTING_SYSTEMS.items()])
     submit = SubmitField('Save Strategy')
@@ -0,0 +1,156 @@
+"""
+Capture policies for recording chosen hands from the vectorized engine.
+
+Full hand-by-hand logging runs every hand through the slower game engine. A
+capture policy instead keeps a sample of the hands the vectorized engine plays:
+
+- `every_n`: every N-th round (rounds are numbered from zero, lane by lane);
+- `sample_rate`: each round with this probability, from a seeded stream;
+- filters: only rounds that used one of `actions` (split, double, surrender),
+  that were bet at a count of at least `min_true_count`, or that lost at
+  least `min_loss`;
+- `last_n`: keep a rolling buffer of the last N captured rounds instead of the
+  first ones.
+
+Selectors combine: a round is kept only if it passes every one configured.
+The sample is the first `MAX_CAPTURED_HANDS` selected rounds unless a
+rolling buffer is asked for.
+Captures are collected as column arrays and turned into record dicts once at
+the end of the run, so capturing costs a mask and a few fancy-indexes per round.
+"""
+import numpy as np
+
+ACTION_FILTERS = ('split', 'double', 'surrender')
+MAX_CAPTURED_HANDS = 10000   # hands kept per run when no `last_n` is given
+MAX_CAPTURE_LIMIT = 100000   # upper bound for `last_n`
+CAPTURE_STREAM = 2 ** 32     # spawn key of the sampling stream, clear of shard indices
+
+# Detail columns copied for each captured round, in record order
+CAPTURE_COLUMNS = ('count', 'bet', 'card_1', 'card_2', 'upcard', 'hole', 'dealer_total', 'hands',
+                   'split', 'doubled', 'surrendered', 'wagered', 'net')
+
+
+class CapturePolicy:
+    def __init__(self, every_n=None, sample_rate=None, actions=(), min_true_count=None, min_loss=None, last_n=None):
+        self.every_n = int(every_n) if every_n else None
+        self.sample_rate = float(sample_rate) if sample_rate is not None else None
+        self.actions = tuple(action for action in ACTION_FILTERS if action in (actions or ()))
+        self.min_true_count = float(min_true_count) if min_true_count is not None else None
+        self.min_loss = float(min_loss) if min_loss is not None else None
+        self.last_n = int(last_n) if last_n else None
+
+        if self.every_n is not None and self.every_n < 1:
+            raise ValueError('Capture every N-th hand needs N of at least 1.')
+        if self.sample_rate is not None and not 0 < self.sample_rate <= 1:
+            raise ValueError('The capture sample rate must be above 0 and at most 1.')
+        unknown = set(actions or ()) - set(ACTION_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown capture action '{sorted(unknown)[0]}'. Choose from: {', '.join(ACTION_FILTERS)}.")
+        if self.min_loss is not None and self.min_loss < 0:
+            raise ValueError('The capture loss threshold cannot be negative.')
+        if self.last_n is not None and not 1 <= self.last_n <= MAX_CAPTURE_LIMIT:
+            raise ValueError(f'The rolling capture buffer holds 1 to {MAX_CAPTURE_LIMIT} hands.')
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds a policy from a `hand_capture` config dict; None when no capture is configured."""
+        if config is None:
+            return None
+        return cls(config.get('every_n'), config.get('sample_rate'), config.get('actions') or (),
+                   config.get('min_true_count'), config.get('min_loss'), config.get('last_n'))
+
+    @property
+    def limit(self):
+        return self.last_n or MAX_CAPTURED_HANDS
+
+    def to_dict(self):
+        """The configured selectors only, as stored in a `hand_capture` config."""
+        policy = {'every_n': self.every_n, 'sample_rate': self.sample_rate, 'actions': list(self.actions),
+                  'min_true_count': self.min_true_count, 'min_loss': self.min_loss, 'last_n': self.last_n}
+        return {key: value for key, value in policy.items() if value not in (None, [])}
+
+    def select(self, first_round, details, rng):
+        """Boolean mask of the lanes in one round's `details` that this policy keeps."""
+        n = details['net'].size
+        keep = np.ones(n, dtype=bool)
+        if self.every_n is not None:
+            keep &= (first_round + np.arange(n)) % self.every_n == 0
+        if self.sample_rate is not None:
+            keep &= rng.random(n) < self.sample_rate
+        if self.actions:
+            used = np.zeros(n, dtype=bool)
+            if 'split' in self.actions:
+                used |= details['split']
+            if 'double' in self.actions:
+                used |= details['doubled']
+            if 'surrender' in self.actions:
+                used |= details['surrendered']
+            keep &= used
+        if self.min_true_count is not None:
+            keep &= details['count'] >= self.min_true_count
+        if self.min_loss is not None:
+            keep &= details['net'] <= -self.min_loss
+        return keep
+
+
+class HandCapture:
+    """Collects the rounds a `CapturePolicy` selects over one run."""
+
+    def __init__(self, policy, seed=None):
+        self.policy = policy
+        self.rng = np.random.default_rng(seed)
+        self.matched = 0
+        self._chunks = []
+        self._kept = 0
+
+    @property
+    def full(self):
+        """Without a rolling buffer, capture stops once the limit is reached."""
+        return self.policy.last_n is None and self._kept >= self.policy.limit
+
+    def update(self, first_round, details):
+        """Adds the selected lanes of one round; `first_round` numbers its first lane."""
+        lanes = np.flatnonzero(self.policy.select(first_round, details, self.rng))
+        self.matched += lanes.size
+        if lanes.size == 0 or self.full:
+            return
+        if self.policy.last_n is None:
+            lanes = lanes[:self.policy.limit - self._kept]
+        chunk = {column: details[column][lanes] for column in CAPTURE_COLUMNS}
+        chunk['round'] = first_round + lanes
+        chunk['player_totals'] = details['player_totals'][lanes]
+        self._chunks.append(chunk)
+        self._kept += lanes.size
+        if self.policy.last_n is not None and self._kept >= 2 * self.policy.last_n:
+            self._trim()
+
+    def _trim(self):
+        columns = self._columns()
+        self._chunks = [{key: values[-self.policy.last_n:] for key, values in columns.items()}] if columns else []
+        self._kept = min(self._kept, self.policy.last_n)
+
+    def _columns(self):
+        if not self._chunks:
+            return {}
+        return {key: np.concatenate([chunk[key] for chunk in self._chunks]) for key in self._chunks[0]}
+
+    def records(self):
+        """The captured rounds as hand-history record dicts, oldest first."""
+        if self.policy.last_n is not None:
+            self._trim()
+        columns = self._columns()
+        if not columns:
+            return []
+        plain = {key: values.tolist() for key, values in columns.items() if key != 'player_totals'}
+        records = []
+        for i, totals in enumerate(columns['player_totals']):
+            record = {'round': plain['round'][i]}
+            record.update((key, plain[key][i]) for key in CAPTURE_COLUMNS)
+            record['player_totals'] = totals[:record['hands']].tolist()
+            records.append(record)
+        return records
+
+    def summary(self):
+        """What the run matched and kept, stored alongside its outcomes."""
+        return {'policy': self.policy.to_dict(), 'matched': int(self.matched),
+                'captured': int(min(self._kept, self.policy.limit))}
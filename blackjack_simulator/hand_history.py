@@ -0,0 +1,121 @@
+"""
+Chunked on-disk hand-history storage.
+
+A history file is a short magic header followed by length-prefixed chunks.
+Each chunk holds up to `DEFAULT_CHUNK_RECORDS` hand records as zlib-compressed
+JSON lines, so writers never hold more than one chunk in memory and readers
+can stream records back (or seek straight to a chunk through the index)
+without loading the whole history.
+"""
+import os
+import json
+import zlib
+import struct
+
+MAGIC = b'BJHH1\n'
+CHUNK_HEADER = struct.Struct('>II')  # compressed length, record count
+DEFAULT_CHUNK_RECORDS = 5000
+FILE_EXTENSION = '.bjhh'
+
+
+class HandHistoryWriter:
+    """
+    Appends hand records to a chunked history file.
+
+    `close()` returns the chunk index: a list of `[offset, first_record, count]`
+    entries that `iter_records` can use to seek without scanning the file.
+    """
+
+    def __init__(self, path, chunk_records=DEFAULT_CHUNK_RECORDS, level=6):
+        self.path = path
+        self.chunk_records = chunk_records
+        self.level = level
+        self.index = []
+        self.count = 0
+        self._buffer = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+
+    def write(self, record):
+        self._buffer.append(json.dumps(record, default=str, separators=(',', ':')))
+        if len(self._buffer) >= self.chunk_records:
+            self._flush_chunk()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def _flush_chunk(self):
+        if not self._buffer:
+            return
+        payload = zlib.compress('\n'.join(self._buffer).encode('utf-8'), self.level)
+        self.index.append([self._file.tell(), self.count, len(self._buffer)])
+        self._file.write(CHUNK_HEADER.pack(len(payload), len(self._buffer)))
+        self._file.write(payload)
+        self.count += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        if self._file is not None:
+            self._flush_chunk()
+            self._file.close()
+            self._file = None
+        return self.index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _read_chunk(f):
+    header = f.read(CHUNK_HEADER.size)
+    if len(header) < CHUNK_HEADER.size:
+        return None
+    length, _ = CHUNK_HEADER.unpack(header)
+    return zlib.decompress(f.read(length)).decode('utf-8').split('\n')
+
+
+def iter_raw_records(path, start=0, stop=None, index=None):
+    """Yields the JSON text of records `start` to `stop` without parsing them."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a hand history file.")
+        position = 0
+        if index:
+            for offset, first, count in index:
+                if first + count > start:
+                    f.seek(offset)
+                    position = first
+                    break
+            else:
+                return
+        while stop is None or position < stop:
+            lines = _read_chunk(f)
+            if lines is None:
+                return
+            for line in lines:
+                if position >= start and (stop is None or position < stop):
+                    yield line
+                position += 1
+
+
+def iter_records(path, start=0, stop=None, index=None):
+    for line in iter_raw_records(path, start, stop, index):
+        yield json.loads(line)
+
+
+def stream_json_array(path, start=0, stop=None, index=None):
+    """Yields a JSON array of the stored records piece by piece, for streaming responses."""
+    yield '['
+    for i, line in enumerate(iter_raw_records(path, start, stop, index)):
+        yield line if i == 0 else ',' + line
+    yield ']'
+
+
+def write_history(path, records, chunk_records=DEFAULT_CHUNK_RECORDS):
+    with HandHistoryWriter(path, chunk_records) as writer:
+        writer.write_many(records)
+    return writer.index
@@ -1,6 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, Response
 from .models import db, Player, Casino, PlayingStrategy, BettingStrategy
 from .forms import PlayerForm, CasinoForm, BettingStrategyForm
+from .profiles import import_profiles, export_profiles, read_jsonl, jsonl_lines, PROFILE_KINDS, save_optimal_strategy
+from .simulation import compile_strategy
+from .strategy_ev import evaluate_strategy, optimal_strategy
+from .counting import COUNTING_SYSTEMS
 import json
 
 management_bp = Blueprint('management', __name__, url_prefix='/management', template_folder='templates')
@@ -103,11 +107,24 @@ def delete_casino(casino_id):
     flash('Casino deleted successfully!', 'success')
     return redirect(url_for('management.list_casinos'))
 
+@management_bp.route('/casinos/<int:casino_id>/optimal_strategy', methods=['POST'])
+def generate_optimal_strategy(casino_id):
+    casino = db.session.get(Casino, casino_id)
+    if not casino:
+        abort(404)
+    try:
+        strategy, ev = save_optimal_strategy(casino)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('management.list_casinos'))
+    flash(f'Saved "{strategy.name}" (EV {ev:+.3%} per initial bet).', 'success')
+    return redirect(url_for('management.edit_playing_strategy', strategy_id=strategy.id))
+
 # Betting Strategy Routes
 @management_bp.route('/betting_strategies')
 def list_betting_strategies():
     strategies = db.session.query(BettingStrategy).all()
-    return render_template("list_betting_strategies.html", strategies=strategies)
+    return render_template("list_betting_strategies.html", strategies=strategies, counting_systems=COUNTING_SYSTEMS)
 
 @management_bp.route('/betting_strategies/create', methods=['GET', 'POST'])
 def create_betting_strategy():
@@ -156,9 +173,13 @@ def list_playing_strategies():
     strategies = db.session.query(PlayingStrategy).order_by(PlayingStrategy.is_default.desc(), PlayingStrategy.name).all()
     return render_template("list_playing_strategies.html", strategies=strategies)
 
+def _casinos_for_ev():
+    return db.session.query(Casino).order_by(Casino.is_default.desc(), Casino.name).all()
+
 @management_bp.route('/playing_strategies/create', methods=['GET', 'POST'])
 def create_playing_strategy():
     default_strategy = db.session.query(PlayingStrategy).filter_by(is_default=True).first()
+    seed_casino = db.session.get(Casino, request.args.get('casino_id', type=int)) if request.args.get('casino_id') else None
     
     if request.method == 'POST':
         hard_totals = {}
@@ -195,20 +216,32 @@ def create_playing_strategy():
         flash('Playing strategy created successfully!', 'success')
         return redirect(url_for('management.list_playing_strategies'))
     
-    strategy_data = {
-        "name": "",
-        "description": default_strategy.description,
-        "hard_totals": json.loads(default_strategy.hard_total_actions),
-        "soft_totals": json.loads(default_strategy.soft_total_actions),
-        "pairs": json.loads(default_strategy.pair_splitting_actions)
-    }
+    if seed_casino:
+        # Seed the editor with the optimal table for this casino's rules
+        tables = optimal_strategy(seed_casino.to_dict()['rules'])
+        strategy_data = {
+            "name": "",
+            "description": f"Optimal strategy for the rules at {seed_casino.name}.",
+            "hard_totals": tables['hard'],
+            "soft_totals": tables['soft'],
+            "pairs": tables['pairs']
+        }
+    else:
+        strategy_data = {
+            "name": "",
+            "description": default_strategy.description,
+            "hard_totals": json.loads(default_strategy.hard_total_actions),
+            "soft_totals": json.loads(default_strategy.soft_total_actions),
+            "pairs": json.loads(default_strategy.pair_splitting_actions)
+        }
     actions = ['h', 's', 'd', 'p', 'u']
     dealer_cards = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'A']
     
     return render_template('create_playing_strategy.html', 
                            strategy=strategy_data, 
                            actions=actions, 
-                           dealer_cards=dealer_cards)
+                           dealer_cards=dealer_cards,
+                           casinos=_casinos_for_ev())
 
 
 @management_bp.route('/playing_strategies/edit/<int:strategy_id>', methods=['GET', 'POST'])
@@ -265,7 +298,8 @@ def edit_playing_strategy(strategy_id):
                            strategy=strategy_data, 
                            actions=actions, 
                            dealer_cards=dealer_cards, 
-                           strategy_id=strategy_id)
+                           strategy_id=strategy_id,
+                           casinos=_casinos_for_ev())
 
 
 @management_bp.route('/playing_strategies/delete/<int:strategy_id>', methods=['POST'])
@@ -280,3 +314,62 @@ def delete_playing_strategy(strategy_id):
     db.session.commit()
     flash('Playing strategy deleted successfully!', 'success')
     return redirect(url_for('management.list_playing_strategies'))
+
+
+# Bulk profile library routes
+@management_bp.route('/api/profiles', methods=['GET'])
+def api_export_profiles():
+    kinds = request.args.getlist('kind')
+    unknown = set(kinds) - set(PROFILE_KINDS)
+    if unknown:
+        return jsonify({'error': f"Unknown profile kinds: {', '.join(sorted(unknown))}"}), 400
+    return Response(jsonl_lines(export_profiles(kinds)), mimetype='application/x-ndjson')
+
+@management_bp.route('/api/profiles', methods=['POST'])
+def api_import_profiles():
+    """Accepts a JSONL body, or a JSON list of records, each tagged with its `kind`."""
+    try:
+        if request.mimetype == 'application/json':
+            records = request.get_json()
+            if not isinstance(records, list):
+                return jsonify({'error': 'Expected a JSON list of profile records.'}), 400
+            summary = import_profiles(read_jsonl(json.dumps(r) for r in records))
+        else:
+            summary = import_profiles(read_jsonl(request.stream))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(summary)
+
+# Strategy editor EV check
+@management_bp.route('/api/strategy_ev', methods=['POST'])
+def api_strategy_ev():
+    """
+    Off-the-top EV of a strategy table against a casino's rules.
+
+    Expects `{"casino_id": 1, "strategy": {"hard": ..., "soft": ..., "pairs": ...}}`
+    and returns the strategy's EV, the optimal EV, their error band and the cells
+    that give up EV.
+    """
+    data = request.get_json(silent=True) or {}
+    casino = db.session.get(Casino, data.get('casino_id')) if data.get('casino_id') else None
+    if not casino:
+        return jsonify({'error': 'Unknown casino.'}), 404
+    strategy = data.get('strategy')
+    if not isinstance(strategy, dict):
+        return jsonify({'error': 'Expected a strategy with hard, soft and pairs tables.'}), 400
+    report = evaluate_strategy(casino.to_dict()['rules'], compile_strategy(strategy))
+    report['casino'] = casino.name
+    return jsonify(report)
+
+@management_bp.route('/api/casinos/<int:casino_id>/optimal_strategy', methods=['POST'])
+def api_optimal_strategy(casino_id):
+    """Saves the optimal playing strategy for a casino; an optional JSON `name` overrides the default name."""
+    casino = db.session.get(Casino, casino_id)
+    if not casino:
+        return jsonify({'error': 'Unknown casino.'}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        strategy, ev = save_optimal_strategy(casino, data.get('name'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'id': strategy.id, 'name': strategy.name, 'ev': ev, 'strategy': strategy.to_dict()})
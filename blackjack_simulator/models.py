@@ -1,6 +1,8 @@
 
 import json
 from datetime import datetime, UTC
+
+import numpy as np
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
@@ -54,6 +56,8 @@ class BettingStrategy(db.Model):
     name = db.Column(db.String(100), unique=True, nullable=False)
     min_bet = db.Column(db.Integer, nullable=False)
     bet_ramp = db.Column(db.Text, nullable=False)
+    # --- FEATURE: Counting system the ramp's thresholds are counts of (see counting.COUNTING_SYSTEMS) ---
+    counting_system = db.Column(db.String(20), nullable=False, default='hi_lo')
     is_default = db.Column(db.Boolean, default=False, nullable=False)
 
     def to_dict(self):
@@ -61,7 +65,8 @@ class BettingStrategy(db.Model):
         return {
             'name': self.name,
             'min_bet': self.min_bet,
-            'bet_ramp': json.loads(self.bet_ramp)
+            'bet_ramp': json.loads(self.bet_ramp),
+            'counting_system': self.counting_system or 'hi_lo'
         }
 
 class PlayingStrategy(db.Model):
@@ -81,6 +86,11 @@ class PlayingStrategy(db.Model):
             'pairs': json.loads(self.pair_splitting_actions)
         }
 
+    def fingerprint(self):
+        """Content hash of the action tables, used to key compiled strategy caches."""
+        from .simulation import strategy_fingerprint
+        return strategy_fingerprint(self.to_dict())
+
 class Simulation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -93,7 +103,11 @@ class Simulation(db.Model):
 
     notes = db.Column(db.Text, nullable=True)
     iterations = db.Column(db.Integer, nullable=False, default=100)
-    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    # --- FEATURE: Convergence mode; iterations becomes an upper bound ---
+    target_std_error = db.Column(db.Float, nullable=True)
+    # --- FEATURE: Root seed of the last run; shards get independent streams spawned from it ---
+    seed = db.Column(db.BigInteger, nullable=True)
+    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(UTC), index=True)
     
     player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=True)
     player = db.relationship('Player', backref='simulations')
@@ -102,11 +116,26 @@ class Simulation(db.Model):
     casino = db.relationship('Casino', backref='simulations')
     
     task_id = db.Column(db.String(155), nullable=True)
+    # --- FEATURE: Config hashes for result reuse; base_result_id is topped up, not rerun ---
+    config_hash = db.Column(db.String(64), nullable=True)
+    config_family_hash = db.Column(db.String(64), nullable=True)
+    base_result_id = db.Column(db.Integer, nullable=True)
+    shard_task_ids = db.Column(db.Text, nullable=True)
+    # --- FEATURE: Seats 2-7 at the same table, as [{player_id, playing_strategy_id, betting_strategy_id}] ---
+    extra_seats = db.Column(db.Text, nullable=True)
     results = db.relationship('Result', backref='simulation', cascade='all, delete-orphan', lazy=True)
 
+    def seat_ids(self):
+        """The extra seats' `{player_id, playing_strategy_id, betting_strategy_id}` dicts, in seat order."""
+        return json.loads(self.extra_seats) if self.extra_seats else []
+
 class Result(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     simulation_id = db.Column(db.Integer, db.ForeignKey('simulation.id'), nullable=False)
+    # Task that produced this result; unique per seat so a finished task is persisted exactly once
+    task_id = db.Column(db.String(155), nullable=True)
+    # --- FEATURE: Seat at the table, 1 for the simulation's own player ---
+    seat = db.Column(db.Integer, nullable=False, default=1)
     player_name = db.Column(db.String(100), nullable=False)
     casino_name = db.Column(db.String(100), nullable=False)
     
@@ -115,9 +144,121 @@ class Result(db.Model):
 
     starting_bankroll = db.Column(db.Integer, nullable=False)
     iterations = db.Column(db.Integer, nullable=False)
+    # Root seed the result was played from; for a top-up, the seed of the rounds played on top of base_result_id
+    seed = db.Column(db.BigInteger, nullable=True)
+    base_result_id = db.Column(db.Integer, nullable=True)
     notes = db.Column(db.Text, nullable=True)
     outcomes = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(UTC), index=True)
+
+    # --- FEATURE: Rounds actually played and achieved precision ---
+    rounds_played = db.Column(db.Integer, nullable=True)
+    edge_std_error = db.Column(db.Float, nullable=True)
+
+    # --- FEATURE: Key metrics copied out of `outcomes` for SQL filtering and aggregation ---
+    final_bankroll = db.Column(db.Float, nullable=True)
+    net_gain_loss = db.Column(db.Float, nullable=True, index=True)
+    total_wagered = db.Column(db.Float, nullable=True)
+    player_edge = db.Column(db.Float, nullable=True, index=True)
+
+    # --- FEATURE: Bankroll risk computed by the engine in the same pass ---
+    std_dev_per_round = db.Column(db.Float, nullable=True)
+    max_drawdown = db.Column(db.Float, nullable=True)
+    risk_of_ruin = db.Column(db.Float, nullable=True, index=True)
+    # Downsampled bankroll trajectory as typed arrays (payloads format)
+    bankroll_trajectory = db.Column(db.LargeBinary, nullable=True)
+
+    # --- FEATURE: Config hashes for deduplication and incremental reuse ---
+    config_hash = db.Column(db.String(64), nullable=True, index=True)
+    config_family_hash = db.Column(db.String(64), nullable=True, index=True)
     
     # --- FEATURE: Add hand_history field ---
     hand_history = db.Column(db.Text, nullable=True)
+
+    # --- FEATURE: Chunked hand-history file written by the worker ---
+    hand_history_path = db.Column(db.String(500), nullable=True)
+    hand_history_index = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (db.UniqueConstraint('task_id', 'seat'),)
+
+    METRIC_COLUMNS = ('final_bankroll', 'net_gain_loss', 'total_wagered', 'player_edge',
+                      'rounds_played', 'edge_std_error', 'std_dev_per_round', 'max_drawdown', 'risk_of_ruin')
+
+    def set_metrics(self, outcomes):
+        """Copies the numeric metrics from an outcomes dict into their typed columns."""
+        for column in self.METRIC_COLUMNS:
+            value = outcomes.get(column)
+            setattr(self, column, int(value) if column == 'rounds_played' and value is not None else value)
+
+    def set_trajectory(self, rounds, bankroll):
+        from .payloads import encode
+        self.bankroll_trajectory = encode({'rounds': np.asarray(rounds, dtype=np.int64),
+                                           'bankroll': np.asarray(bankroll, dtype=np.float32)})
+
+    def trajectory(self):
+        """Returns `{'rounds': ndarray, 'bankroll': ndarray}`, or None for results without one."""
+        if not self.bankroll_trajectory:
+            return None
+        from .payloads import decode
+        return decode(self.bankroll_trajectory)
+
+    @property
+    def has_hand_history(self):
+        return bool(self.hand_history or self.hand_history_path)
+
+class Sweep(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(100), nullable=False)
+    spec = db.Column(db.Text, nullable=False)
+    iterations = db.Column(db.Integer, nullable=False)
+    max_concurrency = db.Column(db.Integer, nullable=False, default=4)
+    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    points = db.relationship('SweepPoint', backref='sweep', cascade='all, delete-orphan',
+                             order_by='SweepPoint.index', lazy=True)
+
+    @property
+    def state(self):
+        states = {p.state for p in self.points}
+        if states & {'PENDING', 'RUNNING'}:
+            return 'RUNNING'
+        return 'FAILURE' if states == {'FAILURE'} else 'SUCCESS'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'state': self.state,
+            'iterations': self.iterations,
+            'max_concurrency': self.max_concurrency,
+            'spec': json.loads(self.spec),
+            'points': [p.to_dict() for p in self.points]
+        }
+
+class SweepPoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sweep_id = db.Column(db.Integer, db.ForeignKey('sweep.id'), nullable=False)
+    index = db.Column(db.Integer, nullable=False)
+    casino_id = db.Column(db.Integer, db.ForeignKey('casino.id'), nullable=False)
+    casino = db.relationship('Casino')
+    playing_strategy_id = db.Column(db.Integer, db.ForeignKey('playing_strategy.id'), nullable=False)
+    playing_strategy = db.relationship('PlayingStrategy')
+    betting_strategy_id = db.Column(db.Integer, db.ForeignKey('betting_strategy.id'), nullable=False)
+    betting_strategy = db.relationship('BettingStrategy')
+    # Casino rule overrides for this grid point, e.g. {"deck_count": 2}
+    rule_overrides = db.Column(db.Text, nullable=False, default='{}')
+    state = db.Column(db.String(20), nullable=False, default='PENDING')
+    task_id = db.Column(db.String(155), nullable=True)
+    outcomes = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'casino': self.casino.name,
+            'playing_strategy': self.playing_strategy.name,
+            'betting_strategy': self.betting_strategy.name,
+            'rule_overrides': json.loads(self.rule_overrides),
+            'state': self.state,
+            'outcomes': json.loads(self.outcomes) if self.outcomes else None,
+            'error': self.error
+        }
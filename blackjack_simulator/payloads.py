@@ -0,0 +1,54 @@
+"""
+Binary encoding of simulation task results.
+
+Task results travel from the workers through Redis to the web process. They
+are encoded once with msgpack, and NumPy arrays (per-round series such as
+bankroll trajectories) are carried as raw typed buffers instead of lists of
+numbers, so a long series costs its size in bytes rather than a JSON number
+per element. The format is registered with kombu as `RESULT_SERIALIZER`.
+"""
+import numpy as np
+import msgpack
+from kombu.serialization import register
+
+RESULT_SERIALIZER = 'bjsim-msgpack'
+CONTENT_TYPE = 'application/x-bjsim-msgpack'
+NDARRAY_EXT = 1
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj)
+        return msgpack.ExtType(NDARRAY_EXT, msgpack.packb([array.dtype.str, list(array.shape), array.tobytes()]))
+    if isinstance(obj, np.generic):
+        return obj.item()
+    # Same fallback as the JSON path had: anything else travels as its string form.
+    return str(obj)
+
+
+def _ext_hook(code, data):
+    if code == NDARRAY_EXT:
+        dtype, shape, buffer = msgpack.unpackb(data)
+        return np.frombuffer(buffer, dtype=np.dtype(dtype)).reshape(shape).copy()
+    return msgpack.ExtType(code, data)
+
+
+def encode(value):
+    return msgpack.packb(value, default=_default, use_bin_type=True)
+
+
+def decode(data):
+    return msgpack.unpackb(data, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+
+def jsonable(obj):
+    """`json.dumps` default for values decoded from a binary result."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+
+def register_result_serializer():
+    register(RESULT_SERIALIZER, encode, decode, content_type=CONTENT_TYPE, content_encoding='binary')
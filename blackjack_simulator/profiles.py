@@ -0,0 +1,237 @@
+"""
+Bulk import and export of management profiles.
+
+A profile library is either a directory with one sub-directory per kind
+(`players/`, `casinos/`, `betting_strategies/`, `playing_strategies/` or
+`strategies/`) holding one JSON profile (or a JSON list of profiles) per file,
+or a JSONL stream of records tagged with a `kind`. The bundled files under
+`data/` load as they are.
+
+Imports are upserts keyed on the profile name, written in one transaction
+with one bulk INSERT and one bulk UPDATE per kind. Default profiles are never
+overwritten, matching the management pages.
+"""
+import os
+import re
+import json
+
+from sqlalchemy import insert, update
+
+from .models import db, Player, Casino, BettingStrategy, PlayingStrategy
+from .simulation import compile_strategy
+from .strategy_ev import optimal_strategy, expected_value
+from .counting import counting_system
+
+CASINO_RULES = (
+    'deck_count', 'dealer_stands_on_soft_17', 'blackjack_payout', 'allow_late_surrender',
+    'allow_early_surrender', 'allow_resplit_to_hands', 'allow_double_after_split',
+    'allow_double_on_any_two', 'reshuffle_penetration', 'offer_insurance', 'dealer_checks_for_blackjack'
+)
+
+
+def _player_row(record):
+    return {'name': record['name'], 'bankroll': int(record.get('bankroll', 1000))}
+
+
+def _casino_row(record):
+    rules = dict(record.get('rules', {}))
+    rules.update({k: v for k, v in record.items() if k in CASINO_RULES})
+    # The engine's casino files describe a few rules differently.
+    if 'hit_on_soft_17' in record:
+        rules.setdefault('dealer_stands_on_soft_17', not record['hit_on_soft_17'])
+    if 'DAS' in record:
+        rules.setdefault('allow_double_after_split', record['DAS'])
+    if 'double_down_restrictions' in record:
+        rules.setdefault('allow_double_on_any_two', 'any' in record['double_down_restrictions'])
+    missing = [rule for rule in CASINO_RULES if rule not in rules]
+    if missing:
+        raise ValueError(f"Casino '{record['name']}' is missing rules: {', '.join(missing)}")
+    row = {'name': record['name']}
+    for rule in CASINO_RULES:
+        row[rule] = rules[rule]
+    return row
+
+
+def _betting_row(record):
+    bet_ramp = record.get('bet_ramp', {})
+    if isinstance(bet_ramp, list):
+        # List-of-tiers files are stored in the {"threshold": multiplier} form the forms and engines read.
+        bet_ramp = {str(tier['count_threshold']): tier['bet_multiplier'] for tier in bet_ramp}
+    return {'name': record['name'], 'min_bet': int(record['min_bet']), 'bet_ramp': json.dumps(bet_ramp),
+            'counting_system': counting_system(record.get('counting_system')).key}
+
+
+def _playing_row(record):
+    tables = record.get('strategy', record)
+    hard = tables.get('hard', tables.get('hard_totals'))
+    soft = tables.get('soft', tables.get('soft_totals'))
+    pairs = tables.get('pairs', tables.get('pair_splitting'))
+    if hard is None or soft is None or pairs is None:
+        raise ValueError(f"Playing strategy '{record['name']}' needs hard, soft and pair tables.")
+    return {
+        'name': record['name'],
+        'description': record.get('description'),
+        'hard_total_actions': json.dumps(hard),
+        'soft_total_actions': json.dumps(soft),
+        'pair_splitting_actions': json.dumps(pairs),
+    }
+
+
+def _casino_record(casino):
+    return casino.to_dict()
+
+
+def _betting_record(strategy):
+    return strategy.to_dict()
+
+
+def _playing_record(strategy):
+    return {'name': strategy.name, 'description': strategy.description, 'strategy': strategy.to_dict()}
+
+
+def _player_record(player):
+    return player.to_dict()
+
+
+# kind: (model, record -> row, model -> record, directory names)
+PROFILE_KINDS = {
+    'player': (Player, _player_row, _player_record, ('players',)),
+    'casino': (Casino, _casino_row, _casino_record, ('casinos',)),
+    'betting_strategy': (BettingStrategy, _betting_row, _betting_record, ('betting_strategies',)),
+    'playing_strategy': (PlayingStrategy, _playing_row, _playing_record, ('playing_strategies', 'strategies')),
+}
+
+
+def _kind_for_directory(name):
+    for kind, (_, _, _, directories) in PROFILE_KINDS.items():
+        if name in directories:
+            return kind
+    return None
+
+
+def read_directory(path):
+    """Yields `(kind, record)` for every profile file under a library directory."""
+    for entry in sorted(os.listdir(path)):
+        kind = _kind_for_directory(entry)
+        directory = os.path.join(path, entry)
+        if kind is None or not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(directory, filename)) as f:
+                data = json.load(f)
+            for record in (data if isinstance(data, list) else [data]):
+                yield kind, record
+
+
+def read_jsonl(lines):
+    """Yields `(kind, record)` from JSONL lines of `{"kind": ..., ...profile}` records."""
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number} is not valid JSON: {e}")
+        if not isinstance(record, dict) or 'kind' not in record:
+            raise ValueError(f"Line {number} has no 'kind'.")
+        record = dict(record)
+        yield record.pop('kind'), record
+
+
+def import_profiles(records):
+    """
+    Upserts `(kind, record)` pairs by name in a single transaction.
+
+    Returns counts per kind: `{"casino": {"created": 3, "updated": 1, "skipped": 0}, ...}`.
+    Nothing is written if any record is invalid.
+    """
+    rows = {kind: {} for kind in PROFILE_KINDS}
+    for kind, record in records:
+        if kind not in PROFILE_KINDS:
+            raise ValueError(f"Unknown profile kind '{kind}'. Choose one of: {', '.join(PROFILE_KINDS)}")
+        if not isinstance(record, dict) or not record.get('name'):
+            raise ValueError(f"Every {kind} profile needs a name.")
+        try:
+            row = PROFILE_KINDS[kind][1](record)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid {kind} profile '{record['name']}': {e}")
+        rows[kind][row['name']] = row  # later records win
+
+    summary = {}
+    try:
+        for kind, by_name in rows.items():
+            if not by_name:
+                continue
+            model = PROFILE_KINDS[kind][0]
+            existing = {
+                name: (id_, is_default) for id_, name, is_default in
+                db.session.query(model.id, model.name, model.is_default).filter(model.name.in_(list(by_name)))
+            }
+            new_rows = [dict(row, is_default=False) for name, row in by_name.items() if name not in existing]
+            changed = [dict(row, id=existing[name][0]) for name, row in by_name.items()
+                       if name in existing and not existing[name][1]]
+            if new_rows:
+                db.session.execute(insert(model), new_rows)
+            if changed:
+                db.session.execute(update(model), changed)
+            summary[kind] = {'created': len(new_rows), 'updated': len(changed),
+                             'skipped': len(by_name) - len(new_rows) - len(changed)}
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return summary
+
+
+def export_profiles(kinds=None):
+    """Yields `(kind, record)` for every stored profile, in the format `import_profiles` accepts."""
+    for kind, (model, _, to_record, _) in PROFILE_KINDS.items():
+        if kinds and kind not in kinds:
+            continue
+        for profile in db.session.query(model).order_by(model.name).yield_per(500):
+            yield kind, to_record(profile)
+
+
+def jsonl_lines(records):
+    for kind, record in records:
+        yield json.dumps(dict(record, kind=kind)) + '\n'
+
+
+def _filename(name):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') + '.json'
+
+
+def write_directory(path, records):
+    """Writes profiles as a library directory, one file per profile. Returns the number written."""
+    count = 0
+    for kind, record in records:
+        directory = os.path.join(path, PROFILE_KINDS[kind][3][0])
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, _filename(record['name'])), 'w') as f:
+            json.dump(record, f, indent=4)
+        count += 1
+    return count
+
+
+def save_optimal_strategy(casino, name=None):
+    """
+    Derives the EV-maximizing playing strategy for a casino's rules and
+    upserts it as a PlayingStrategy. Returns `(strategy, ev)`.
+    """
+    rules = casino.to_dict()['rules']
+    tables = optimal_strategy(rules)
+    ev = expected_value(rules, compile_strategy(tables))
+    name = name or f"{casino.name} Optimal Strategy"
+    record = {
+        'name': name,
+        'description': f"Optimal strategy for the rules at {casino.name} (EV {ev:+.3%} per initial bet).",
+        'strategy': tables,
+    }
+    summary = import_profiles([('playing_strategy', record)])
+    if summary['playing_strategy']['skipped']:
+        raise ValueError(f"'{name}' is a default playing strategy and cannot be overwritten.")
+    return db.session.query(PlayingStrategy).filter_by(name=name).one(), ev
@@ -0,0 +1,138 @@
+"""
+Result persistence for finished simulation tasks.
+
+`store_task_result` is the completion hook behind both executors: the Celery
+workers call it from a linked task and the local executor from its futures'
+done callbacks, so a Result row exists by the time the browser asks for it.
+`task_status` only falls back to it for tasks that finished without a hook
+(for example tasks sent before the workers were upgraded).
+"""
+import os
+import json
+import uuid
+import logging
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Simulation, Result, Player, PlayingStrategy, BettingStrategy
+from .simulation import merge_outcomes, continuation_seed, TRAJECTORY_KEYS
+from .hand_history import write_history, FILE_EXTENSION
+from .payloads import jsonable
+
+
+def _spill_hand_history(sim, hand_history):
+    """Writes an inline hand history to a chunked file so it never has to be serialised into the row."""
+    hand_history_dir = current_app.config.get('HAND_HISTORY_DIR')
+    if not hand_history_dir:
+        return {}
+    path = os.path.join(hand_history_dir, f"sim{sim.id}_{uuid.uuid4().hex}{FILE_EXTENSION}")
+    index = write_history(path, hand_history)
+    return {'path': path, 'index': index, 'count': len(hand_history)}
+
+
+def seat_profiles(sim):
+    """The `(player, playing_strategy, betting_strategy)` of every seat of `sim`, in seat order."""
+    seats = [(sim.player, sim.playing_strategy, sim.betting_strategy)]
+    for seat in sim.seat_ids():
+        seats.append((db.session.get(Player, seat['player_id']),
+                      db.session.get(PlayingStrategy, seat['playing_strategy_id']),
+                      db.session.get(BettingStrategy, seat['betting_strategy_id'])))
+    return seats
+
+
+def _seat_result(sim, task_id, seat, player_name, outcomes, profiles):
+    """Builds the Result row for one seat; returns it with the path of any hand-history file it spilled."""
+    player, playing_strategy, betting_strategy = profiles
+    outcomes = dict(outcomes)
+    hand_history = outcomes.pop('hand_history', None)
+    hand_history_file = outcomes.pop('hand_history_file', None) or {}
+    spilled_path = None
+    if hand_history and not hand_history_file:
+        hand_history_file = _spill_hand_history(sim, hand_history)
+        if hand_history_file:
+            spilled_path, hand_history = hand_history_file['path'], None
+
+    base = db.session.get(Result, sim.base_result_id) if sim.base_result_id and seat == 1 else None
+    seed = sim.seed
+    if base:
+        # A top-up is the base result plus rounds from a child stream of the seed, not a run of one seed
+        seed = continuation_seed(sim.seed, base.iterations)
+        base_outcomes = json.loads(base.outcomes)
+        base_trajectory = base.trajectory()
+        if base_trajectory:
+            base_outcomes['trajectory_rounds'] = base_trajectory['rounds']
+            base_outcomes['bankroll_trajectory'] = base_trajectory['bankroll']
+        outcomes = merge_outcomes([base_outcomes, outcomes], player.bankroll)
+    trajectory = [outcomes.pop(key, None) for key in TRAJECTORY_KEYS]
+
+    result = Result(
+        simulation_id=sim.id,
+        task_id=task_id,
+        seat=seat,
+        player_name=player_name,
+        casino_name=sim.casino.name,
+        strategy=playing_strategy.name,
+        betting_strategy_name=betting_strategy.name,
+        starting_bankroll=player.bankroll,
+        iterations=sim.iterations,
+        seed=seed,
+        base_result_id=base.id if base else None,
+        notes=sim.notes,
+        outcomes=json.dumps(outcomes, default=jsonable),
+        config_hash=sim.config_hash if seat == 1 else None,
+        config_family_hash=sim.config_family_hash if seat == 1 else None,
+        hand_history=json.dumps(hand_history, default=jsonable) if hand_history else None,
+        hand_history_path=hand_history_file.get('path'),
+        hand_history_index=json.dumps(hand_history_file['index']) if hand_history_file else None
+    )
+    result.set_metrics(outcomes)
+    if trajectory[0] is not None:
+        result.set_trajectory(*trajectory)
+    return result, spilled_path
+
+
+def store_task_result(task_id, results_data, simulation_id=None):
+    """
+    Creates the Result rows for a finished task, one per seat, and returns
+    `(result, error)` with the first seat's result.
+
+    Idempotent: `(Result.task_id, Result.seat)` is unique, so whichever caller
+    gets there second (a worker hook retried, or a poll racing the hook) gets
+    the existing row back instead of inserting duplicates.
+    """
+    existing = db.session.query(Result).filter_by(task_id=task_id, seat=1).first()
+    if existing:
+        return existing, None
+
+    if simulation_id is not None:
+        sim = db.session.get(Simulation, simulation_id)
+    else:
+        sim = db.session.query(Simulation).filter_by(task_id=task_id).first()
+    if not sim:
+        logging.error(f"FATAL: Simulation not found for task_id {task_id}")
+        return None, 'Simulation not found for this.'
+
+    if not results_data or not isinstance(results_data, dict) or 'error' in results_data:
+        logging.error(f"Invalid or empty results data for task {task_id}: {results_data}")
+        return None, 'Invalid results data.'
+
+    logging.info(f"Creating results for simulation {sim.id} from task {task_id}.")
+    # Results are keyed by player name in seat order
+    rows, spilled_paths = [], []
+    for seat, ((player_name, outcomes), profiles) in enumerate(zip(results_data.items(), seat_profiles(sim)), start=1):
+        result, spilled_path = _seat_result(sim, task_id, seat, player_name, outcomes, profiles)
+        rows.append(result)
+        spilled_paths.append(spilled_path)
+    db.session.add_all(rows)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another caller stored this task first; drop the files this attempt wrote.
+        db.session.rollback()
+        for path in spilled_paths:
+            if path and os.path.exists(path):
+                os.remove(path)
+        return db.session.query(Result).filter_by(task_id=task_id, seat=1).first(), None
+    logging.info(f"Result {rows[0].id} created for simulation {sim.id} ({len(rows)} seat(s)).")
+    return rows[0], None
@@ -2,13 +2,157 @@
 import os
 import sys
 import json
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, abort
+import math
+import time
+from datetime import datetime
+from sqlalchemy import or_, and_, func
+from sqlalchemy.orm import load_only, joinedload
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, abort, stream_with_context
 
 from .models import db, Player, Casino, BettingStrategy, PlayingStrategy, Simulation, Result
 from .celery_worker import celery
+from .results import store_task_result, seat_profiles
+from .hand_history import stream_json_array
+from .executors import shard_task_ids
+from .simulation import config_fingerprint, continuation_seed, new_seed, MAX_SEATS, MAX_SEED
+from .counting import DEFAULT_COUNTING_SYSTEM
+from .shoe_pool import pool_path
+from .hand_capture import CapturePolicy
 
 main = Blueprint('main', __name__)
 
+def simulation_executor():
+    return current_app.extensions['simulation_executor']
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+TASK_EVENTS_KEEPALIVE = 15  # seconds between keep-alive comments on a quiet event stream
+
+def keyset_page(query, model, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Returns one newest-first page of `query` and the cursor for the next page.
+
+    Pages are keyed on (timestamp, id) instead of OFFSET, so every page is an
+    index range scan no matter how deep the listing goes.
+    """
+    per_page = max(1, min(int(per_page), MAX_PAGE_SIZE))
+    if cursor:
+        timestamp, _, last_id = cursor.rpartition('_')
+        timestamp = datetime.fromisoformat(timestamp)
+        query = query.filter(or_(model.timestamp < timestamp,
+                                 and_(model.timestamp == timestamp, model.id < int(last_id))))
+    rows = query.order_by(model.timestamp.desc(), model.id.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = f"{rows[-1].timestamp.isoformat()}_{rows[-1].id}"
+    return rows, next_cursor
+
+def page_args():
+    try:
+        return request.args.get('cursor'), int(request.args.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        abort(400)
+
+def results_summary_query():
+    """Result rows with only the listing columns loaded; outcomes and hand history stay deferred."""
+    return db.session.query(Result).options(
+        load_only(Result.id, Result.simulation_id, Result.player_name, Result.casino_name, Result.strategy,
+                  Result.betting_strategy_name, Result.iterations, Result.timestamp,
+                  Result.player_edge, Result.net_gain_loss, Result.total_wagered, Result.edge_std_error),
+        joinedload(Result.simulation).load_only(Simulation.id, Simulation.title)
+    )
+
+def simulations_summary_query():
+    return db.session.query(Simulation).options(
+        load_only(Simulation.id, Simulation.title, Simulation.iterations, Simulation.timestamp)
+    )
+
+def build_simulation_config(player, casino, playing_strategy, betting_strategy, iterations, **options):
+    """Builds the task payload for one player/casino/strategy/betting-strategy run."""
+    simulation_config = {
+        "player": player.to_dict(),
+        "casino": casino.to_dict(),
+        "playing_strategy_name": playing_strategy.name,
+        "strategy": playing_strategy.to_dict(),
+        "strategy_hash": playing_strategy.fingerprint(),
+        "betting_strategy": betting_strategy.to_dict(),
+        "iterations": iterations,
+        "hand_history_dir": current_app.config.get('HAND_HISTORY_DIR')
+    }
+    # --- FEATURE: Workers deal from a shared pre-shuffled shoe pool when one exists for these decks ---
+    shoe_pool = shoe_pool_for(casino.deck_count)
+    if shoe_pool:
+        simulation_config["shoe_pool"] = shoe_pool
+    simulation_config.update(options)
+    return simulation_config
+
+def shoe_pool_for(deck_count):
+    """Path of the configured shoe pool for `deck_count`-deck shoes, or None when there is none."""
+    shoe_pool_dir = current_app.config.get('SHOE_POOL_DIR')
+    if shoe_pool_dir and os.path.exists(pool_path(shoe_pool_dir, deck_count)):
+        return pool_path(shoe_pool_dir, deck_count)
+    return None
+
+def seat_config(player, playing_strategy, betting_strategy):
+    """One extra seat of a simulation config (see `build_simulation_config`'s `seats` option)."""
+    return {
+        "player": player.to_dict(),
+        "playing_strategy_name": playing_strategy.name,
+        "strategy": playing_strategy.to_dict(),
+        "strategy_hash": playing_strategy.fingerprint(),
+        "betting_strategy": betting_strategy.to_dict()
+    }
+
+# The profile ids each extra seat is chosen by, in form order
+SEAT_PROFILES = (('player_id', Player, 'player'), ('playing_strategy_id', PlayingStrategy, 'playing strategy'),
+                 ('betting_strategy_id', BettingStrategy, 'betting strategy'))
+
+def form_extra_seats():
+    """
+    The extra seats chosen on the run form; seats without a player are left
+    empty. Raises ValueError for an id that is not a number or names no profile.
+    """
+    seats = zip(request.form.getlist('seat_player_id'), request.form.getlist('seat_playing_strategy_id'),
+                request.form.getlist('seat_betting_strategy_id'))
+    extra_seats = []
+    for number, ids in enumerate(seats, start=2):
+        if not ids[0]:
+            continue
+        seat = {}
+        for (key, model, label), value in zip(SEAT_PROFILES, ids):
+            try:
+                seat[key] = int(value)
+            except ValueError:
+                raise ValueError(f'seat {number} needs a player, a playing strategy and a betting strategy.')
+            if db.session.get(model, seat[key]) is None:
+                raise ValueError(f'seat {number} refers to a {label} that does not exist.')
+        extra_seats.append(seat)
+    return extra_seats
+
+def form_hand_capture():
+    """
+    The hand-capture policy chosen on the run form as a `hand_capture` config
+    dict, or None when no capture field is filled in. Raises ValueError for
+    values a `CapturePolicy` rejects.
+    """
+    def number(field, kind=float):
+        text = request.form.get(field, '').strip()
+        return kind(text) if text else None
+
+    sample_percent = number('capture_sample_rate')
+    config = {
+        'every_n': number('capture_every_n', int),
+        'sample_rate': sample_percent / 100 if sample_percent is not None else None,
+        'actions': request.form.getlist('capture_actions'),
+        'min_true_count': number('capture_min_true_count'),
+        'min_loss': number('capture_min_loss'),
+        'last_n': number('capture_last_n', int),
+    }
+    if not any(value not in (None, []) for value in config.values()):
+        return None
+    return CapturePolicy.from_config(config).to_dict()
+
 @main.route('/')
 def index():
     if db.session.query(Simulation).count() > 0:
@@ -18,8 +162,25 @@ def index():
 
 @main.route('/simulations')
 def simulations():
-    all_simulations = db.session.query(Simulation).order_by(Simulation.timestamp.desc()).all()
-    return render_template('simulations.html', simulations=all_simulations)
+    cursor, per_page = page_args()
+    try:
+        page, next_cursor = keyset_page(simulations_summary_query(), Simulation, cursor, per_page)
+    except ValueError:
+        abort(400)
+    return render_template('simulations.html', simulations=page, next_cursor=next_cursor, per_page=per_page)
+
+@main.route('/api/simulations')
+def api_simulations():
+    cursor, per_page = page_args()
+    try:
+        page, next_cursor = keyset_page(simulations_summary_query(), Simulation, cursor, per_page)
+    except ValueError:
+        abort(400)
+    return jsonify({
+        'items': [{'id': s.id, 'title': s.title, 'iterations': s.iterations,
+                   'timestamp': s.timestamp.isoformat() if s.timestamp else None} for s in page],
+        'next_cursor': next_cursor
+    })
 
 @main.route('/simulation/new', methods=['GET', 'POST'])
 def new_simulation():
@@ -54,6 +215,9 @@ def delete_simulation(simulation_id):
     simulation = db.session.get(Simulation, simulation_id)
     if not simulation:
         abort(404)
+    for result in simulation.results:
+        if result.hand_history_path and os.path.exists(result.hand_history_path):
+            os.remove(result.hand_history_path)
     db.session.delete(simulation)
     db.session.commit()
     flash('Simulation and its results have been deleted.', 'success')
@@ -69,7 +233,8 @@ def run_simulation_page(simulation_id):
                            players=db.session.query(Player).order_by(Player.name).all(),
                            casinos=db.session.query(Casino).order_by(Casino.name).all(),
                            playing_strategies=db.session.query(PlayingStrategy).order_by(PlayingStrategy.name).all(),
-                           betting_strategies=db.session.query(BettingStrategy).order_by(BettingStrategy.name).all())
+                           betting_strategies=db.session.query(BettingStrategy).order_by(BettingStrategy.name).all(),
+                           max_seats=MAX_SEATS)
 
 @main.route('/simulation/<int:simulation_id>/run_action', methods=['POST'])
 def run_simulation_action(simulation_id):
@@ -83,7 +248,27 @@ def run_simulation_action(simulation_id):
     sim.playing_strategy_id = request.form.get('playing_strategy_id')
     sim.betting_strategy_id = request.form.get('betting_strategy_id')
     sim.iterations = int(request.form.get('iterations', 100))
+    target_precision = request.form.get('target_std_error', '').strip()
+    try:
+        target_std_error = float(target_precision) / 100 if target_precision else None
+    except ValueError:
+        target_std_error = math.nan
+    if target_std_error is not None and not (math.isfinite(target_std_error) and target_std_error > 0):
+        flash('The target precision must be a positive percentage.', 'error')
+        return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
+    sim.target_std_error = target_std_error
+    seed_text = request.form.get('seed', '').strip()
+    if seed_text and not (seed_text.isdigit() and int(seed_text) <= MAX_SEED):
+        flash(f'The seed must be a whole number from 0 to {MAX_SEED}.', 'error')
+        return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
+    explicit_seed = int(seed_text) if seed_text else None
     sim.notes = request.form.get('notes')
+    try:
+        extra_seats = form_extra_seats()
+    except ValueError as e:
+        flash(f'Invalid extra seat: {e}', 'error')
+        return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
+    sim.extra_seats = json.dumps(extra_seats) if extra_seats else None
     
     db.session.commit()
 
@@ -96,31 +281,85 @@ def run_simulation_action(simulation_id):
         flash('Player, Casino, Playing Strategy, and Betting Strategy must all be selected.', 'error')
         return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
 
-    player_data = player.to_dict()
-    casino_data = casino.to_dict()
-    strategy_data = playing_strategy.to_dict()
-    betting_strategy_data = betting_strategy.to_dict()
+    # --- FEATURE: Up to MAX_SEATS players at one table, sharing the shoe ---
+    seats = seat_profiles(sim)[1:]
+    if len(seats) + 1 > MAX_SEATS:
+        flash(f'A table has at most {MAX_SEATS} seats.', 'error')
+        return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
+    if not all(all(profiles) for profiles in seats):
+        flash('Every extra seat needs a player, a playing strategy and a betting strategy.', 'error')
+        return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
 
-    simulation_config = {
-        "player": player_data,
-        "casino": casino_data,
-        "playing_strategy_name": playing_strategy.name,
-        "strategy": strategy_data,
-        "betting_strategy": betting_strategy_data,
-        "iterations": sim.iterations,
-        "true_count_threshold": int(request.form.get('true_count_threshold', 1)),
-        "log_hands": request.form.get('log_hands') == 'true'
-    }
-    
-    simulation_config_json = json.dumps(simulation_config)
+    # --- FEATURE: Capture policies record chosen hands from the fast engine ---
+    try:
+        hand_capture = form_hand_capture()
+    except ValueError as e:
+        flash(f'Invalid hand capture: {e}', 'error')
+        return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
+    if hand_capture and request.form.get('log_hands') == 'true':
+        flash('Hand capture is only available for runs without full hand histories.', 'error')
+        return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
+
+    simulation_config = build_simulation_config(
+        player, casino, playing_strategy, betting_strategy, sim.iterations,
+        target_std_error=sim.target_std_error,
+        seed=explicit_seed,
+        true_count_threshold=int(request.form.get('true_count_threshold', 1)),
+        log_hands=request.form.get('log_hands') == 'true',
+        simulation_id=sim.id
+    )
+    if seats:
+        simulation_config['seats'] = [seat_config(*profiles) for profiles in seats]
+    if hand_capture:
+        simulation_config['hand_capture'] = hand_capture
+    if simulation_config['log_hands'] and any(b.counting_system != DEFAULT_COUNTING_SYSTEM
+                                              for _, _, b in seat_profiles(sim)):
+        flash('Hand histories can only be recorded for Hi-Lo betting strategies.', 'error')
+        return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
+
+    # --- FEATURE: Every run is seeded; a blank seed draws a fresh one, recorded on the Simulation and its Result ---
+    seed = explicit_seed if explicit_seed is not None else new_seed()
+    simulation_config['seed'] = seed
+    # --- FEATURE: Reuse stored results for identical or shorter configs ---
+    # The seed is part of both hashes, so only a run asked for by seed can match a stored result.
+    config_hash = config_fingerprint(simulation_config)
+    config_family_hash = config_fingerprint(simulation_config, include_iterations=False)
+    base = None
+    if explicit_seed is not None and request.form.get('force_rerun') != 'true':
+        cached = db.session.query(Result).filter_by(config_hash=config_hash).order_by(Result.timestamp.desc()).first()
+        if cached:
+            flash('An identical simulation has already been run. Showing the stored result.', 'info')
+            return redirect(url_for('main.result_page', result_id=cached.id))
+
+        # Extra seats change which cards the first seat sees, so multi-seat runs are never topped up;
+        # nor are captures, which would only sample the extra rounds.
+        if not sim.target_std_error and not simulation_config['log_hands'] and not seats and not hand_capture:
+            base = db.session.query(Result).filter(
+                Result.config_family_hash == config_family_hash,
+                Result.rounds_played == Result.iterations,
+                Result.iterations < sim.iterations
+            ).order_by(Result.iterations.desc()).first()
+            if base:
+                # The extra rounds get a child stream of the seed; the Result records both parts
+                simulation_config['iterations'] = sim.iterations - base.iterations
+                simulation_config['seed'] = continuation_seed(seed, base.iterations)
+                current_app.logger.info(f'Topping up result {base.id} with {simulation_config["iterations"]} extra rounds.')
+
+    sim.seed = seed
+    sim.config_hash = config_hash
+    sim.config_family_hash = config_family_hash
+    sim.base_result_id = base.id if base else None
 
     try:
-        task = celery.send_task('jost_simulation_task', args=[simulation_config_json])
+        task = simulation_executor().submit(simulation_config,
+                                            max_shards=current_app.config.get('SIMULATION_MAX_SHARDS', 1),
+                                            min_rounds_per_shard=current_app.config.get('SIMULATION_MIN_SHARD_ROUNDS', 1))
         sim.task_id = task.id
+        sim.shard_task_ids = json.dumps(shard_task_ids(task)) if shard_task_ids(task) else None
         db.session.commit()
-        current_app.logger.info(f'Task {task.id} sent to Celery for simulation {sim.id}')
+        current_app.logger.info(f'Task {task.id} submitted to the {simulation_executor().name} executor for simulation {sim.id}')
     except Exception as e:
-        current_app.logger.error(f'Error sending task to Celery: {e}')
+        current_app.logger.error(f'Error submitting simulation task: {e}')
         flash('Error starting simulation. Please check the logs.', 'error')
         return redirect(url_for('main.run_simulation_page', simulation_id=sim.id))
     
@@ -134,53 +373,125 @@ def simulation_status(simulation_id):
         abort(404)
     return render_template('simulation_status.html', simulation=simulation)
 
+def task_snapshot(task_id, store_missing=True):
+    """
+    Current state of a task as sent to the browser. A task that succeeded
+    before its Result was stored is stored here, unless `store_missing` is
+    False: it is then reported as still storing, for the completion hook to finish.
+    """
+    # Results are stored by the executor's completion hook, so a finished task is usually one indexed lookup.
+    stored = db.session.query(Result.id).filter_by(task_id=task_id, seat=1).first()
+    if stored:
+        return {'state': 'SUCCESS', 'result_url': url_for('main.result_page', result_id=stored.id)}
+
+    task = simulation_executor().result(task_id)
+    # Read the state once: it can change while this snapshot is being built.
+    state = task.state
+
+    if state == 'SUCCESS' and not store_missing:
+        return {'state': 'STORING', 'status': 'Storing the result...'}
+
+    if state == 'SUCCESS':
+        # No hook stored this task (e.g. it was sent before the workers were upgraded); store it here.
+        current_app.logger.warning(f"Task {task.id} succeeded without a stored result. Storing it now.")
+        result, error = store_task_result(task_id, task.get())
+        if error:
+            return {'state': 'ERROR', 'status': error}
+        return {'state': 'SUCCESS', 'result_url': url_for('main.result_page', result_id=result.id)}
+
+    elif state == 'FAILURE':
+        current_app.logger.error(f"Task {task.id} failed. Reason: {task.info}")
+        return {'state': state, 'status': str(task.info)}
+
+    sim = db.session.query(Simulation).filter_by(task_id=task_id).first()
+    shard_ids = json.loads(sim.shard_task_ids) if sim and sim.shard_task_ids else []
+    progress = simulation_executor().progress(task, shard_ids)
+    status = format_progress(progress) if progress else 'In Progress'
+    return {'state': state, 'status': status, 'progress': progress}
+
 @main.route('/task_status/<task_id>')
 def task_status(task_id):
-    task = celery.AsyncResult(task_id)
-
-    if task.state == 'SUCCESS':
-        current_app.logger.info(f"Task {task.id} succeeded. Processing results.")
-        results_data = task.get()
-        sim = db.session.query(Simulation).filter_by(task_id=task_id).first()
-        if not sim:
-            current_app.logger.error(f"FATAL: Simulation not found for task_id {task_id}")
-            return jsonify({'state': 'ERROR', 'status': 'Simulation not found for this.'})
-        
-        # --- DEFINITIVE FIX: Robustly extract the single player's results ---
-        if not results_data or not isinstance(results_data, dict) or not list(results_data.values()):
-            current_app.logger.error(f"Invalid or empty results data for task {task.id}: {results_data}")
-            flash('Error processing simulation results.', 'error')
-            return jsonify({'state': 'ERROR', 'status': 'Invalid results data.'})
-
-        player_name = list(results_data.keys())[0]
-        outcomes = list(results_data.values())[0]
-        hand_history = outcomes.pop('hand_history', None)
-
-        current_app.logger.info(f"Found simulation {sim.id} for task {task.id}. Creating result.")
-        new_result = Result(
-            simulation_id=sim.id, 
-            player_name=player_name, 
-            casino_name=sim.casino.name,
-            strategy=sim.playing_strategy.name,
-            betting_strategy_name=sim.betting_strategy.name,
-            starting_bankroll=sim.player.bankroll, 
-            iterations=sim.iterations,
-            notes=sim.notes, 
-            outcomes=json.dumps(outcomes),
-            hand_history=json.dumps(hand_history) if hand_history else None
-        )
-        db.session.add(new_result)
-        db.session.commit()
-        current_app.logger.info(f"Result {new_result.id} created for simulation {sim.id}. Redirecting.")
-        return jsonify({'state': 'SUCCESS', 'result_url': url_for('main.result_page', result_id=new_result.id)})
-    
-    elif task.state == 'FAILURE':
-        current_app.logger.error(f"Task {task.id} failed. Reason: {task.info}")
-        status = str(task.info)
-    else:
-        status = 'In Progress'
+    return jsonify(task_snapshot(task_id))
+
+@main.route('/task_events/<task_id>')
+def task_events(task_id):
+    """
+    Server-sent events for one task: a `progress` event whenever the state or
+    progress changes, then a single `complete` or `failure` event.
+
+    The stream sleeps on the executor's watch (Redis pub/sub of the result
+    backend, or the local shards' futures) and only reads the task when it is
+    woken, at most once per `TASK_EVENTS_INTERVAL`. Without a watch it polls,
+    starting at `TASK_EVENTS_POLL_INTERVAL` and backing off. Each open stream
+    holds a connection for up to `TASK_EVENTS_MAX_SECONDS`, so serve the app
+    with a threaded or async server (e.g. gunicorn with gthread or gevent workers).
+    """
+    interval = current_app.config.get('TASK_EVENTS_INTERVAL', 1.0)
+    poll_interval = current_app.config.get('TASK_EVENTS_POLL_INTERVAL', 3.0)
+    max_seconds = current_app.config.get('TASK_EVENTS_MAX_SECONDS', 300)
+    sim = db.session.query(Simulation).filter_by(task_id=task_id).first()
+    shard_ids = json.loads(sim.shard_task_ids) if sim and sim.shard_task_ids else []
+    watch = simulation_executor().watch(task_id, shard_ids)
+
+    def events():
+        started = time.monotonic()
+        delay = poll_interval
+        previous = None
+        quiet = False
+        yield f"retry: {int(poll_interval * 1000)}\n\n"
+        try:
+            while time.monotonic() - started < max_seconds:
+                checked = time.monotonic()
+                # A watch that announces stored Results leaves the store to the hook, unless it stays quiet.
+                snapshot = task_snapshot(task_id, store_missing=watch is None or not watch.announces_store or quiet)
+                db.session.remove()
+                if snapshot['state'] == 'SUCCESS':
+                    yield f"event: complete\ndata: {json.dumps(snapshot)}\n\n"
+                    return
+                if snapshot['state'] in ('FAILURE', 'ERROR', 'REVOKED'):
+                    yield f"event: failure\ndata: {json.dumps(snapshot)}\n\n"
+                    return
+                if snapshot != previous:
+                    yield f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+                previous = snapshot
+                if watch is None:
+                    time.sleep(delay)
+                    delay = min(delay * 2, TASK_EVENTS_KEEPALIVE)
+                    yield ": keep-alive\n\n"
+                    continue
+                quiet = not watch.wait(TASK_EVENTS_KEEPALIVE)
+                if quiet:
+                    yield ": keep-alive\n\n"
+                    continue
+                time.sleep(max(0.0, checked + interval - time.monotonic()))
+        finally:
+            if watch is not None:
+                watch.close()
+        # The browser's EventSource reconnects after `retry` and resumes the stream.
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def format_progress(progress):
+    status = f"{progress['rounds_done']:,} / {progress['total_rounds']:,} rounds"
+    if progress['hands_per_second']:
+        status += f" ({progress['hands_per_second']:,.0f} hands/s)"
+    if progress['edge_std_error'] is not None:
+        status += (f" - edge {progress['edge'] * 100:.3f}% "
+                   f"(95% CI {progress['ci_low'] * 100:.3f}% to {progress['ci_high'] * 100:.3f}%)")
+    return status
 
-    return jsonify({'state': task.state, 'status': status})
+@main.route('/simulation/<int:simulation_id>/abort', methods=['POST'])
+def abort_simulation(simulation_id):
+    sim = db.session.get(Simulation, simulation_id)
+    if not sim or not sim.task_id:
+        abort(404)
+    shard_ids = json.loads(sim.shard_task_ids) if sim.shard_task_ids else []
+    if simulation_executor().abort(sim.task_id, shard_ids):
+        flash('Stopping simulation. Results for the rounds played so far will be saved.', 'success')
+    else:
+        flash('This simulation can no longer be stopped.', 'warning')
+    return redirect(url_for('main.simulation_status', simulation_id=sim.id))
 
 @main.route('/results/<int:result_id>')
 def result_page(result_id):
@@ -193,15 +504,58 @@ def result_page(result_id):
         flash('Error decoding simulation results. The data may be corrupt.', 'error')
         return redirect(url_for('main.results_list'))
 
+    # --- FEATURE: The other seats of a multi-seat run ---
+    table_results = []
+    if result.task_id:
+        table_results = db.session.query(Result).filter(Result.task_id == result.task_id,
+                                                        Result.id != result.id).order_by(Result.seat).all()
+
     return render_template('result_details.html', 
                            result=result, 
-                           outcomes=outcomes)
+                           outcomes=outcomes,
+                           table_results=table_results,
+                           chart=trajectory_chart(result.trajectory()))
+
+def trajectory_chart(trajectory, width=600, height=200):
+    """Scales a stored bankroll trajectory to SVG polyline coordinates."""
+    if not trajectory or len(trajectory['rounds']) < 2:
+        return None
+    rounds, bankroll = trajectory['rounds'], trajectory['bankroll']
+    low, high = float(min(bankroll.min(), 0.0)), float(bankroll.max())
+    span = (high - low) or 1.0
+    xs = rounds / max(int(rounds[-1]), 1) * width
+    ys = height - (bankroll - low) / span * height
+    return {
+        'width': width, 'height': height, 'low': low, 'high': high, 'rounds': int(rounds[-1]),
+        'points': ' '.join(f'{x:.1f},{y:.1f}' for x, y in zip(xs, ys)),
+        'zero_y': height - (0.0 - low) / span * height,
+    }
+
+@main.route('/api/results/<int:result_id>/trajectory')
+def api_result_trajectory(result_id):
+    result = db.session.get(Result, result_id)
+    if not result:
+        abort(404)
+    trajectory = result.trajectory()
+    if not trajectory:
+        abort(404)
+    return jsonify({'rounds': trajectory['rounds'].tolist(), 'bankroll': trajectory['bankroll'].tolist()})
 
 @main.route('/results/<int:result_id>/download_history')
 def download_history(result_id):
     result = db.session.get(Result, result_id)
     if not result:
         abort(404)
+    if result.hand_history_path:
+        if not os.path.exists(result.hand_history_path):
+            flash('The hand history file for this result is missing.', 'error')
+            return redirect(url_for('main.result_page', result_id=result.id))
+        index = json.loads(result.hand_history_index) if result.hand_history_index else None
+        return Response(
+            stream_json_array(result.hand_history_path, index=index),
+            mimetype='application/json',
+            headers={'Content-Disposition': f'attachment;filename=hand_history_{result.id}.json'}
+        )
     if not result.hand_history:
         flash('No hand history available for this result.', 'error')
         return redirect(url_for('main.result_page', result_id=result.id))
@@ -214,5 +568,87 @@ def download_history(result_id):
 
 @main.route('/results')
 def results_list():
-    results = db.session.query(Result).order_by(Result.timestamp.desc()).all()
-    return render_template('results_list.html', results=results)
+    cursor, per_page = page_args()
+    try:
+        page, next_cursor = keyset_page(results_summary_query(), Result, cursor, per_page)
+    except ValueError:
+        abort(400)
+    return render_template('results_list.html', results=page, next_cursor=next_cursor, per_page=per_page)
+
+RESULT_FILTERS = {
+    'casino_name': lambda v: Result.casino_name == v,
+    'strategy': lambda v: Result.strategy == v,
+    'betting_strategy_name': lambda v: Result.betting_strategy_name == v,
+    'min_edge': lambda v: Result.player_edge >= float(v),
+    'max_edge': lambda v: Result.player_edge <= float(v),
+    'min_net': lambda v: Result.net_gain_loss >= float(v),
+}
+
+RESULT_GROUPS = {
+    'casino': Result.casino_name,
+    'strategy': Result.strategy,
+    'betting_strategy': Result.betting_strategy_name,
+    'player': Result.player_name,
+}
+
+def filtered_results(query):
+    for name, build in RESULT_FILTERS.items():
+        if request.args.get(name) is not None:
+            query = query.filter(build(request.args[name]))
+    return query
+
+@main.route('/api/results')
+def api_results():
+    cursor, per_page = page_args()
+    try:
+        page, next_cursor = keyset_page(filtered_results(results_summary_query()), Result, cursor, per_page)
+    except ValueError:
+        abort(400)
+    return jsonify({
+        'items': [{
+            'id': r.id, 'simulation_id': r.simulation_id, 'title': r.simulation.title,
+            'player_name': r.player_name, 'casino_name': r.casino_name, 'strategy': r.strategy,
+            'betting_strategy_name': r.betting_strategy_name, 'iterations': r.iterations,
+            'timestamp': r.timestamp.isoformat() if r.timestamp else None,
+            'player_edge': r.player_edge, 'edge_std_error': r.edge_std_error,
+            'net_gain_loss': r.net_gain_loss, 'total_wagered': r.total_wagered,
+            'url': url_for('main.result_page', result_id=r.id)
+        } for r in page],
+        'next_cursor': next_cursor
+    })
+
+@main.route('/api/results/aggregate')
+def api_results_aggregate():
+    """
+    Per-group result statistics computed in SQL, e.g.
+    /api/results/aggregate?group_by=casino for the best and mean edge per casino.
+    """
+    group_column = RESULT_GROUPS.get(request.args.get('group_by', 'casino'))
+    if group_column is None:
+        return jsonify({'error': f"group_by must be one of: {', '.join(RESULT_GROUPS)}"}), 400
+    query = db.session.query(
+        group_column.label('group'),
+        func.count(Result.id).label('results'),
+        func.max(Result.player_edge).label('best_edge'),
+        func.min(Result.player_edge).label('worst_edge'),
+        func.avg(Result.player_edge).label('mean_edge'),
+        func.sum(Result.net_gain_loss).label('total_net'),
+        func.sum(Result.total_wagered).label('total_wagered'),
+        func.sum(Result.rounds_played).label('rounds_played')
+    ).filter(Result.player_edge.isnot(None))
+    try:
+        query = filtered_results(query)
+    except ValueError:
+        abort(400)
+    rows = query.group_by(group_column).order_by(func.max(Result.player_edge).desc()).all()
+    return jsonify({'group_by': request.args.get('group_by', 'casino'), 'groups': [{
+        'group': row.group,
+        'results': row.results,
+        'best_edge': row.best_edge,
+        'worst_edge': row.worst_edge,
+        'mean_edge': row.mean_edge,
+        'pooled_edge': row.total_net / row.total_wagered if row.total_wagered else None,
+        'total_net': row.total_net,
+        'total_wagered': row.total_wagered,
+        'rounds_played': row.rounds_played
+    } for row in rows]})
@@ -0,0 +1,97 @@
+"""
+Pools of pre-shuffled shoes shared by the workers.
+
+A pool is a `.npy` file of shuffled shoes, one uint8 row per shoe in the
+engine's card encoding, written in bulk batches by `generate_shoe_pool`.
+Workers open it with `np.load(..., mmap_mode='r')`, so every process on a box
+shares one page-cached copy, and a lane starts a new shoe by copying a pool
+row instead of shuffling.
+
+A `ShoePool` is a `ShoeSequence` whose shoes are pool rows, dealt in an
+order drawn from the seed, so seeded runs on the same pool file play exactly
+the same cards on any worker. A run deals each row at most once: a pool of
+`count` shoes covers about `count / lanes` shoes per lane (with the default
+100,000 shoes and 1,000 lanes, roughly 100 shoes or a few thousand rounds per
+lane), and the shoes after that are shuffled live, as without a pool. Pool a
+few times more shoes than the longest runs deal to keep them all pooled.
+Separate runs (and the shards of one run) draw their own orders, so they can
+deal the same rows.
+"""
+import os
+
+import numpy as np
+
+from .simulation import DECK, ShoeSequence, shuffled_shoes
+
+POOL_EXTENSION = '.npy'
+GENERATE_BATCH = 4096  # shoes shuffled per NumPy call while writing a pool
+ORDER_STREAM = 2 ** 32  # seed key of a run's pool order, clear of block numbers
+
+_open_pools = {}
+
+
+def pool_path(directory, deck_count):
+    """Where a pool directory keeps its `deck_count`-deck shoes."""
+    return os.path.join(directory, f"shoes_{int(deck_count)}d{POOL_EXTENSION}")
+
+
+def generate_shoe_pool(path, count, deck_count, seed=None, batch=GENERATE_BATCH):
+    """
+    Writes `count` shuffled `deck_count`-deck shoes to `path` and returns the path.
+
+    The pool is built in a temporary file and moved into place, so workers
+    that have the old pool mapped keep reading a consistent file.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = f"{path}.partial{POOL_EXTENSION}"
+    pool = np.lib.format.open_memmap(partial, mode='w+', dtype=np.uint8, shape=(int(count), DECK.size * int(deck_count)))
+    for start in range(0, int(count), batch):
+        stop = min(start + batch, int(count))
+        pool[start:stop] = shuffled_shoes(stop - start, int(deck_count), rng)
+    pool.flush()
+    del pool
+    os.replace(partial, path)
+    return path
+
+
+def open_pool(path):
+    """Maps a pool file read-only, once per process and file version."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _open_pools:
+        pool = np.load(path, mmap_mode='r')
+        if pool.dtype != np.uint8 or pool.ndim != 2 or pool.shape[1] % DECK.size:
+            raise ValueError(f"{path} is not a shoe pool.")
+        # Drop the mapping of a replaced version of this file
+        for stale in [k for k in _open_pools if k[0] == key[0]]:
+            del _open_pools[stale]
+        _open_pools[key] = pool
+    return _open_pools[key]
+
+
+class ShoePool(ShoeSequence):
+    """
+    A `ShoeSequence` that deals pool rows instead of shuffling.
+
+    Block n deals the next `lanes` rows of a seeded permutation of the pool,
+    one shoe per lane. A lane that plays past the end of its shoe continues
+    into the next lane's shoe read from the back, cards that lane only
+    reaches past its own cut card. Blocks beyond the pool are shuffled live.
+    """
+
+    def __init__(self, path, lanes, seed=None):
+        self.pool = open_pool(path)
+        super().__init__(lanes, self.pool.shape[1] // DECK.size, seed)
+        self.order = np.random.default_rng([self.entropy, ORDER_STREAM]).permutation(self.pool.shape[0])
+
+    def _block(self, number):
+        # A single lane takes a second row to continue into
+        count = max(self.lanes, 2)
+        start = number * count
+        if number in self._blocks or start + count > self.order.size:
+            return super()._block(number)
+        shoes = np.asarray(self.pool[self.order[start:start + count]])
+        overflow = np.roll(shoes, -1, axis=0)[:, ::-1]
+        self._blocks[number] = np.concatenate([shoes, overflow], axis=1)[:self.lanes]
+        return self._blocks[number]
@@ -1,8 +1,1313 @@
-def run_simulation(bankroll, iterations):
+"""
+Vectorized blackjack engine.
+
+Instead of playing one round at a time, the engine keeps thousands of
+independent shoes ("lanes") side by side as NumPy arrays and plays one round
+on every lane per step. Player decisions are resolved by indexing a dense
+lookup table built from the same hard/soft/pairs strategy dicts that
+`PlayingStrategy.to_dict()` produces.
+"""
+import os
+import json
+import math
+import time
+import bisect
+import hashlib
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from .counting import counting_system, DEFAULT_COUNTING_SYSTEM
+from .hand_capture import CapturePolicy, HandCapture, CAPTURE_STREAM
+
+logger = logging.getLogger(__name__)
+
+# --- Action codes used in the compiled strategy tables ---
+NO_ACTION = -1
+HIT, STAND, DOUBLE, SPLIT, SURRENDER = range(5)
+ACTION_CODES = {'H': HIT, 'S': STAND, 'D': DOUBLE, 'P': SPLIT, 'R': SURRENDER, 'U': SURRENDER}
+# Surrender cells that name what to do where surrendering is not allowed ("Rs", "Rh", "Rp");
+# a bare SURRENDER cell plays its total's default instead (stand on hard 17+ or soft 18+, hit below).
+SURRENDER_STAND, SURRENDER_HIT, SURRENDER_SPLIT = range(5, 8)
+SURRENDER_CODES = {'S': SURRENDER_STAND, 'H': SURRENDER_HIT, 'P': SURRENDER_SPLIT}
+NO_SURRENDER_ACTIONS = {SURRENDER_STAND: STAND, SURRENDER_HIT: HIT, SURRENDER_SPLIT: SPLIT}
+
+# --- Hand types (first axis of the compiled table) ---
+HARD, SOFT, PAIR = range(3)
+
+# Card values are stored as uint8: 2-10 for pip/face cards, 11 for aces.
+ACE = 11
+DECK = np.array([v for v in range(2, 10) for _ in range(4)] + [10] * 16 + [ACE] * 4, dtype=np.uint8)
+
+DEFAULT_RULES = {
+    'deck_count': 6,
+    'dealer_stands_on_soft_17': False,
+    'blackjack_payout': 1.5,
+    'allow_late_surrender': True,
+    'allow_early_surrender': False,
+    'allow_resplit_to_hands': 4,
+    'allow_double_after_split': True,
+    'allow_double_on_any_two': True,
+    'reshuffle_penetration': 0.75,
+    'offer_insurance': False,
+    'dealer_checks_for_blackjack': True,
+}
+
+DEFAULT_LANES = 8192
+
+STRATEGY_CACHE_SIZE = 64
+_compiled_strategies = OrderedDict()
+
+
+def _card_value(token):
+    token = str(token).strip().upper()
+    if token in ('A', 'ACE'):
+        return ACE
+    if token in ('T', 'J', 'Q', 'K'):
+        return 10
+    return int(token)
+
+
+def _expand_key(key):
+    """Expands a strategy key such as "17-21", "A", "8,8" or "10" into values."""
+    key = str(key).strip().upper()
+    if ',' in key:
+        key = key.split(',')[0]
+    if '-' in key:
+        low, high = key.split('-', 1)
+        return list(range(_card_value(low), _card_value(high) + 1))
+    return [_card_value(key)]
+
+
+def compile_strategy(strategy):
     """
-    A placeholder for the actual simulation logic.
+    Compiles a hard/soft/pairs strategy dict into a dense int8 array indexed by
+    (hand type, player total or pair card, dealer upcard) -> action code.
+
+    Accepts the `PlayingStrategy.to_dict()` shape, the `hard_totals`/`soft_totals`
+    shape used by the bundled JSON files, or either of them nested under a
+    `strategy` key. Missing hard/soft cells fall back to hitting below 17
+    (soft 18) and standing otherwise; missing pair cells are NO_ACTION so the
+    hand is played on its total instead. A surrender cell may name its
+    action for when surrender is not allowed: "Rs", "Rh", or "Rp" on pairs.
     """
-    print(f"Running simulation with bankroll: {bankroll} and iterations: {iterations}")
-    # In the future, this will contain the real blackjack simulation logic.
-    # For now, it returns an empty list of outcomes.
-    return []
+    strategy = strategy or {}
+    if 'strategy' in strategy and isinstance(strategy['strategy'], dict):
+        strategy = strategy['strategy']
+
+    table = np.full((3, 32, 12), NO_ACTION, dtype=np.int8)
+    table[HARD, :17, :] = HIT
+    table[HARD, 17:, :] = STAND
+    table[SOFT, :18, :] = HIT
+    table[SOFT, 18:, :] = STAND
+
+    sections = (
+        (HARD, strategy.get('hard', strategy.get('hard_totals', {}))),
+        (SOFT, strategy.get('soft', strategy.get('soft_totals', {}))),
+        (PAIR, strategy.get('pairs', strategy.get('pair_splitting', {}))),
+    )
+    for hand_type, rows in sections:
+        for player_key, row in (rows or {}).items():
+            for dealer_key, action in row.items():
+                text = str(action).strip().upper()
+                code = ACTION_CODES.get(text[:1])
+                if code is None:
+                    continue
+                if code == SURRENDER:
+                    code = SURRENDER_CODES.get(text[1:2], SURRENDER)
+                    if code == SURRENDER_SPLIT and hand_type != PAIR:
+                        code = SURRENDER
+                for player_value in _expand_key(player_key):
+                    for upcard in _expand_key(dealer_key):
+                        table[hand_type, player_value, upcard] = code
+    return table
+
+
+def content_hash(data):
+    """sha256 of the canonical JSON form of `data`; key order does not matter."""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def strategy_fingerprint(strategy):
+    """Content hash of a strategy dict; equal tables hash equally regardless of key order."""
+    return content_hash(strategy or {})
+
+
+def get_compiled_strategy(strategy, fingerprint=None):
+    """
+    Returns the compiled lookup table for `strategy`, compiling it at most once
+    per process. Tables are cached by content hash with LRU eviction and are
+    read-only because they are shared between runs.
+    """
+    fingerprint = fingerprint or strategy_fingerprint(strategy)
+    table = _compiled_strategies.get(fingerprint)
+    if table is not None:
+        _compiled_strategies.move_to_end(fingerprint)
+        return table
+
+    table = compile_strategy(strategy)
+    table.flags.writeable = False
+    _compiled_strategies[fingerprint] = table
+    if len(_compiled_strategies) > STRATEGY_CACHE_SIZE:
+        _compiled_strategies.popitem(last=False)
+    return table
+
+
+def config_fingerprint(simulation_config, include_iterations=True):
+    """
+    Canonical hash of everything in a simulation config that affects its outcome.
+
+    Without `iterations` the hash identifies a family of runs that differ only in
+    length, which is what incremental top-ups of a stored result match on.
+    """
+    betting = simulation_config.get('betting_strategy') or {}
+    key = {
+        'bankroll': (simulation_config.get('player') or {}).get('bankroll'),
+        'rules': normalize_rules((simulation_config.get('casino') or {}).get('rules')),
+        'strategy': simulation_config.get('strategy_hash') or strategy_fingerprint(simulation_config.get('strategy')),
+        'min_bet': betting.get('min_bet'),
+        'bet_ramp': betting.get('bet_ramp'),
+        'seed': simulation_config.get('seed'),
+        'target_std_error': simulation_config.get('target_std_error'),
+        'log_hands': bool(simulation_config.get('log_hands')),
+    }
+    if betting.get('counting_system', DEFAULT_COUNTING_SYSTEM) != DEFAULT_COUNTING_SYSTEM:
+        # Hi-Lo ramps hash as they did before counting systems were selectable
+        key['counting_system'] = betting['counting_system']
+    if simulation_config.get('shoe_pool'):
+        key['shoe_pool'] = os.path.basename(simulation_config['shoe_pool'])
+    if simulation_config.get('hand_capture'):
+        key['hand_capture'] = simulation_config['hand_capture']
+    if simulation_config.get('seats'):
+        # Extra players at the table change the cards every seat sees
+        key['seats'] = [{
+            'bankroll': (seat.get('player') or {}).get('bankroll'),
+            'strategy': seat.get('strategy_hash') or strategy_fingerprint(seat.get('strategy')),
+            'min_bet': (seat.get('betting_strategy') or {}).get('min_bet'),
+            'bet_ramp': (seat.get('betting_strategy') or {}).get('bet_ramp'),
+            'counting_system': (seat.get('betting_strategy') or {}).get('counting_system', DEFAULT_COUNTING_SYSTEM),
+        } for seat in simulation_config['seats']]
+    if include_iterations:
+        key['iterations'] = simulation_config.get('iterations')
+    return content_hash(key)
+
+
+MAX_SEED = 2 ** 63 - 1  # seeds are stored in signed 64-bit integer columns
+
+
+def new_seed():
+    """A fresh root seed from OS entropy, recorded so the run it seeds can be reproduced."""
+    return int(np.random.SeedSequence().generate_state(1, np.uint64)[0] >> np.uint64(1))
+
+
+def spawn_seed(seed, index):
+    """
+    Seed of the `index`-th independent sub-stream of `seed`: the same stream
+    `shard_seeds(count, seed)` hands its `index`-th shard.
+    """
+    child = np.random.SeedSequence(seed, spawn_key=(int(index),))
+    return int(child.generate_state(1, np.uint64)[0])
+
+
+def continuation_seed(seed, rounds_done):
+    """
+    Seed for rounds played on top of an existing `rounds_done`-round result: a
+    child stream of the original seed, so the extra rounds never replay it.
+    """
+    if seed is None:
+        return None
+    child = np.random.SeedSequence(seed, spawn_key=(int(rounds_done),))
+    return int(child.generate_state(1, np.uint64)[0])
+
+
+def normalize_rules(rules):
+    """Fills in missing casino rules and converts a percentage penetration to a fraction."""
+    normalized = dict(DEFAULT_RULES)
+    normalized.update({k: v for k, v in (rules or {}).items() if v is not None})
+    penetration = float(normalized['reshuffle_penetration'])
+    if penetration > 1:
+        penetration /= 100.0
+    normalized['reshuffle_penetration'] = min(max(penetration, 0.05), 1.0)
+    normalized['deck_count'] = max(1, int(normalized['deck_count']))
+    return normalized
+
+
+def normalize_ramp(bet_ramp):
+    """
+    Returns (thresholds, multipliers) sorted by ascending true count threshold.
+
+    Accepts both the `{"threshold": multiplier}` dict stored on `BettingStrategy`
+    and the list-of-tiers form used by the bundled betting strategy files.
+    """
+    if isinstance(bet_ramp, dict):
+        tiers = [(float(k), float(v)) for k, v in bet_ramp.items()]
+    else:
+        tiers = [(float(t['count_threshold']), float(t['bet_multiplier'])) for t in (bet_ramp or [])]
+    tiers.sort()
+    return (np.array([t for t, _ in tiers], dtype=np.float64),
+            np.array([m for _, m in tiers], dtype=np.float64))
+
+
+MAX_RAMP_SPAN = 1000  # widest integer threshold range compiled into a lookup table
+
+
+class BetRamp:
+    """
+    A bet ramp compiled into a direct count -> bet lookup.
+
+    With integer thresholds (the forms' usual case) every bet is a single
+    index into a table covering the ramp's range, by the floored count;
+    fractional thresholds fall back to a binary search. Counts below the
+    lowest threshold bet `min_bet`.
+    """
+
+    def __init__(self, min_bet=10, bet_ramp=None):
+        self.min_bet = float(min_bet)
+        self.thresholds, self.multipliers = normalize_ramp(bet_ramp)
+        self.table = None
+        thresholds = self.thresholds
+        if (thresholds.size and np.array_equal(thresholds, np.floor(thresholds))
+                and thresholds[-1] - thresholds[0] <= MAX_RAMP_SPAN):
+            self.low = int(thresholds[0]) - 1
+            self.table = self._search(np.arange(self.low, int(thresholds[-1]) + 1, dtype=np.float64))
+            self._table = self.table.tolist()
+
+    def _search(self, counts):
+        tier = np.searchsorted(self.thresholds, counts, side='right') - 1
+        return self.min_bet * np.where(tier >= 0, self.multipliers[np.maximum(tier, 0)], 1.0)
+
+    def bets(self, counts):
+        """Bets for an array of counts."""
+        if self.thresholds.size == 0:
+            return np.full(counts.shape, self.min_bet)
+        if self.table is None:
+            return self._search(counts)
+        return self.table[np.clip(np.floor(counts).astype(np.intp) - self.low, 0, self.table.size - 1)]
+
+    def bet(self, count):
+        """The bet for one count, without NumPy, for the round-by-round engine."""
+        if self.thresholds.size == 0:
+            return self.min_bet
+        if self.table is None:
+            tier = bisect.bisect_right(self.thresholds.tolist(), count) - 1
+            return self.min_bet * (float(self.multipliers[tier]) if tier >= 0 else 1.0)
+        return self._table[min(max(math.floor(count) - self.low, 0), len(self._table) - 1)]
+
+
+def shuffled_shoes(count, deck_count, rng):
+    """`count` independently shuffled `deck_count`-deck shoes as a (count, cards) uint8 array, in one batch."""
+    return rng.permuted(np.tile(np.tile(DECK, deck_count), (count, 1)), axis=1)
+
+
+class ShoeSequence:
+    """
+    A reproducible sequence of shuffled shoes that several tables can share:
+    lane i's n-th shoe holds the same cards for every table drawing from it,
+    however many cards each table's play used up before. Shoes are generated a
+    block (one shoe per lane) at a time from `seed` and the shoe number.
+    """
+
+    def __init__(self, lanes, deck_count, seed=None):
+        self.lanes = lanes
+        self.deck_count = deck_count
+        self.shoe = np.tile(DECK, deck_count)
+        self.entropy = np.random.SeedSequence(seed).entropy
+        self._blocks = {}
+
+    def _shoes(self, rng, count):
+        return shuffled_shoes(count, self.deck_count, rng)
+
+    def _block(self, number):
+        if number not in self._blocks:
+            rng = np.random.default_rng([self.entropy, number])
+            self._blocks[number] = self._shoes(rng, 2 * self.lanes).reshape(self.lanes, -1)
+        return self._blocks[number]
+
+    def shoes(self, idx, numbers):
+        """Rows of two back-to-back shoes for lanes `idx`, each at its lane's shoe number."""
+        rows = np.empty((idx.size, 2 * self.shoe.size), dtype=np.uint8)
+        for number in np.unique(numbers):
+            at = numbers == number
+            rows[at] = self._block(int(number))[idx[at]]
+        return rows
+
+    def release(self, below):
+        """Forgets blocks no table will draw again."""
+        for number in [n for n in self._blocks if n < below]:
+            del self._blocks[number]
+
+
+class ShoeBank:
+    """
+    A batch of independent shoes, one per lane, stored as a (lanes, cards) uint8
+    array. Each row holds two shuffled shoes back to back so a round that runs
+    past the end of the first shoe keeps drawing from a fresh one.
+
+    With a `source` (`ShoeSequence`), shoes come from the shared sequence
+    instead of `rng`, and `shoe_number` counts the shoes each lane has started.
+
+    Running counts are kept incrementally for every system in
+    `counting_systems` (keys of `counting.COUNTING_SYSTEMS`, Hi-Lo by
+    default): one row of `running_count` per system, updated as cards are drawn.
+    """
+
+    def __init__(self, lanes, deck_count, penetration, rng, source=None, counting_systems=None):
+        if source is not None and source.deck_count != deck_count:
+            raise ValueError(f'The shoe source deals {source.deck_count}-deck shoes, not {deck_count}.')
+        self.rng = rng
+        self.source = source
+        self.shoe = np.tile(DECK, deck_count)
+        self.shoe_size = self.shoe.size
+        self.cut = min(max(int(self.shoe_size * penetration), 1), self.shoe_size)
+        self.deck_count = deck_count
+        self.cards = np.empty((lanes, 2 * self.shoe_size), dtype=np.uint8)
+        self.pos = np.zeros(lanes, dtype=np.int64)
+        systems = [counting_system(key) for key in (counting_systems or [DEFAULT_COUNTING_SYSTEM])]
+        self.weights = np.stack([system.weights for system in systems])
+        self.balanced = [system.balanced for system in systems]
+        self.initial_count = np.array([[system.initial_count(deck_count)] for system in systems], dtype=np.int64)
+        self.running_count = np.zeros((len(systems), lanes), dtype=np.int64)
+        # Row views, so a table with one counting system updates one flat array per draw
+        self._counts = list(zip(self.running_count, self.weights))
+        self.shoe_number = np.zeros(lanes, dtype=np.int64)
+        self.shuffle(np.arange(lanes))
+
+    def shuffle(self, idx):
+        if idx.size == 0:
+            return
+        if self.source is not None:
+            self.cards[idx] = self.source.shoes(idx, self.shoe_number[idx])
+        else:
+            self.cards[idx, :self.shoe_size] = shuffled_shoes(idx.size, self.deck_count, self.rng)
+            self.cards[idx, self.shoe_size:] = shuffled_shoes(idx.size, self.deck_count, self.rng)
+        self.shoe_number[idx] += 1
+        self.pos[idx] = 0
+        self.running_count[:, idx] = self.initial_count
+
+    def reshuffle_due(self, n):
+        self.shuffle(np.flatnonzero(self.pos[:n] >= self.cut))
+
+    def draw(self, idx):
+        cards = self.cards[idx, self.pos[idx]]
+        self.pos[idx] += 1
+        for running_count, weights in self._counts:
+            running_count[idx] += weights[cards]
+        return cards
+
+    def count(self, n, system=0):
+        """The count bets key on for the first `n` lanes: the true count, or the running count for unbalanced systems."""
+        if not self.balanced[system]:
+            return self.running_count[system, :n].astype(np.float64)
+        decks_remaining = np.maximum((self.shoe_size - self.pos[:n]) / 52.0, 0.5)
+        return self.running_count[system, :n] / decks_remaining
+
+
+def _add_card(total, soft, cards):
+    total += cards
+    soft += cards == ACE
+    for _ in range(2):
+        bust = (total > 21) & (soft > 0)
+        total[bust] -= 10
+        soft[bust] -= 1
+
+
+def _surrender_fallback(actions, totals, soft, can_surrender):
+    """Surrender cells surrender where allowed and play their no-surrender action elsewhere."""
+    cells = actions >= SURRENDER
+    if not cells.any():
+        return actions
+    blocked = cells & ~can_surrender
+    default = np.where(totals[blocked] >= np.where(soft[blocked] > 0, 18, 17), STAND, HIT)
+    named = actions[blocked]
+    actions[blocked] = np.select([named == code for code in NO_SURRENDER_ACTIONS],
+                                 list(NO_SURRENDER_ACTIONS.values()), default)
+    actions[cells & can_surrender] = SURRENDER
+    return actions
+
+
+def _fallback(actions, totals, soft, can_double, can_split, can_surrender, table, upcards):
+    """Replaces actions that are not allowed for a hand with a legal alternative."""
+    actions = _surrender_fallback(actions, totals, soft, can_surrender)
+    blocked_split = (actions == SPLIT) & ~can_split
+    if blocked_split.any():
+        hand_type = np.where(soft[blocked_split] > 0, SOFT, HARD)
+        actions[blocked_split] = table[hand_type, np.minimum(totals[blocked_split], 31), upcards[blocked_split]]
+        actions = _surrender_fallback(actions, totals, soft, can_surrender)
+    blocked_double = (actions == DOUBLE) & ~can_double
+    actions[blocked_double] = np.where((soft[blocked_double] > 0) & (totals[blocked_double] >= 18), STAND, HIT)
+    return actions
+
+
+MAX_SEATS = 7
+
+
+class Seat:
+    """The strategy table, bet ramp and counting system one seat plays at a `VectorizedTable`."""
+
+    def __init__(self, table, min_bet=10, bet_ramp=None, counting_system=None):
+        self.table = table
+        self.ramp = BetRamp(min_bet, bet_ramp)
+        self.counting_system = counting_system or DEFAULT_COUNTING_SYSTEM
+
+
+class _Hands:
+    """One seat's hand slots on every lane for the round being played."""
+
+    def __init__(self, n, k_max, base_bet):
+        self.base_bet = base_bet
+        self.totals = np.zeros((n, k_max), dtype=np.int16)
+        self.soft = np.zeros((n, k_max), dtype=np.int8)
+        self.first = np.zeros((n, k_max), dtype=np.uint8)
+        self.ncards = np.zeros((n, k_max), dtype=np.int8)
+        self.stake = np.zeros((n, k_max), dtype=np.float64)
+        self.done = np.zeros((n, k_max), dtype=bool)
+        self.surrendered = np.zeros((n, k_max), dtype=bool)
+        self.split_aces = np.zeros((n, k_max), dtype=bool)
+        self.n_hands = np.ones(n, dtype=np.int8)
+        self.net = np.zeros(n, dtype=np.float64)
+        self.resolved = np.zeros(n, dtype=bool)
+
+
+class VectorizedTable:
+    """
+    Plays one round on every lane of a `ShoeBank` per call to `play_round`.
+
+    A table seats one player by default; pass `seats` (up to `MAX_SEATS` `Seat`s)
+    to seat several, who are dealt and play in seat order from the same shoe
+    against one dealer hand, as at a real table.
+    """
+
+    def __init__(self, rules, table=None, min_bet=10, bet_ramp=None, lanes=DEFAULT_LANES, rng=None, shoe_source=None,
+                 seats=None, counting_system=None):
+        self.rules = normalize_rules(rules)
+        self.seats = list(seats) if seats else [Seat(table, min_bet, bet_ramp, counting_system)]
+        if len(self.seats) > MAX_SEATS:
+            raise ValueError(f'A table has at most {MAX_SEATS} seats.')
+        self.max_hands = max(1, int(self.rules['allow_resplit_to_hands']))
+        self.lanes = lanes
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # One running count per counting system in use at the table
+        self.counting_systems = list(dict.fromkeys(seat.counting_system for seat in self.seats))
+        self.shoes = ShoeBank(lanes, self.rules['deck_count'], self.rules['reshuffle_penetration'], self.rng,
+                              source=shoe_source, counting_systems=self.counting_systems)
+        # Set `record_details` to keep per-hand detail arrays of the last round in `details`
+        self.record_details = False
+        self.details = None
+
+    def bets(self, n, seat=None):
+        seat = seat or self.seats[0]
+        if seat.ramp.thresholds.size == 0:
+            return np.full(n, seat.ramp.min_bet)
+        return seat.ramp.bets(self.shoes.count(n, self.counting_systems.index(seat.counting_system)))
+
+    def play_round(self, n):
+        """
+        Plays one round on the first `n` lanes. Returns (wagered, net), both
+        float64 arrays of length `n`, for the first seat.
+        """
+        wagered, net = self.play_seats(n)
+        return wagered[0], net[0]
+
+    def play_seats(self, n):
+        """
+        Plays one round on the first `n` lanes. Returns (wagered, net), both
+        float64 arrays of shape (seats, n).
+        """
+        rules = self.rules
+        shoes = self.shoes
+        k_max = self.max_hands
+
+        shoes.reshuffle_due(n)
+        lanes = np.arange(n)
+        if self.record_details:
+            counts = [shoes.count(n, self.counting_systems.index(seat.counting_system)) for seat in self.seats]
+        seats = [(seat, _Hands(n, k_max, self.bets(n, seat))) for seat in self.seats]
+
+        # First card to every seat, the dealer's upcard, second cards, the hole card
+        first_cards = [shoes.draw(lanes) for _ in seats]
+        up = shoes.draw(lanes)
+        second_cards = [shoes.draw(lanes) for _ in seats]
+        hole = shoes.draw(lanes)
+
+        dealer_total = np.zeros(n, dtype=np.int16)
+        dealer_soft = np.zeros(n, dtype=np.int8)
+        _add_card(dealer_total, dealer_soft, up)
+        _add_card(dealer_total, dealer_soft, hole)
+        upcard = up.astype(np.intp)
+        dealer_bj = dealer_total == 21
+
+        for (seat, hands), p1, p2 in zip(seats, first_cards, second_cards):
+            self._deal(seat.table, hands, p1, p2, upcard, dealer_bj)
+        for seat, hands in seats:
+            self._play_hands(seat.table, hands, upcard)
+
+        # --- Dealer plays if any hand at the table is still standing ---
+        in_play = np.arange(k_max)[None, :] < np.stack([hands.n_hands for _, hands in seats])[:, :, None]
+        dealer_live = np.zeros(n, dtype=bool)
+        for (_, hands), seat_in_play in zip(seats, in_play):
+            standing = seat_in_play & ~hands.surrendered & (hands.totals <= 21)
+            dealer_live |= ~hands.resolved & standing.any(axis=1)
+        dealer_live &= ~dealer_bj
+        hits_soft_17 = not rules['dealer_stands_on_soft_17']
+        while True:
+            needs = dealer_live & ((dealer_total < 17) | (hits_soft_17 & (dealer_total == 17) & (dealer_soft > 0)))
+            idx = np.flatnonzero(needs)
+            if idx.size == 0:
+                break
+            t, s = dealer_total[idx], dealer_soft[idx]
+            _add_card(t, s, shoes.draw(idx))
+            dealer_total[idx], dealer_soft[idx] = t, s
+
+        # --- Settle the remaining lanes ---
+        wagered = np.empty((len(seats), n), dtype=np.float64)
+        net = np.empty((len(seats), n), dtype=np.float64)
+        dealer_final = dealer_total[:, None]
+        for i, ((_, hands), seat_in_play) in enumerate(zip(seats, in_play)):
+            totals = hands.totals
+            open_lanes = ~hands.resolved
+            hand_stake = np.where(seat_in_play, hands.stake, 0.0)
+            won = (totals <= 21) & ((dealer_final > 21) | (totals > dealer_final))
+            lost = (totals > 21) | ((dealer_final <= 21) & (totals < dealer_final)) | dealer_bj[:, None]
+            hand_net = np.where(won & ~dealer_bj[:, None], hand_stake, 0.0)
+            hand_net = np.where(lost, -hand_stake, hand_net)
+            hand_net = np.where(hands.surrendered, -0.5 * hand_stake, hand_net)
+            hands.net[open_lanes] = hand_net[open_lanes].sum(axis=1)
+            wagered[i] = hand_stake.sum(axis=1)
+            net[i] = hands.net
+        if self.record_details:
+            self.details = [self._round_details(hands, seat_in_play, counts[i], p1, p2, up, hole, dealer_total,
+                                                wagered[i], net[i])
+                            for i, ((_, hands), seat_in_play, p1, p2)
+                            in enumerate(zip(seats, in_play, first_cards, second_cards))]
+        return wagered, net
+
+    @staticmethod
+    def _round_details(hands, in_play, count, p1, p2, up, hole, dealer_total, wagered, net):
+        """Per-lane columns describing one seat's round, as `hand_capture` records them."""
+        return {
+            'count': count,
+            'bet': hands.base_bet,
+            'card_1': p1,
+            'card_2': p2,
+            'upcard': up,
+            'hole': hole,
+            'dealer_total': dealer_total,
+            'hands': hands.n_hands,
+            'player_totals': hands.totals,
+            'split': hands.n_hands > 1,
+            'doubled': (in_play & (hands.stake > hands.base_bet[:, None])).any(axis=1),
+            'surrendered': hands.surrendered.any(axis=1),
+            'wagered': wagered,
+            'net': net,
+        }
+
+    def _deal(self, table, hands, p1, p2, upcard, dealer_bj):
+        """Sets up a seat's two-card hand and settles naturals, early surrender and the dealer's peek."""
+        rules = self.rules
+        base_bet = hands.base_bet
+        hands.first[:, 0] = p1
+        t0, s0 = hands.totals[:, 0], hands.soft[:, 0]
+        _add_card(t0, s0, p1)
+        _add_card(t0, s0, p2)
+        hands.ncards[:, 0] = 2
+        hands.stake[:, 0] = base_bet
+
+        player_bj = t0 == 21
+        net = hands.net
+        resolved = hands.resolved
+
+        # --- Early surrender happens before the dealer checks for blackjack ---
+        if rules['allow_early_surrender']:
+            is_pair = p1 == p2
+            action = np.where(is_pair, table[PAIR, p1, upcard], NO_ACTION)
+            action = np.where(action == NO_ACTION,
+                              table[np.where(s0 > 0, SOFT, HARD), t0, upcard], action)
+            early = (action >= SURRENDER) & ~player_bj
+            net[early] = -0.5 * base_bet[early]
+            hands.surrendered[early, 0] = True
+            resolved |= early
+
+        if rules['dealer_checks_for_blackjack']:
+            peeked = dealer_bj & ~resolved
+            net[peeked & ~player_bj] = -base_bet[peeked & ~player_bj]
+            resolved |= peeked
+        else:
+            pushed = dealer_bj & player_bj & ~resolved
+            resolved |= pushed
+
+        natural = player_bj & ~dealer_bj & ~resolved
+        net[natural] = base_bet[natural] * float(rules['blackjack_payout'])
+        resolved |= natural
+        hands.done[resolved, 0] = True
+
+    def _play_hands(self, table, hands, upcard):
+        """Player decisions for one seat, one hand slot at a time."""
+        rules = self.rules
+        shoes = self.shoes
+        k_max = self.max_hands
+        totals, soft, first, ncards = hands.totals, hands.soft, hands.first, hands.ncards
+        stake, done, surrendered, split_aces = hands.stake, hands.done, hands.surrendered, hands.split_aces
+        n_hands, resolved, base_bet = hands.n_hands, hands.resolved, hands.base_bet
+
+        for k in range(k_max):
+            while True:
+                live = np.flatnonzero(~resolved & (n_hands > k) & ~done[:, k])
+                if live.size == 0:
+                    break
+                tot = totals[live, k]
+                sft = soft[live, k]
+                ups = upcard[live]
+
+                finished = (tot >= 21) | (split_aces[live, k] & (ncards[live, k] >= 2))
+                done[live[finished], k] = True
+                live, tot, sft, ups = live[~finished], tot[~finished], sft[~finished], ups[~finished]
+                if live.size == 0:
+                    break
+
+                two_cards = ncards[live, k] == 2
+                pair_card = first[live, k]
+                is_pair = two_cards & (tot == np.where(pair_card == ACE, 12, 2 * pair_card.astype(np.int16)))
+                action = np.where(is_pair, table[PAIR, pair_card, ups], NO_ACTION)
+                action = np.where(action == NO_ACTION,
+                                  table[np.where(sft > 0, SOFT, HARD), tot, ups], action)
+
+                from_split = n_hands[live] > 1
+                can_double = two_cards & (rules['allow_double_after_split'] | ~from_split)
+                if not rules['allow_double_on_any_two']:
+                    can_double &= (sft == 0) & (tot >= 9) & (tot <= 11)
+                can_split = is_pair & (n_hands[live] < k_max)
+                can_surrender = (two_cards & ~from_split & (k == 0)
+                                 & bool(rules['allow_late_surrender'] or rules['allow_early_surrender']))
+                action = _fallback(action.astype(np.int8), tot, sft, can_double, can_split,
+                                   can_surrender, table, ups)
+
+                stand = live[action == STAND]
+                done[stand, k] = True
+
+                give_up = live[action == SURRENDER]
+                surrendered[give_up, k] = True
+                done[give_up, k] = True
+
+                hit = live[action == HIT]
+                if hit.size:
+                    cards = shoes.draw(hit)
+                    t, s = totals[hit, k], soft[hit, k]
+                    _add_card(t, s, cards)
+                    totals[hit, k], soft[hit, k] = t, s
+                    ncards[hit, k] += 1
+
+                dbl = live[action == DOUBLE]
+                if dbl.size:
+                    cards = shoes.draw(dbl)
+                    t, s = totals[dbl, k], soft[dbl, k]
+                    _add_card(t, s, cards)
+                    totals[dbl, k], soft[dbl, k] = t, s
+                    ncards[dbl, k] += 1
+                    stake[dbl, k] *= 2
+                    done[dbl, k] = True
+
+                spl = live[action == SPLIT]
+                if spl.size:
+                    new_slot = n_hands[spl].astype(np.intp)
+                    card = first[spl, k]
+                    aces = card == ACE
+                    for slot_idx in (np.full(spl.size, k, dtype=np.intp), new_slot):
+                        first[spl, slot_idx] = card
+                        t = np.zeros(spl.size, dtype=np.int16)
+                        s = np.zeros(spl.size, dtype=np.int8)
+                        _add_card(t, s, card)
+                        _add_card(t, s, shoes.draw(spl))
+                        totals[spl, slot_idx], soft[spl, slot_idx] = t, s
+                        ncards[spl, slot_idx] = 2
+                        split_aces[spl, slot_idx] = aces
+                        done[spl, slot_idx] = False
+                        surrendered[spl, slot_idx] = False
+                    stake[spl, new_slot] = base_bet[spl]
+                    n_hands[spl] += 1
+
+
+CI_Z = 1.96  # two-sided 95% confidence interval
+MIN_CONVERGENCE_ROUNDS = 10000  # don't trust the standard error of tiny samples
+
+
+class RunningStats:
+    """
+    Streaming sums for the edge estimate. The standard error treats the edge as
+    a ratio estimator (net / wagered) over independent rounds.
+    """
+
+    def __init__(self):
+        self.rounds = 0
+        self.wins = 0
+        self.wagered = 0.0
+        self.net = 0.0
+        self.net_sq = 0.0
+        self.wagered_sq = 0.0
+        self.cross = 0.0
+
+    def update(self, wagered, net):
+        self.rounds += int(net.size)
+        self.wins += int((net > 0).sum())
+        self.wagered += float(wagered.sum())
+        self.net += float(net.sum())
+        self.net_sq += float(np.dot(net, net))
+        self.wagered_sq += float(np.dot(wagered, wagered))
+        self.cross += float(np.dot(net, wagered))
+
+    @property
+    def edge(self):
+        return self.net / self.wagered if self.wagered else 0.0
+
+    @property
+    def std_error(self):
+        if self.rounds < 2 or not self.wagered:
+            return None
+        e = self.edge
+        residual_ss = max(self.net_sq - 2 * e * self.cross + e * e * self.wagered_sq, 0.0)
+        return math.sqrt(residual_ss * self.rounds / (self.rounds - 1)) / self.wagered
+
+    def progress(self, total_rounds, elapsed):
+        return progress_report(self.rounds, total_rounds, self.rounds / elapsed if elapsed > 0 else 0.0,
+                               self.net, self.wagered, self.std_error)
+
+
+def progress_report(rounds_done, total_rounds, hands_per_second, net, wagered, std_error):
+    edge = net / wagered if wagered else 0.0
+    return {
+        'rounds_done': int(rounds_done),
+        'total_rounds': int(total_rounds),
+        'hands_per_second': float(hands_per_second),
+        'net_gain_loss': float(net),
+        'total_wagered': float(wagered),
+        'edge': edge,
+        'edge_std_error': std_error,
+        'ci_low': edge - CI_Z * std_error if std_error is not None else None,
+        'ci_high': edge + CI_Z * std_error if std_error is not None else None,
+    }
+
+
+def pooled_std_error(parts):
+    """Combines (std_error, total_wagered) pairs from independent runs into one standard error."""
+    parts = [(se, w) for se, w in parts if w]
+    if not parts or any(se is None for se, _ in parts):
+        return None
+    return math.sqrt(sum((se * w) ** 2 for se, w in parts)) / sum(w for _, w in parts)
+
+
+def merge_progress(reports):
+    """Merges progress reports from independent shards into one report."""
+    reports = [r for r in reports if r]
+    if not reports:
+        return None
+    return progress_report(
+        sum(r['rounds_done'] for r in reports),
+        sum(r['total_rounds'] for r in reports),
+        sum(r['hands_per_second'] for r in reports),
+        sum(r['net_gain_loss'] for r in reports),
+        sum(r['total_wagered'] for r in reports),
+        pooled_std_error((r['edge_std_error'], r['total_wagered']) for r in reports),
+    )
+
+
+TRAJECTORY_POINTS = 500  # bankroll samples kept per result
+TRAJECTORY_KEYS = ('trajectory_rounds', 'bankroll_trajectory')
+
+
+class PathStats:
+    """
+    One-pass statistics of the bankroll path, taking rounds in the order they
+    were played (batch by batch, lane by lane): a trajectory sampled every
+    `step` rounds, the running peak and trough, the maximum drawdown and the
+    first round at which the bankroll was exhausted.
+    """
+
+    def __init__(self, bankroll, total_rounds, points=TRAJECTORY_POINTS):
+        self.bankroll = float(bankroll)
+        self.step = max(1, -(-int(total_rounds) // points))
+        self.rounds = 0
+        self.level = 0.0
+        self.peak = 0.0
+        self.trough = 0.0
+        self.max_drawdown = 0.0
+        self.ruined_at = None
+        self._rounds = [np.zeros(1, dtype=np.int64)]
+        self._levels = [np.zeros(1, dtype=np.float64)]
+
+    def update(self, net):
+        path = self.level + np.cumsum(net)
+        peaks = np.maximum(np.maximum.accumulate(path), self.peak)
+        self.max_drawdown = max(self.max_drawdown, float((peaks - path).max()))
+        self.peak = float(peaks[-1])
+        self.trough = min(self.trough, float(path.min()))
+        if self.ruined_at is None:
+            broke = np.flatnonzero(path <= -self.bankroll)
+            if broke.size:
+                self.ruined_at = self.rounds + int(broke[0]) + 1
+        played = np.arange(self.rounds + 1, self.rounds + path.size + 1)
+        sampled = played % self.step == 0
+        self._rounds.append(played[sampled])
+        self._levels.append(path[sampled])
+        self.rounds += int(path.size)
+        self.level = float(path[-1])
+
+    def summary(self):
+        rounds, levels = np.concatenate(self._rounds), np.concatenate(self._levels)
+        if rounds[-1] != self.rounds:
+            rounds, levels = np.append(rounds, self.rounds), np.append(levels, self.level)
+        return {
+            'max_drawdown': self.max_drawdown,
+            'path_peak': self.peak,
+            'path_trough': self.trough,
+            'ruined_at_round': self.ruined_at,
+            'trajectory_rounds': rounds,
+            'bankroll_trajectory': (self.bankroll + levels).astype(np.float32),
+        }
+
+
+def risk_of_ruin(mean, variance, bankroll):
+    """
+    Probability of ever losing `bankroll` for a player whose per-round result
+    has this mean and variance (diffusion approximation, exp(-2*mu*B/sigma^2)).
+    """
+    if bankroll <= 0:
+        return 1.0
+    if mean <= 0 or variance <= 0:
+        return 1.0 if mean <= 0 else 0.0
+    return math.exp(-2.0 * mean * bankroll / variance)
+
+
+def risk_summary(bankroll, rounds, net, net_sq, unit):
+    """Per-round variance, standard deviation, N0 and risk of ruin from streaming sums."""
+    if rounds < 2:
+        return {}
+    mean = net / rounds
+    variance = max(net_sq / rounds - mean * mean, 0.0) * rounds / (rounds - 1)
+    std_dev = math.sqrt(variance)
+    return {
+        'net_variance': variance,
+        'std_dev_per_round': std_dev,
+        'std_dev_per_round_units': std_dev / unit if unit else None,
+        'betting_unit': float(unit),
+        # Rounds until the expected win equals one standard deviation
+        'n0': variance / (mean * mean) if mean else None,
+        'risk_of_ruin': risk_of_ruin(mean, variance, bankroll),
+    }
+
+
+def _merge_paths(shards, bankroll):
+    """Joins shard bankroll paths end to end, in shard order."""
+    level = peak = trough = max_drawdown = 0.0
+    offset = 0
+    rounds, levels = [], []
+    for shard in shards:
+        max_drawdown = max(max_drawdown, shard['max_drawdown'], peak - (level + shard['path_trough']))
+        peak = max(peak, level + shard['path_peak'])
+        trough = min(trough, level + shard['path_trough'])
+        if shard.get('bankroll_trajectory') is not None:
+            rounds.append(np.asarray(shard['trajectory_rounds'], dtype=np.int64) + offset)
+            levels.append(np.asarray(shard['bankroll_trajectory'], dtype=np.float64) - bankroll + level)
+        level += shard['net_gain_loss']
+        offset += shard.get('rounds_played', 0)
+    merged = {'max_drawdown': max_drawdown, 'path_peak': peak, 'path_trough': trough, 'ruined_at_round': None}
+    if levels:
+        rounds, levels = np.concatenate(rounds), np.concatenate(levels)
+        if trough <= -bankroll:
+            # Exact for the first shard; later shards started from a different level, so use the samples.
+            first = shards[0].get('ruined_at_round')
+            broke = np.flatnonzero(levels <= -bankroll)
+            merged['ruined_at_round'] = first if first is not None else int(rounds[broke[0]] if broke.size else offset)
+        keep = np.unique(np.linspace(0, rounds.size - 1, min(rounds.size, TRAJECTORY_POINTS + 1)).astype(np.int64))
+        merged['trajectory_rounds'] = rounds[keep]
+        merged['bankroll_trajectory'] = (bankroll + levels[keep]).astype(np.float32)
+    return merged
+
+
+class ShoeTotals:
+    """
+    Wagered and net per shoe: sums each lane's rounds until the lane starts its
+    next shoe, keyed by (lane, shoe number). Only finished shoes are reported.
+    """
+
+    def __init__(self, lanes):
+        self.current = np.zeros(lanes, dtype=np.int64)
+        self.wagered = np.zeros(lanes, dtype=np.float64)
+        self.net = np.zeros(lanes, dtype=np.float64)
+        self._keys, self._wagered, self._net = [], [], []
+
+    def update(self, shoe_number, wagered, net):
+        n = net.size
+        changed = np.flatnonzero(shoe_number[:n] != self.current[:n])
+        finished = changed[self.current[changed] > 0]
+        if finished.size:
+            self._keys.append((finished << 32) | self.current[finished])
+            self._wagered.append(self.wagered[finished].copy())
+            self._net.append(self.net[finished].copy())
+        self.current[changed] = shoe_number[changed]
+        self.wagered[changed] = 0.0
+        self.net[changed] = 0.0
+        self.wagered[:n] += wagered
+        self.net[:n] += net
+
+    def finished(self):
+        """(keys, wagered, net) arrays of every finished shoe."""
+        if not self._keys:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+        return np.concatenate(self._keys), np.concatenate(self._wagered), np.concatenate(self._net)
+
+
+def paired_difference(baseline, other):
+    """
+    Edge of `other` minus edge of `baseline` (both `ShoeTotals` from tables that
+    played the same shoes), with a standard error from the per-shoe paired
+    differences. Each shoe's contribution to an edge is linearized as
+    (net - edge * wagered) / mean wagered per shoe. `unpaired_std_error` is what
+    the same difference would have cost from independent runs;
+    `variance_reduction` is how many times fewer hands the pairing needs.
+    """
+    keys_b, wagered_b, net_b = baseline.finished()
+    keys_o, wagered_o, net_o = other.finished()
+    _, ib, io = np.intersect1d(keys_b, keys_o, assume_unique=True, return_indices=True)
+    shoes = int(ib.size)
+    if shoes < 2 or not wagered_b[ib].sum() or not wagered_o[io].sum():
+        return {'shoes': shoes}
+    wagered_b, net_b, wagered_o, net_o = wagered_b[ib], net_b[ib], wagered_o[io], net_o[io]
+    edge_b = net_b.sum() / wagered_b.sum()
+    edge_o = net_o.sum() / wagered_o.sum()
+    z_b = (net_b - edge_b * wagered_b) / wagered_b.mean()
+    z_o = (net_o - edge_o * wagered_o) / wagered_o.mean()
+    std_error = float((z_o - z_b).std(ddof=1) / math.sqrt(shoes))
+    unpaired = float(math.sqrt(z_o.var(ddof=1) + z_b.var(ddof=1)) / math.sqrt(shoes))
+    difference = float(edge_o - edge_b)
+    return {
+        'shoes': shoes,
+        'edge_difference': difference,
+        'edge_difference_std_error': std_error,
+        'ci_low': difference - CI_Z * std_error,
+        'ci_high': difference + CI_Z * std_error,
+        'net_per_shoe_difference': float((net_o - net_b).mean()),
+        'unpaired_std_error': unpaired,
+        'variance_reduction': (unpaired / std_error) ** 2 if std_error else None,
+    }
+
+
+def summarize(bankroll, wagered, net, rounds, wins, std_error=None):
+    total_wagered = float(wagered)
+    net_gain_loss = float(net)
+    return {
+        'final_bankroll': float(bankroll) + net_gain_loss,
+        'net_gain_loss': net_gain_loss,
+        'total_wagered': total_wagered,
+        'player_edge': net_gain_loss / total_wagered if total_wagered else 0.0,
+        'edge_std_error': std_error,
+        'player_win_rate': wins / rounds if rounds else 0.0,
+        'rounds_played': int(rounds),
+    }
+
+
+def _final_outcomes(bankroll, stats, path, min_bet):
+    outcomes = summarize(bankroll, stats.wagered, stats.net, stats.rounds, stats.wins, stats.std_error)
+    outcomes.update(risk_summary(bankroll, stats.rounds, stats.net, stats.net_sq, min_bet))
+    if path.rounds:
+        outcomes.update(path.summary())
+    return outcomes
+
+
+def merge_outcomes(shards, bankroll):
+    """Merges outcome dicts from independently seeded shards into one outcome dict."""
+    wagered = sum(shard['total_wagered'] for shard in shards)
+    net = sum(shard['net_gain_loss'] for shard in shards)
+    rounds = sum(shard.get('rounds_played', 0) for shard in shards)
+    wins = sum(shard.get('player_win_rate', 0.0) * shard.get('rounds_played', 0) for shard in shards)
+    std_error = pooled_std_error((shard.get('edge_std_error'), shard['total_wagered']) for shard in shards)
+    merged = summarize(bankroll, wagered, net, rounds, round(wins), std_error)
+    if any(shard.get('stopped_early') for shard in shards):
+        merged['stopped_early'] = True
+    targets = [shard['target_std_error'] for shard in shards if shard.get('target_std_error')]
+    if targets:
+        # Shards were given sqrt(k)-scaled targets; report the run-level target.
+        merged['target_std_error'] = targets[0] / math.sqrt(len(shards))
+        merged['converged'] = all(shard.get('converged') for shard in shards)
+    if all('net_variance' in shard and 'max_drawdown' in shard for shard in shards):
+        # Each shard's sum of squared round results, recovered from its mean and sample variance
+        net_sq = sum(shard['net_variance'] * (shard['rounds_played'] - 1) + shard['net_gain_loss'] ** 2 / shard['rounds_played']
+                     for shard in shards)
+        merged.update(risk_summary(bankroll, rounds, net, net_sq, shards[0]['betting_unit']))
+        merged.update(_merge_paths(shards, bankroll))
+    captured = [shard for shard in shards if 'hand_capture' in shard and 'hand_history' in shard]
+    if captured:
+        merged.update(_merge_captures(captured))
+    return merged
+
+
+def _merge_captures(shards):
+    """Pools the hands each shard captured, tagging records with their shard, within the policy's limit."""
+    policy = CapturePolicy.from_config(shards[0]['hand_capture']['policy'])
+    history = [dict(record, shard=i) for i, shard in enumerate(shards) for record in shard['hand_history']]
+    history = history[-policy.limit:] if policy.last_n else history[:policy.limit]
+    summary = {'policy': policy.to_dict(), 'matched': sum(shard['hand_capture']['matched'] for shard in shards),
+               'captured': len(history)}
+    return {'hand_history': history, 'hand_capture': summary}
+
+
+def shard_seeds(count, entropy=None):
+    """Derives `count` independent integer seeds from one root seed sequence."""
+    return [int(child.generate_state(1, np.uint64)[0]) for child in np.random.SeedSequence(entropy).spawn(count)]
+
+
+def plan_shards(iterations, max_shards, min_rounds_per_shard):
+    """Splits `iterations` into at most `max_shards` near-equal shard sizes."""
+    iterations = int(iterations)
+    count = max(1, min(int(max_shards), iterations // max(1, int(min_rounds_per_shard))))
+    base, extra = divmod(iterations, count)
+    return [base + (1 if i < extra else 0) for i in range(count)]
+
+
+def _pool_source(shoe_pool, lanes, seed):
+    if not shoe_pool:
+        return None
+    from .shoe_pool import ShoePool
+    return ShoePool(shoe_pool, lanes, seed)
+
+
+def _hand_capture(config, seed, seat=0):
+    if not config:
+        return None
+    return HandCapture(CapturePolicy.from_config(config),
+                       None if seed is None else spawn_seed(seed, CAPTURE_STREAM + seat))
+
+
+def run_simulation(bankroll, iterations, rules=None, strategy=None, min_bet=10, bet_ramp=None,
+                   lanes=DEFAULT_LANES, seed=None, strategy_hash=None,
+                   progress_callback=None, progress_interval=1.0, stop_exceptions=(),
+                   target_std_error=None, counting_system=None, shoe_pool=None, hand_capture=None):
+    """
+    Plays `iterations` rounds across a batch of independent shoes and returns the
+    outcome dict rendered by `result_details.html`.
+
+    `strategy` may be a strategy dict or an already compiled lookup table;
+    `strategy_hash` lets callers that know the strategy's content hash skip
+    hashing it again. `bet_ramp` thresholds are counts of `counting_system`
+    (a `counting.COUNTING_SYSTEMS` key, Hi-Lo by default). `progress_callback`
+    receives a `progress_report` dict at most every `progress_interval`
+    seconds. If one of `stop_exceptions` is raised mid-run (e.g. Celery's soft
+    time limit on abort), the rounds played so far are returned with
+    `stopped_early` set.
+
+    With `target_std_error`, `iterations` becomes an upper bound: the run stops
+    as soon as the standard error of the edge estimate reaches the target.
+
+    With `shoe_pool` (the path of a `shoe_pool` file with the casino's deck
+    count), lanes deal pre-shuffled shoes from the pool instead of shuffling.
+
+    With `hand_capture` (a `hand_capture.CapturePolicy` config dict), the rounds
+    the policy selects are returned as `hand_history` records, with a summary
+    of the capture under `hand_capture`.
+
+    The outcomes also carry the per-round variance, N0, risk of ruin for
+    `bankroll`, the maximum drawdown and a downsampled bankroll trajectory
+    (`TRAJECTORY_KEYS`, as NumPy arrays).
+    """
+    iterations = int(iterations)
+    if iterations <= 0:
+        return summarize(bankroll, 0.0, 0.0, 0, 0)
+
+    lanes = max(1, min(int(lanes), iterations))
+    table = strategy if isinstance(strategy, np.ndarray) else get_compiled_strategy(strategy, strategy_hash)
+    source = _pool_source(shoe_pool, lanes, seed)
+    engine = VectorizedTable(rules, table, min_bet=min_bet, bet_ramp=bet_ramp,
+                             lanes=lanes, rng=np.random.default_rng(seed), counting_system=counting_system,
+                             shoe_source=source)
+    capture = _hand_capture(hand_capture, seed)
+    engine.record_details = capture is not None
+
+    stats = RunningStats()
+    path = PathStats(bankroll, iterations)
+    stopped_early = False
+    converged = False
+    started = last_report = time.monotonic()
+    try:
+        while stats.rounds < iterations:
+            wagered, net = engine.play_round(min(lanes, iterations - stats.rounds))
+            if capture is not None:
+                capture.update(stats.rounds, engine.details[0])
+            if source is not None:
+                source.release(int(engine.shoes.shoe_number.min()))
+            stats.update(wagered, net)
+            path.update(net)
+            if target_std_error and stats.rounds >= MIN_CONVERGENCE_ROUNDS:
+                std_error = stats.std_error
+                if std_error is not None and std_error <= target_std_error:
+                    converged = True
+                    break
+            if progress_callback is not None:
+                now = time.monotonic()
+                if now - last_report >= progress_interval:
+                    progress_callback(stats.progress(iterations, now - started))
+                    last_report = now
+    except stop_exceptions:
+        stopped_early = True
+        logger.info(f"Vectorized simulation stopped early after {stats.rounds} rounds.")
+
+    logger.info(f"Vectorized simulation finished {stats.rounds} rounds on {lanes} lanes.")
+    outcomes = _final_outcomes(bankroll, stats, path, min_bet)
+    if stopped_early:
+        outcomes['stopped_early'] = True
+    if target_std_error:
+        outcomes['target_std_error'] = float(target_std_error)
+        outcomes['converged'] = converged
+    if capture is not None:
+        outcomes['hand_history'] = capture.records()
+        outcomes['hand_capture'] = capture.summary()
+    return outcomes
+
+
+def run_table_simulation(iterations, rules, seats, lanes=DEFAULT_LANES, seed=None,
+                         progress_callback=None, progress_interval=1.0, stop_exceptions=(), shoe_pool=None,
+                         target_std_error=None, hand_capture=None):
+    """
+    Plays `iterations` rounds with up to `MAX_SEATS` players at one table,
+    sharing the shoe and the dealer's hand, and returns one outcome dict per
+    seat, in seat order.
+
+    Each seat is a dict of `bankroll`, `strategy` (dict or compiled table),
+    `min_bet`, `bet_ramp` and optionally `strategy_hash` and `counting_system`.
+    Progress, early stops, `shoe_pool`, `target_std_error` and `hand_capture`
+    behave as in `run_simulation`; progress and convergence follow the first
+    seat, and every seat captures its own hands with its own sampling stream.
+    """
+    iterations = int(iterations)
+    if not seats:
+        return []
+    if iterations <= 0:
+        return [summarize(seat['bankroll'], 0.0, 0.0, 0, 0) for seat in seats]
+
+    lanes = max(1, min(int(lanes), iterations))
+    table_seats = []
+    for seat in seats:
+        strategy = seat.get('strategy')
+        table = strategy if isinstance(strategy, np.ndarray) else get_compiled_strategy(strategy, seat.get('strategy_hash'))
+        table_seats.append(Seat(table, seat.get('min_bet', 10), seat.get('bet_ramp'), seat.get('counting_system')))
+    source = _pool_source(shoe_pool, lanes, seed)
+    engine = VectorizedTable(rules, lanes=lanes, rng=np.random.default_rng(seed), seats=table_seats,
+                             shoe_source=source)
+    captures = [_hand_capture(hand_capture, seed, i) for i in range(len(seats))]
+    engine.record_details = captures[0] is not None
+
+    stats = [RunningStats() for _ in seats]
+    paths = [PathStats(seat['bankroll'], iterations) for seat in seats]
+    stopped_early = False
+    converged = False
+    started = last_report = time.monotonic()
+    try:
+        while stats[0].rounds < iterations:
+            wagered, net = engine.play_seats(min(lanes, iterations - stats[0].rounds))
+            if engine.record_details:
+                for capture, details in zip(captures, engine.details):
+                    capture.update(stats[0].rounds, details)
+            if source is not None:
+                source.release(int(engine.shoes.shoe_number.min()))
+            for stat, path, seat_wagered, seat_net in zip(stats, paths, wagered, net):
+                stat.update(seat_wagered, seat_net)
+                path.update(seat_net)
+            if target_std_error and stats[0].rounds >= MIN_CONVERGENCE_ROUNDS:
+                std_error = stats[0].std_error
+                if std_error is not None and std_error <= target_std_error:
+                    converged = True
+                    break
+            if progress_callback is not None:
+                now = time.monotonic()
+                if now - last_report >= progress_interval:
+                    progress_callback(stats[0].progress(iterations, now - started))
+                    last_report = now
+    except stop_exceptions:
+        stopped_early = True
+        logger.info(f"Table simulation stopped early after {stats[0].rounds} rounds.")
+
+    logger.info(f"Table simulation of {len(seats)} seats finished {stats[0].rounds} rounds on {lanes} lanes.")
+    results = []
+    for seat, stat, path, capture in zip(seats, stats, paths, captures):
+        outcomes = _final_outcomes(seat['bankroll'], stat, path, seat.get('min_bet', 10))
+        if stopped_early:
+            outcomes['stopped_early'] = True
+        if target_std_error:
+            outcomes['target_std_error'] = float(target_std_error)
+            outcomes['converged'] = converged
+        if capture is not None:
+            outcomes['hand_history'] = capture.records()
+            outcomes['hand_capture'] = capture.summary()
+        results.append(outcomes)
+    return results
+
+
+PAIRED_ROUNDS_PER_LANE = 200
+
+
+def run_paired_simulation(bankroll, iterations, configs, lanes=DEFAULT_LANES, seed=None,
+                          progress_callback=None, progress_interval=1.0, stop_exceptions=(), shoe_pool=None):
+    """
+    Plays every configuration in `configs` on the identical seeded shoe
+    sequence (common random numbers) and returns one outcome dict per
+    configuration, in order.
+
+    Each config is a dict of `rules`, `strategy` (dict or compiled table),
+    `min_bet`, `bet_ramp` and optionally `strategy_hash` and `counting_system`. All of them must use
+    the same number of decks. Every outcome after the first carries a
+    `paired_difference` against the first configuration (see
+    `paired_difference`), computed over the shoes both finished. With
+    `shoe_pool`, the shared shoe sequence is drawn from that pool file.
+    """
+    iterations = int(iterations)
+    if not configs:
+        return []
+    deck_counts = {normalize_rules(config.get('rules'))['deck_count'] for config in configs}
+    if len(deck_counts) > 1:
+        raise ValueError('Paired configurations must all use the same number of decks.')
+    if iterations <= 0:
+        return [summarize(bankroll, 0.0, 0.0, 0, 0) for _ in configs]
+
+    # Differences are measured per finished shoe, so every lane should get through several.
+    lanes = max(1, min(int(lanes), iterations // PAIRED_ROUNDS_PER_LANE))
+    source = _pool_source(shoe_pool, lanes, seed) or ShoeSequence(lanes, deck_counts.pop(), seed)
+    engines = []
+    for config in configs:
+        strategy = config.get('strategy')
+        table = strategy if isinstance(strategy, np.ndarray) else get_compiled_strategy(strategy, config.get('strategy_hash'))
+        engines.append(VectorizedTable(config.get('rules'), table, min_bet=config.get('min_bet', 10),
+                                       bet_ramp=config.get('bet_ramp'), lanes=lanes, shoe_source=source,
+                                       counting_system=config.get('counting_system')))
+    stats = [RunningStats() for _ in configs]
+    paths = [PathStats(bankroll, iterations) for _ in configs]
+    shoes = [ShoeTotals(lanes) for _ in configs]
+
+    stopped_early = False
+    started = last_report = time.monotonic()
+    try:
+        while stats[0].rounds < iterations:
+            n = min(lanes, iterations - stats[0].rounds)
+            for engine, stat, path, totals in zip(engines, stats, paths, shoes):
+                wagered, net = engine.play_round(n)
+                stat.update(wagered, net)
+                path.update(net)
+                totals.update(engine.shoes.shoe_number, wagered, net)
+            source.release(min(int(engine.shoes.shoe_number.min()) for engine in engines))
+            if progress_callback is not None:
+                now = time.monotonic()
+                if now - last_report >= progress_interval:
+                    progress_callback(stats[0].progress(iterations, now - started))
+                    last_report = now
+    except stop_exceptions:
+        stopped_early = True
+        logger.info(f"Paired simulation stopped early after {stats[0].rounds} rounds.")
+
+    logger.info(f"Paired simulation of {len(configs)} configurations finished {stats[0].rounds} rounds.")
+    results = []
+    for config, stat, path, totals in zip(configs, stats, paths, shoes):
+        outcomes = _final_outcomes(bankroll, stat, path, config.get('min_bet', 10))
+        if results:
+            outcomes['paired_difference'] = paired_difference(shoes[0], totals)
+        if stopped_early:
+            outcomes['stopped_early'] = True
+        results.append(outcomes)
+    return results
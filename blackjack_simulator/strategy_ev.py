@@ -0,0 +1,558 @@
+"""
+Combinatorial expected value of playing strategies.
+
+Computes the off-the-top EV of a compiled strategy table (see
+`simulation.compile_strategy`) for a set of casino rules without simulating.
+Every initial two-card hand is evaluated against the shoe left after the
+upcard and its own two cards: the dealer's outcome probabilities are found by
+recursing over that composition (for all hands at once, with memoization,
+cached per deck count, soft 17 rule, peek rule and upcard), and the player's
+later draws use its card frequencies. Cards the player draws after the first
+two are not removed, and split hands apply the resplit limit per hand, so the
+result is a close approximation rather than an exact figure: checked against
+off-the-top simulation it is within EV_ERROR_BAND (0.1% of the initial bet),
+and usually within a few hundredths of a percent in six decks. Simulated
+edges over a whole shoe differ by more, since they are per total wagered and
+include the cut-card effect.
+
+Decisions are total-dependent, as a strategy table plays them: a cell's first
+decision is made for all of its two-card hands together, weighted by their
+probabilities.
+
+The same evaluator plays each decision either by the table or optimally, so
+`evaluate_strategy` also reports every cell whose action gives up EV. Optimal
+evaluators and the optimal EV are cached per rule set, so checking an edited
+table in the strategy editor only evaluates the table itself.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from .simulation import (ACE, HARD, SOFT, PAIR, HIT, STAND, DOUBLE, SPLIT, SURRENDER, NO_ACTION,
+                         NO_SURRENDER_ACTIONS, normalize_rules, compile_strategy)
+
+RANKS = (2, 3, 4, 5, 6, 7, 8, 9, 10, ACE)
+# The casino rules that change the EV of a strategy (penetration and insurance don't, off the top)
+EV_RULES = ('deck_count', 'dealer_stands_on_soft_17', 'blackjack_payout', 'allow_late_surrender',
+            'allow_early_surrender', 'allow_resplit_to_hands', 'allow_double_after_split',
+            'allow_double_on_any_two', 'dealer_checks_for_blackjack')
+ACTION_NAMES = {HIT: 'hit', STAND: 'stand', DOUBLE: 'double', SPLIT: 'split', SURRENDER: 'surrender'}
+# The action letters the strategy editor uses
+ACTION_LETTERS = {HIT: 'h', STAND: 's', DOUBLE: 'd', SPLIT: 'p', SURRENDER: 'u'}
+# How far the EV can be from off-the-top play, as a fraction of the initial bet
+EV_ERROR_BAND = 0.001
+# Dealer outcome vector layout: final totals 17-21, bust, blackjack
+BUST, DEALER_BJ = 5, 6
+
+HARD_CELLS = range(5, 21)
+SOFT_CELLS = range(13, 21)
+PAIR_CELLS = RANKS
+
+
+def shoe_counts(deck_count):
+    return tuple(16 * deck_count if rank == 10 else 4 * deck_count for rank in RANKS)
+
+
+def _add(total, soft, card):
+    """Adds a card to a (total, soft) hand; at most one ace can still count as 11 below 22."""
+    total += card
+    aces = int(soft) + (card == ACE)
+    while total > 21 and aces:
+        total -= 10
+        aces -= 1
+    return total, aces > 0
+
+
+def _dealer_stands(total, soft, hits_soft_17):
+    return total > 17 or (total == 17 and not (soft and hits_soft_17))
+
+
+def _dealer_from(counts, total, soft, hits_soft_17, memo):
+    key = (counts, total, soft)
+    if key in memo:
+        return memo[key]
+    outcome = np.zeros(7)
+    remaining = sum(counts)
+    for i, rank in enumerate(RANKS):
+        if not counts[i]:
+            continue
+        p = counts[i] / remaining
+        t, s = _add(total, soft, rank)
+        if t > 21:
+            outcome[BUST] += p
+        elif _dealer_stands(t, s, hits_soft_17):
+            outcome[t - 17] += p
+        else:
+            drawn = counts[:i] + (counts[i] - 1,) + counts[i + 1:]
+            outcome += p * _dealer_from(drawn, t, s, hits_soft_17, memo)
+    memo[key] = outcome
+    return outcome
+
+
+@lru_cache(maxsize=1024)
+def dealer_outcomes(deck_count, hits_soft_17, peeks, upcard):
+    """
+    Probabilities of the dealer's final hand [17, 18, 19, 20, 21, bust,
+    blackjack] given the upcard. With a peek, the distribution is conditioned
+    on the dealer not having blackjack (the blackjack entry is then zero).
+    """
+    counts = list(shoe_counts(deck_count))
+    counts[RANKS.index(upcard)] -= 1
+    remaining = sum(counts)
+    memo = {}
+    outcome = np.zeros(7)
+    up_total, up_soft = _add(0, False, upcard)
+    for i, rank in enumerate(RANKS):
+        if not counts[i]:
+            continue
+        p = counts[i] / remaining
+        t, s = _add(up_total, up_soft, rank)
+        if t == 21:
+            if not peeks:
+                outcome[DEALER_BJ] += p
+            continue
+        if _dealer_stands(t, s, hits_soft_17):
+            outcome[t - 17] += p
+        else:
+            drawn = tuple(counts[:i]) + (counts[i] - 1,) + tuple(counts[i + 1:])
+            outcome += p * _dealer_from(drawn, t, s, hits_soft_17, memo)
+    outcome /= outcome.sum()
+    outcome.flags.writeable = False
+    return outcome
+
+
+def _hand(cards):
+    total, soft = 0, False
+    for card in cards:
+        total, soft = _add(total, soft, card)
+    return total, soft
+
+
+@lru_cache(maxsize=64)
+def initial_hands(deck_count, upcard):
+    """
+    The player's possible first two cards against `upcard`: their ranks, their
+    probabilities, and the rank counts of the shoe left after the upcard and
+    both cards, one row per hand.
+    """
+    after_up = list(shoe_counts(deck_count))
+    after_up[RANKS.index(upcard)] -= 1
+    hands, weights, rows = [], [], []
+    for i, a in enumerate(RANKS):
+        for b in RANKS[i:]:
+            p_hand = _pair_prob(after_up, a, b)
+            if not p_hand:
+                continue
+            rest = list(after_up)
+            rest[RANKS.index(a)] -= 1
+            rest[RANKS.index(b)] -= 1
+            hands.append((a, b))
+            weights.append(p_hand)
+            rows.append(rest)
+    weights, counts = np.array(weights), np.array(rows, dtype=float)
+    weights.flags.writeable = counts.flags.writeable = False
+    return tuple(hands), weights, counts
+
+
+def _dealer_rows(counts, drawn, total, soft, hits_soft_17, peeks, memo):
+    """
+    Dealer outcome rows, one per shoe in `counts`, once the dealer holds
+    `total` having drawn the ranks counted in `drawn`; the first draw is the hole card.
+    """
+    key = (drawn, total, soft)
+    if key in memo:
+        return memo[key]
+    remaining = np.maximum(counts - np.array(drawn), 0.0)
+    probs = remaining / remaining.sum(axis=1, keepdims=True)
+    outcome = np.zeros((len(counts), 7))
+    hole = not any(drawn)
+    for i, rank in enumerate(RANKS):
+        p = probs[:, i]
+        if not p.any():
+            continue
+        t, s = _add(total, soft, rank)
+        if hole and t == 21:
+            if not peeks:
+                outcome[:, DEALER_BJ] += p
+        elif t > 21:
+            outcome[:, BUST] += p
+        elif _dealer_stands(t, s, hits_soft_17):
+            outcome[:, t - 17] += p
+        else:
+            more = drawn[:i] + (drawn[i] + 1,) + drawn[i + 1:]
+            outcome += p[:, None] * _dealer_rows(counts, more, t, s, hits_soft_17, peeks, memo)
+    memo[key] = outcome
+    return outcome
+
+
+@lru_cache(maxsize=256)
+def hand_dealer_outcomes(deck_count, hits_soft_17, peeks, upcard):
+    """
+    `dealer_outcomes` for each of the player's initial hands (`initial_hands`
+    rows): the dealer draws from the shoe left after the upcard and the
+    player's two cards.
+    """
+    _, _, counts = initial_hands(deck_count, upcard)
+    up_total, up_soft = _add(0, False, upcard)
+    outcome = _dealer_rows(counts, (0,) * len(RANKS), up_total, up_soft, hits_soft_17, peeks, {})
+    outcome = outcome / outcome.sum(axis=1, keepdims=True)
+    outcome.flags.writeable = False
+    return outcome
+
+
+class HandEvaluator:
+    """
+    Expected values of player hands against one upcard, playing either by a
+    compiled strategy `table` or optimally when `table` is None.
+
+    Every value is an array with one entry per initial two-card hand (see
+    `initial_hands`): that hand's cards are out of the shoe for the dealer's
+    outcomes and for every later draw, including the draws of its split hands.
+    """
+
+    def __init__(self, rules, upcard, table=None):
+        self.rules = rules
+        self.upcard = upcard
+        self.table = table
+        self.max_hands = max(1, int(rules['allow_resplit_to_hands']))
+        deck_count = int(rules['deck_count'])
+        self.hands, self.weights, counts = initial_hands(deck_count, upcard)
+        self.dealer = hand_dealer_outcomes(deck_count, not rules['dealer_stands_on_soft_17'],
+                                           bool(rules['dealer_checks_for_blackjack']), upcard)
+        remaining = counts.sum(axis=1)
+        self.p = [column / remaining for column in counts.T]
+        self.p_bj = (counts[:, RANKS.index(ACE if upcard == 10 else 10)] / remaining if upcard in (10, ACE)
+                     else np.zeros(len(self.hands)))
+        self._bust = np.full(len(self.hands), -1.0)
+        self._surrender = np.full(len(self.hands), -0.5)
+        self._stand = [self._stand_value(total) for total in range(22)]
+        self._memo = {}
+        self._rows = {}
+
+    def _stand_value(self, total):
+        d = self.dealer
+        if total < 17:
+            return d[:, BUST] - (1.0 - d[:, BUST])
+        below = d[:, :total - 17].sum(axis=1)
+        above = d[:, total - 16:5].sum(axis=1) + d[:, DEALER_BJ]
+        return d[:, BUST] + below - above
+
+    def first_decisions(self):
+        """Groups the initial hands by the decision they start with: `{(total, soft, pair_card): rows}`."""
+        groups = {}
+        for row, (a, b) in enumerate(self.hands):
+            groups.setdefault(_hand((a, b)) + (a if a == b else None,), []).append(row)
+        return groups
+
+    def cell_rows(self, total, soft, pair_card=None):
+        """
+        Rows of the initial hands a strategy cell decides first: the pair for a
+        pair cell, otherwise the non-pair hands with the cell's total (the pairs
+        themselves when no other two cards make it, as for hard 20).
+        """
+        key = (total, soft, pair_card)
+        if key not in self._rows:
+            if pair_card is not None:
+                rows = [i for i, (a, b) in enumerate(self.hands) if a == b == pair_card]
+            else:
+                rows = [i for i, (a, b) in enumerate(self.hands) if _hand((a, b)) == (total, soft) and a != b]
+                rows = rows or [i for i, (a, b) in enumerate(self.hands) if _hand((a, b)) == (total, soft)]
+            self._rows[key] = rows
+        return self._rows[key]
+
+    def cell_value(self, value, rows):
+        """The probability-weighted mean of `value` over the initial hands in `rows`."""
+        weights = self.weights[rows]
+        return float(weights @ value[rows] / weights.sum())
+
+    # --- Values of single actions ---
+    def stand(self, total):
+        return self._bust if total > 21 else self._stand[total]
+
+    def double(self, total, soft):
+        key = ('double', total, soft)
+        if key not in self._memo:
+            self._memo[key] = 2.0 * sum(p * self.stand(_add(total, soft, rank)[0]) for p, rank in zip(self.p, RANKS))
+        return self._memo[key]
+
+    def hit(self, total, soft):
+        key = ('hit', total, soft)
+        if key not in self._memo:
+            value = np.zeros(len(self.hands))
+            for p, rank in zip(self.p, RANKS):
+                t, s = _add(total, soft, rank)
+                value += p * (-1.0 if t > 21 else self.play(t, s))
+            self._memo[key] = value
+        return self._memo[key]
+
+    # --- Decisions ---
+    def play(self, total, soft):
+        """Value of a hand of three or more cards (or any hand that may only hit or stand)."""
+        if total >= 21:
+            return self.stand(total)
+        key = ('play', total, soft)
+        if key not in self._memo:
+            if self.table is None:
+                # One action for every hand that reaches this total, as a strategy table plays it
+                stand, hit = self.stand(total), self.hit(total, soft)
+                self._memo[key] = stand if self.weights @ (stand - hit) >= 0 else hit
+            else:
+                action = self.table[SOFT if soft else HARD, total, self.upcard]
+                if action >= SURRENDER:
+                    action = _without_surrender(action, total, soft)
+                if action == DOUBLE:
+                    action = STAND if soft and total >= 18 else HIT
+                self._memo[key] = self.stand(total) if action == STAND else self.hit(total, soft)
+        return self._memo[key]
+
+    def can_double(self, total, soft, from_split):
+        if from_split and not self.rules['allow_double_after_split']:
+            return False
+        return self.rules['allow_double_on_any_two'] or (not soft and 9 <= total <= 11)
+
+    def options(self, total, soft, pair_card=None, hands=1, can_surrender=False):
+        """Values of every legal action for a two-card hand."""
+        values = {STAND: self.stand(total), HIT: self.hit(total, soft)}
+        if self.can_double(total, soft, hands > 1):
+            values[DOUBLE] = self.double(total, soft)
+        if pair_card is not None and hands < self.max_hands:
+            values[SPLIT] = self.split(pair_card, hands)
+        if can_surrender:
+            values[SURRENDER] = self._surrender
+        return values
+
+    def choose(self, values, total, soft, pair_card=None):
+        """The action this evaluator takes given the legal `values`, with the engine's fallbacks."""
+        if self.table is None:
+            return max(values, key=lambda action: self.weights @ values[action])
+        action = NO_ACTION
+        if pair_card is not None:
+            action = self.table[PAIR, pair_card, self.upcard]
+            if action >= SURRENDER and SURRENDER not in values:
+                action = _without_surrender(action, total, soft)
+            if action == SPLIT and SPLIT not in values:
+                action = NO_ACTION
+        if action == NO_ACTION:
+            action = self.table[SOFT if soft else HARD, min(total, 31), self.upcard]
+        if action >= SURRENDER:
+            action = SURRENDER if SURRENDER in values else _without_surrender(action, total, soft)
+        if action == SPLIT and SPLIT not in values:
+            action = HIT
+        if action == DOUBLE and DOUBLE not in values:
+            action = STAND if soft and total >= 18 else HIT
+        return int(action)
+
+    def two_card(self, total, soft, pair_card=None, hands=1, can_surrender=False):
+        if total >= 21:
+            return self.stand(total)
+        key = ('two', total, soft, pair_card, hands, can_surrender)
+        if key not in self._memo:
+            values = self.options(total, soft, pair_card, hands, can_surrender)
+            if self.table is None:
+                self._memo[key] = np.max(list(values.values()), axis=0)
+            else:
+                self._memo[key] = values[self.choose(values, total, soft, pair_card)]
+        return self._memo[key]
+
+    def split(self, card, hands):
+        """Value of splitting a pair of `card` when the player already has `hands` hands."""
+        key = ('split', card, hands)
+        if key not in self._memo:
+            self._memo[key] = 2.0 * self.split_hand(card, hands + 1)
+        return self._memo[key]
+
+    def split_hand(self, card, hands):
+        value = np.zeros(len(self.hands))
+        for p, rank in zip(self.p, RANKS):
+            total, soft = _hand((card, rank))
+            if card == ACE:
+                # Split aces take one card each; a ten makes 21, not blackjack
+                value += p * self.stand(total)
+            else:
+                value += p * self.two_card(total, soft, card if rank == card else None, hands)
+        return value
+
+
+def rules_key(rules):
+    """Hashable form of the EV-relevant casino rules, for the caches below."""
+    rules = normalize_rules(rules)
+    return tuple((name, rules[name]) for name in EV_RULES)
+
+
+@lru_cache(maxsize=256)
+def optimal_hands(key, upcard):
+    """The optimal `HandEvaluator` for a `rules_key` and upcard; its memo makes repeat queries free."""
+    return HandEvaluator(dict(key), upcard)
+
+
+def _pair_prob(counts, a, b):
+    """Probability of dealing ranks a and b (either order) from `counts`."""
+    total = sum(counts)
+    ia, ib = RANKS.index(a), RANKS.index(b)
+    if a == b:
+        return counts[ia] / total * (counts[ia] - 1) / (total - 1)
+    return 2.0 * counts[ia] / total * counts[ib] / (total - 1)
+
+
+def _without_surrender(action, total, soft):
+    """What a surrender cell plays where surrendering is not allowed (see `simulation.compile_strategy`)."""
+    return NO_SURRENDER_ACTIONS.get(int(action), STAND if total >= (18 if soft else 17) else HIT)
+
+
+def _settle(value, action, p_bj, peeks, early_surrender):
+    """Folds the dealer's peek into the value of a first decision."""
+    if not peeks:
+        # No peek: the dealer's blackjack is already part of the outcome distribution.
+        return value
+    if action == SURRENDER and early_surrender:
+        return np.full_like(value, -0.5)
+    return p_bj * -1.0 + (1.0 - p_bj) * value
+
+
+def expected_value(rules, table=None):
+    """
+    Off-the-top EV per initial bet of playing `table` (or optimal
+    total-dependent strategy when None) under `rules`.
+    """
+    key = rules_key(rules)
+    if table is None:
+        return _optimal_ev(key)
+    return _expected_value(key, table)
+
+
+@lru_cache(maxsize=64)
+def _optimal_ev(key):
+    return _expected_value(key, None)
+
+
+def _expected_value(key, table):
+    rules = dict(key)
+    full = shoe_counts(int(rules['deck_count']))
+    payout = float(rules['blackjack_payout'])
+    ev = 0.0
+    for upcard in RANKS:
+        p_up = full[RANKS.index(upcard)] / sum(full)
+        hands = HandEvaluator(rules, upcard, table) if table is not None else optimal_hands(key, upcard)
+        value = np.zeros(len(hands.hands))
+        for (total, soft, pair_card), rows in hands.first_decisions().items():
+            if total == 21:
+                value[rows] = (1.0 - hands.p_bj[rows]) * payout
+                continue
+            values, settled = _first_decision(hands, rules, total, soft, pair_card)
+            if table is None:
+                cell = hands.cell_rows(total, soft, pair_card)
+                chosen = settled[max(settled, key=lambda action: hands.cell_value(settled[action], cell))]
+            else:
+                chosen = settled[hands.choose(values, total, soft, pair_card)]
+            value[rows] = chosen[rows]
+        ev += p_up * float(hands.weights @ value)
+    return ev
+
+
+def _decision_cells():
+    """Yields `(section, row, total, soft, pair_card)` for every cell of an editable strategy table."""
+    for total in HARD_CELLS:
+        yield 'hard', total, total, False, None
+    for total in SOFT_CELLS:
+        yield 'soft', total, total, True, None
+    for card in PAIR_CELLS:
+        total, soft = _hand((card, card))
+        yield 'pairs', card, total, soft, card
+
+
+def _first_decision(hands, rules, total, soft, pair_card):
+    """Values of the legal actions for an initial two-card hand, after the dealer's peek."""
+    early_surrender = bool(rules['allow_early_surrender'])
+    values = hands.options(total, soft, pair_card,
+                           can_surrender=bool(rules['allow_late_surrender']) or early_surrender)
+    peeks = bool(rules['dealer_checks_for_blackjack'])
+    return values, {action: _settle(v, action, hands.p_bj, peeks, early_surrender) for action, v in values.items()}
+
+
+def _dealer_key(upcard):
+    return 'A' if upcard == ACE else str(upcard)
+
+
+def cell_losses(rules, table):
+    """
+    Compares each decision cell of `table` with the optimal action for a
+    first two-card decision. Returns cells that give up EV, largest loss first.
+    """
+    key = rules_key(rules)
+    rules = dict(key)
+    cells = []
+    for upcard in RANKS:
+        table_hands = HandEvaluator(rules, upcard, table)
+        best_hands = optimal_hands(key, upcard)
+        for section, row, total, soft, pair_card in _decision_cells():
+            # Cells are judged with the optimal continuation, so each loss is that cell's own.
+            values, settled = _first_decision(best_hands, rules, total, soft, pair_card)
+            rows = best_hands.cell_rows(total, soft, pair_card)
+            settled = {action: best_hands.cell_value(value, rows) for action, value in settled.items()}
+            chosen = table_hands.choose(values, total, soft, pair_card)
+            best = max(settled, key=settled.get)
+            loss = settled[best] - settled[chosen]
+            if loss > 1e-9:
+                cells.append({
+                    'section': section, 'player': row, 'dealer': _dealer_key(upcard),
+                    'action': ACTION_NAMES[chosen], 'best': ACTION_NAMES[best], 'loss': float(loss),
+                })
+    cells.sort(key=lambda cell: -cell['loss'])
+    return cells
+
+
+def evaluate_strategy(rules, table):
+    """EV of `table`, EV of optimal play, their error band, and the cells where `table` falls short."""
+    return {
+        'ev': float(expected_value(rules, table)),
+        'optimal_ev': float(expected_value(rules, None)),
+        'error_band': EV_ERROR_BAND,
+        'cells': cell_losses(rules, table),
+    }
+
+
+def optimal_strategy(rules):
+    """
+    The hard/soft/pairs action table that maximizes EV under `rules`, in the
+    `PlayingStrategy.to_dict()` shape the strategy editor uses.
+
+    Each cell takes the best action for an initial two-card hand. A hard or
+    soft cell also decides hands of three or more cards, where a double or
+    surrender falls back to hitting (a double stands on soft 18+, a
+    surrender on hard 17+ or soft 18+); where that fallback is the worse
+    play for those hands, the cell keeps whichever choice gives the higher
+    overall EV.
+    """
+    key = rules_key(rules)
+    rules = dict(key)
+    strategy = {'hard': {}, 'soft': {}, 'pairs': {}}
+    fallbacks = []
+    for upcard in RANKS:
+        hands = optimal_hands(key, upcard)
+        for section, row, total, soft, pair_card in _decision_cells():
+            _, settled = _first_decision(hands, rules, total, soft, pair_card)
+            rows = hands.cell_rows(total, soft, pair_card)
+            settled = {action: hands.cell_value(value, rows) for action, value in settled.items()}
+            best = max(settled, key=settled.get)
+            row_key = 'A' if section == 'pairs' and row == ACE else str(row)
+            strategy[section].setdefault(row_key, {})[_dealer_key(upcard)] = ACTION_LETTERS[best]
+            if section != 'pairs' and best in (DOUBLE, SURRENDER):
+                if best == SURRENDER:
+                    fallback = _without_surrender(SURRENDER, total, soft)
+                else:
+                    fallback = STAND if soft and total >= 18 else HIT
+                later = (STAND if hands.cell_value(hands.stand(total) - hands.hit(total, soft), rows) >= 0
+                         else HIT)
+                if later != fallback:
+                    fallbacks.append((section, row_key, _dealer_key(upcard), ACTION_LETTERS[later]))
+
+    best_ev = expected_value(rules, compile_strategy(strategy))
+    for section, row_key, dealer, alternative in fallbacks:
+        chosen = strategy[section][row_key][dealer]
+        strategy[section][row_key][dealer] = alternative
+        ev = expected_value(rules, compile_strategy(strategy))
+        if ev > best_ev:
+            best_ev = ev
+        else:
+            strategy[section][row_key][dealer] = chosen
+    return strategy
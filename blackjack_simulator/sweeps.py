@@ -0,0 +1,299 @@
+import json
+import logging
+import itertools
+
+from sqlalchemy import update, select, func, and_, true
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app
+
+from .models import db, Player, Casino, PlayingStrategy, BettingStrategy, Sweep, SweepPoint
+from .routes import simulation_executor, build_simulation_config, shoe_pool_for
+from .payloads import jsonable
+from .simulation import TRAJECTORY_KEYS, new_seed, spawn_seed
+
+sweeps_bp = Blueprint('sweeps', __name__, url_prefix='/sweeps')
+
+MAX_SWEEP_POINTS = 1000
+SWEEPABLE_RULES = (
+    'deck_count', 'dealer_stands_on_soft_17', 'blackjack_payout', 'allow_late_surrender',
+    'allow_early_surrender', 'allow_resplit_to_hands', 'allow_double_after_split',
+    'allow_double_on_any_two', 'reshuffle_penetration', 'offer_insurance', 'dealer_checks_for_blackjack'
+)
+
+def expand_values(value):
+    """Expands a sweep axis: a list, a {"start", "stop", "step"} range (inclusive) or a single value."""
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        start, stop, step = value['start'], value['stop'], value.get('step', 1)
+        if step <= 0:
+            raise ValueError('Range step must be positive.')
+        values = []
+        current = start
+        while current <= stop + step * 1e-9:
+            values.append(round(current, 10))
+            current = start + step * len(values)
+        return values
+    return [value]
+
+def expand_grid(spec, defaults):
+    """
+    Expands a sweep spec into grid points of
+    (casino_id, playing_strategy_id, betting_strategy_id, rule_overrides).
+    """
+    casino_ids = expand_values(spec.get('casino_ids', defaults['casino_id']))
+    playing_ids = expand_values(spec.get('playing_strategy_ids', defaults['playing_strategy_id']))
+    betting_ids = expand_values(spec.get('betting_strategy_ids', defaults['betting_strategy_id']))
+
+    rules = spec.get('rules', {})
+    unknown = set(rules) - set(SWEEPABLE_RULES)
+    if unknown:
+        raise ValueError(f"Unknown casino rules: {', '.join(sorted(unknown))}")
+    rule_names = sorted(rules)
+    rule_values = [expand_values(rules[name]) for name in rule_names]
+
+    points = []
+    for casino_id, playing_id, betting_id in itertools.product(casino_ids, playing_ids, betting_ids):
+        for combination in itertools.product(*rule_values):
+            points.append((casino_id, playing_id, betting_id, dict(zip(rule_names, combination))))
+    return points
+
+def _default_id(model):
+    row = db.session.query(model).filter_by(is_default=True).first()
+    return row.id if row else None
+
+def create_sweep(spec):
+    defaults = {
+        'casino_id': _default_id(Casino),
+        'playing_strategy_id': _default_id(PlayingStrategy),
+        'betting_strategy_id': _default_id(BettingStrategy),
+    }
+    grid = expand_grid(spec, defaults)
+    if not grid:
+        raise ValueError('The sweep expands to no grid points.')
+    if len(grid) > MAX_SWEEP_POINTS:
+        raise ValueError(f'The sweep expands to {len(grid)} points; the limit is {MAX_SWEEP_POINTS}.')
+
+    for model, ids in ((Casino, {p[0] for p in grid}), (PlayingStrategy, {p[1] for p in grid}),
+                       (BettingStrategy, {p[2] for p in grid})):
+        found = {row.id for row in db.session.query(model.id).filter(model.id.in_(ids))}
+        if ids - found:
+            raise ValueError(f"Unknown {model.__tablename__} ids: {sorted(ids - found)}")
+
+    if spec.get('paired'):
+        casino_decks = dict(db.session.query(Casino.id, Casino.deck_count).filter(Casino.id.in_({p[0] for p in grid})))
+        if len({overrides.get('deck_count', casino_decks[casino_id]) for casino_id, _, _, overrides in grid}) > 1:
+            raise ValueError('A paired sweep plays one shoe sequence, so every point needs the same number of decks.')
+
+    # Recorded in the spec so the whole sweep can be replayed; each point plays its own sub-stream
+    spec = dict(spec, seed=spec['seed'] if spec.get('seed') is not None else new_seed())
+    sweep = Sweep(
+        title=spec.get('title') or f'Sweep of {len(grid)} points',
+        spec=json.dumps(spec),
+        iterations=int(spec.get('iterations', 100000)),
+        max_concurrency=max(1, int(spec.get('max_concurrency', current_app.config.get('SIMULATION_LOCAL_WORKERS', 4))))
+    )
+    db.session.add(sweep)
+    db.session.add_all(
+        SweepPoint(sweep=sweep, index=i, casino_id=casino_id, playing_strategy_id=playing_id,
+                   betting_strategy_id=betting_id, rule_overrides=json.dumps(overrides))
+        for i, (casino_id, playing_id, betting_id, overrides) in enumerate(grid)
+    )
+    db.session.commit()
+    return sweep
+
+def _point_config(sweep, point, player, spec):
+    simulation_config = build_simulation_config(
+        player, point.casino, point.playing_strategy, point.betting_strategy, sweep.iterations,
+        seed=spawn_seed(spec['seed'], point.index) if spec.get('seed') is not None else None,
+        target_std_error=spec.get('target_std_error'),
+        log_hands=False
+    )
+    overrides = json.loads(point.rule_overrides)
+    simulation_config['casino']['rules'].update(overrides)
+    # The pool has to match the point's deck count, which the overrides may change
+    simulation_config.pop('shoe_pool', None)
+    shoe_pool = shoe_pool_for(simulation_config['casino']['rules']['deck_count'])
+    if shoe_pool:
+        simulation_config['shoe_pool'] = shoe_pool
+    if overrides:
+        simulation_config['casino']['name'] += ' (' + ', '.join(f'{k}={v}' for k, v in overrides.items()) + ')'
+    return simulation_config
+
+def _sweep_player(spec):
+    if spec.get('player_id'):
+        return db.session.get(Player, spec['player_id'])
+    return db.session.query(Player).filter_by(is_default=True).first()
+
+def _point_outcomes(outcomes):
+    return json.dumps({k: v for k, v in outcomes.items() if k not in TRAJECTORY_KEYS}, default=jsonable)
+
+def _record_point(point, results):
+    if isinstance(results, dict) and 'error' not in results and results:
+        point.outcomes = _point_outcomes(list(results.values())[0])
+        point.state = 'SUCCESS'
+    else:
+        point.state = 'FAILURE'
+        point.error = str(results)
+
+def _record_paired(points, results):
+    paired = results.get('paired') if isinstance(results, dict) else None
+    if isinstance(paired, list) and len(paired) == len(points):
+        for point, outcomes in zip(points, paired):
+            point.outcomes = _point_outcomes(outcomes)
+            point.state = 'SUCCESS'
+        return
+    for point in points:
+        point.state = 'FAILURE'
+        point.error = str(results)
+
+def complete_sweep_task(sweep_id, point_ids, results_data):
+    """
+    Completion hook of a sweep task (the worker's link callback, or the local
+    executor's on_complete): records the outcomes of the grid points the task
+    ran, then submits the next pending points. Page views only read the sweep.
+    """
+    sweep = db.session.get(Sweep, sweep_id)
+    if not sweep:
+        logging.error(f"Sweep {sweep_id} not found for a finished task.")
+        return None
+    points = [p for p in sweep.points if p.id in set(point_ids) and p.state == 'RUNNING']
+    if json.loads(sweep.spec).get('paired'):
+        _record_paired(points, results_data)
+    else:
+        for point in points:
+            _record_point(point, results_data)
+    db.session.commit()
+    return schedule_sweep(sweep)
+
+def _claim(sweep, condition):
+    """
+    Moves the PENDING points matching `condition` to RUNNING in one conditional
+    UPDATE and returns how many this caller claimed, so concurrent schedulers
+    never submit the same point twice.
+    """
+    claimed = db.session.execute(
+        update(SweepPoint)
+        .where(SweepPoint.sweep_id == sweep.id, SweepPoint.state == 'PENDING', condition)
+        .values(state='RUNNING')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return claimed
+
+def _release(point_ids, error):
+    current_app.logger.error(f'Error submitting sweep points {point_ids}: {error}')
+    db.session.execute(update(SweepPoint).where(SweepPoint.id.in_(point_ids), SweepPoint.state == 'RUNNING')
+                       .values(state='PENDING').execution_options(synchronize_session=False))
+    db.session.commit()
+
+def _submitted(point_ids, task):
+    db.session.execute(update(SweepPoint).where(SweepPoint.id.in_(point_ids))
+                       .values(task_id=task.id).execution_options(synchronize_session=False))
+    db.session.commit()
+
+def schedule_sweep(sweep):
+    """
+    Submits pending points while fewer than `max_concurrency` are running.
+    Called when the sweep is created and from `complete_sweep_task` as points
+    finish; each point is claimed before it is submitted, so concurrent calls
+    are safe.
+    """
+    spec = json.loads(sweep.spec)
+    if spec.get('paired'):
+        return schedule_paired_sweep(sweep, spec)
+    executor = simulation_executor()
+    player = _sweep_player(spec)
+    running = select(func.count(SweepPoint.id)).where(
+        SweepPoint.sweep_id == sweep.id, SweepPoint.state == 'RUNNING').scalar_subquery()
+    for point in [p for p in sweep.points if p.state == 'PENDING']:
+        point_id = point.id
+        if not _claim(sweep, and_(SweepPoint.id == point_id, running < sweep.max_concurrency)):
+            if db.session.get(SweepPoint, point_id).state == 'PENDING':
+                break  # every slot is taken
+            continue   # another caller claimed this point
+        simulation_config = _point_config(sweep, db.session.get(SweepPoint, point_id), player, spec)
+        simulation_config.update(sweep_id=sweep.id, sweep_point_ids=[point_id])
+        try:
+            # Grid points run unsharded: the sweep's concurrency already spreads them over the workers.
+            task = executor.submit(simulation_config, max_shards=1)
+        except Exception as e:
+            _release([point_id], e)
+            break
+        _submitted([point_id], task)
+    return sweep
+
+def schedule_paired_sweep(sweep, spec):
+    """
+    Paired sweeps run every grid point in one task, all playing the same
+    seeded shoe sequence, so the differences from point 0 come with paired
+    confidence intervals (`outcomes.paired_difference`).
+    """
+    if not _claim(sweep, true()):
+        return sweep
+    points = sweep.points
+    point_ids = [point.id for point in points]
+    player = _sweep_player(spec)
+    configs = [_point_config(sweep, point, player, spec) for point in points]
+    simulation_config = dict(configs[0], sweep_id=sweep.id, sweep_point_ids=point_ids, paired_configs=[{
+        'rules': c['casino']['rules'],
+        'strategy': c['strategy'],
+        'strategy_hash': c['strategy_hash'],
+        'min_bet': c['betting_strategy']['min_bet'],
+        'bet_ramp': c['betting_strategy']['bet_ramp'],
+        'counting_system': c['betting_strategy'].get('counting_system'),
+    } for c in configs])
+    try:
+        task = simulation_executor().submit(simulation_config, max_shards=1)
+    except Exception as e:
+        _release(point_ids, e)
+        return sweep
+    _submitted(point_ids, task)
+    return sweep
+
+@sweeps_bp.route('/')
+def list_sweeps():
+    sweeps = db.session.query(Sweep).order_by(Sweep.timestamp.desc()).all()
+    return render_template('sweeps.html', sweeps=sweeps)
+
+@sweeps_bp.route('/<int:sweep_id>')
+def sweep_details(sweep_id):
+    sweep = db.session.get(Sweep, sweep_id)
+    if not sweep:
+        abort(404)
+    return render_template('sweep_details.html', sweep=sweep,
+                           points=[p.to_dict() for p in sweep.points],
+                           paired=json.loads(sweep.spec).get('paired', False))
+
+@sweeps_bp.route('/<int:sweep_id>/delete', methods=['POST'])
+def delete_sweep(sweep_id):
+    sweep = db.session.get(Sweep, sweep_id)
+    if not sweep:
+        abort(404)
+    db.session.delete(sweep)
+    db.session.commit()
+    flash('Sweep deleted.', 'success')
+    return redirect(url_for('sweeps.list_sweeps'))
+
+@sweeps_bp.route('/api', methods=['POST'])
+def api_create_sweep():
+    spec = request.get_json(silent=True)
+    if not isinstance(spec, dict):
+        return jsonify({'error': 'Expected a JSON object describing the sweep.'}), 400
+    try:
+        sweep = create_sweep(spec)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+    schedule_sweep(sweep)
+    return jsonify({
+        'id': sweep.id,
+        'points': len(sweep.points),
+        'status_url': url_for('sweeps.api_sweep', sweep_id=sweep.id),
+        'details_url': url_for('sweeps.sweep_details', sweep_id=sweep.id)
+    }), 201
+
+@sweeps_bp.route('/api/<int:sweep_id>')
+def api_sweep(sweep_id):
+    sweep = db.session.get(Sweep, sweep_id)
+    if not sweep:
+        abort(404)
+    return jsonify(sweep.to_dict())
@@ -69,3 +69,151 @@ def test_result_details_page_not_found(client):
     """
     response = client.get(url_for('main.result_page', result_id=999))
     assert response.status_code == 404
+
+def test_download_history_streams_chunked_file(client, tmp_path):
+    """
+    Tests that a hand history stored as a chunked file is streamed back as
+    a JSON array.
+    """
+    from blackjack_simulator.models import Simulation, Result
+    from blackjack_simulator.app import db
+    from blackjack_simulator.hand_history import HandHistoryWriter
+
+    records = [{'hand': i, 'net': 10} for i in range(12)]
+    path = tmp_path / 'history.bjhh'
+    with HandHistoryWriter(str(path), chunk_records=5) as writer:
+        writer.write_many(records)
+
+    new_sim = Simulation(title="History Sim")
+    db.session.add(new_sim)
+    db.session.commit()
+    new_result = Result(
+        simulation_id=new_sim.id, player_name="Test Player", casino_name="Test Casino",
+        starting_bankroll=1000, iterations=12, outcomes=json.dumps({}),
+        hand_history_path=str(path), hand_history_index=json.dumps(writer.index)
+    )
+    db.session.add(new_result)
+    db.session.commit()
+
+    response = client.get(url_for('main.download_history', result_id=new_result.id))
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert json.loads(response.get_data()) == records
+
+def test_results_api_keyset_pagination(client):
+    """
+    Tests that the results listing API pages through every result exactly
+    once, newest first.
+    """
+    from datetime import datetime, timedelta
+    from blackjack_simulator.models import Simulation, Result
+    from blackjack_simulator.app import db
+
+    new_sim = Simulation(title="Paged Sim")
+    db.session.add(new_sim)
+    db.session.commit()
+    start = datetime(2025, 1, 1)
+    for i in range(5):
+        db.session.add(Result(simulation_id=new_sim.id, player_name=f"Player {i}", casino_name="Test Casino",
+                              starting_bankroll=1000, iterations=100, outcomes=json.dumps({}),
+                              timestamp=start + timedelta(minutes=i // 2)))
+    db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        response = client.get(url_for('main.api_results', per_page=2, cursor=cursor))
+        data = response.get_json()
+        assert len(data['items']) <= 2
+        seen.extend(item['player_name'] for item in data['items'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+
+    assert seen == [f"Player {i}" for i in (4, 3, 2, 1, 0)]
+    assert client.get(url_for('main.results_list', per_page=2)).status_code == 200
+    assert client.get(url_for('main.api_results', cursor='not-a-cursor')).status_code == 400
+
+# The tables that have gained columns since the first release, as that release created them
+BASELINE_SCHEMA = """
+CREATE TABLE betting_strategy (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE,
+    min_bet INTEGER NOT NULL, bet_ramp TEXT NOT NULL, is_default BOOLEAN NOT NULL);
+CREATE TABLE simulation (id INTEGER NOT NULL PRIMARY KEY, title VARCHAR(100) NOT NULL,
+    playing_strategy_id INTEGER, betting_strategy_id INTEGER, notes TEXT, iterations INTEGER NOT NULL,
+    timestamp DATETIME, player_id INTEGER, casino_id INTEGER, task_id VARCHAR(155));
+CREATE TABLE result (id INTEGER NOT NULL PRIMARY KEY, simulation_id INTEGER NOT NULL,
+    player_name VARCHAR(100) NOT NULL, casino_name VARCHAR(100) NOT NULL, strategy VARCHAR(100),
+    betting_strategy_name VARCHAR(100), starting_bankroll INTEGER NOT NULL, iterations INTEGER NOT NULL,
+    notes TEXT, outcomes TEXT NOT NULL, timestamp DATETIME, hand_history TEXT);
+INSERT INTO betting_strategy VALUES (1, 'old_ramp', 10, '{"1": 1}', 0);
+INSERT INTO simulation (id, title, iterations) VALUES (1, 'Old Sim', 1000);
+INSERT INTO result (id, simulation_id, player_name, casino_name, starting_bankroll, iterations, outcomes)
+    VALUES (1, 1, 'Old Player', 'Old Casino', 1000, 1000,
+            '{"final_bankroll": 950.0, "net_gain_loss": -50.0, "total_wagered": 10000.0, "player_edge": -0.005}');
+"""
+
+def test_backfill_upgrades_a_database_from_the_first_release(app):
+    """
+    Tests that the backfill command adds the columns an old database lacks
+    before filling them, and that upgrade-db is safe to run again.
+    """
+    from sqlalchemy import inspect, text
+    from blackjack_simulator.models import Result, BettingStrategy
+    from blackjack_simulator.app import db
+
+    db.drop_all()
+    with db.engine.begin() as connection:
+        for statement in BASELINE_SCHEMA.split(';'):
+            if statement.strip():
+                connection.execute(text(statement))
+
+    runner = app.test_cli_runner()
+    output = runner.invoke(args=['backfill-result-metrics']).output
+    assert 'Backfilled metrics for 1 results.' in output
+    result = db.session.get(Result, 1)
+    assert (result.player_edge, result.seat, result.config_hash) == (-0.005, 1, None)
+    assert db.session.get(BettingStrategy, 1).to_dict()['counting_system'] == 'hi_lo'
+    assert {'ix_result_player_edge', 'uq_result_task_id_seat'} <= {index['name'] for index in inspect(db.engine).get_indexes('result')}
+    assert 'sweep' in inspect(db.engine).get_table_names()
+
+    assert 'Database is up to date (0 columns added).' in runner.invoke(args=['upgrade-db']).output
+
+def _add_metric_result(sim, casino_name, edge, wagered=10000.0):
+    from blackjack_simulator.models import Result
+    outcomes = {'final_bankroll': 1000 + edge * wagered, 'net_gain_loss': edge * wagered,
+                'total_wagered': wagered, 'player_edge': edge, 'rounds_played': 1000}
+    return Result(simulation_id=sim.id, player_name="Test Player", casino_name=casino_name,
+                  starting_bankroll=1000, iterations=1000, outcomes=json.dumps(outcomes))
+
+def test_backfill_and_aggregate_result_metrics(app, client):
+    """
+    Tests that the backfill command fills the metric columns from stored
+    outcomes and that the aggregate endpoint groups them in SQL.
+    """
+    from blackjack_simulator.models import Simulation, Result
+    from blackjack_simulator.app import db
+
+    new_sim = Simulation(title="Metrics Sim")
+    db.session.add(new_sim)
+    db.session.commit()
+    db.session.add_all([
+        _add_metric_result(new_sim, "Casino A", -0.005),
+        _add_metric_result(new_sim, "Casino A", 0.001),
+        _add_metric_result(new_sim, "Casino B", -0.02),
+    ])
+    db.session.commit()
+
+    runner = app.test_cli_runner()
+    output = runner.invoke(args=['backfill-result-metrics']).output
+    assert 'Backfilled metrics for 3 results.' in output
+    assert db.session.query(Result).filter(Result.player_edge.is_(None)).count() == 0
+
+    response = client.get(url_for('main.api_results_aggregate', group_by='casino'))
+    groups = {g['group']: g for g in response.get_json()['groups']}
+    assert groups['Casino A']['results'] == 2
+    assert groups['Casino A']['best_edge'] == 0.001
+    assert abs(groups['Casino A']['pooled_edge'] - (-0.002)) < 1e-12
+    assert groups['Casino B']['best_edge'] == -0.02
+
+    response = client.get(url_for('main.api_results', min_edge=0))
+    assert [item['player_edge'] for item in response.get_json()['items']] == [0.001]
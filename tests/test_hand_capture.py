@@ -0,0 +1,82 @@
+import json
+import os
+import pytest
+from flask import url_for
+
+from blackjack_simulator.hand_capture import CapturePolicy
+from blackjack_simulator.simulation import run_simulation, merge_outcomes
+
+STRATEGY_PATH = os.path.join(os.path.dirname(__file__), '..', 'blackjack_simulator', 'data', 'strategies', 'h17_basic_strategy.json')
+RAMP = {'-100': 1, '2': 4}
+
+def load_strategy():
+    with open(STRATEGY_PATH) as f:
+        return json.load(f)
+
+def test_capture_leaves_the_run_unchanged():
+    plain = run_simulation(1000, 20000, strategy=load_strategy(), bet_ramp=RAMP, seed=3)
+    captured = run_simulation(1000, 20000, strategy=load_strategy(), bet_ramp=RAMP, seed=3, hand_capture={'every_n': 1000})
+    assert captured['net_gain_loss'] == plain['net_gain_loss']
+    assert [record['round'] for record in captured['hand_history']] == list(range(0, 20000, 1000))
+    assert captured['hand_capture'] == {'policy': {'every_n': 1000}, 'matched': 20, 'captured': 20}
+
+def test_filters_combine_and_keep_only_matching_hands():
+    policy = {'actions': ['split', 'double'], 'min_true_count': 1, 'min_loss': 20}
+    result = run_simulation(1000, 50000, strategy=load_strategy(), bet_ramp=RAMP, seed=5, hand_capture=policy)
+    history = result['hand_history']
+    assert history and result['hand_capture']['matched'] == len(history)
+    for record in history:
+        assert record['split'] or record['doubled']
+        assert record['count'] >= 1 and record['net'] <= -20
+        assert len(record['player_totals']) == record['hands']
+
+def test_sampling_is_seeded_and_the_rolling_buffer_keeps_the_last_hands():
+    first = run_simulation(1000, 20000, seed=9, hand_capture={'sample_rate': 0.05})
+    again = run_simulation(1000, 20000, seed=9, hand_capture={'sample_rate': 0.05})
+    assert first['hand_history'] == again['hand_history']
+    assert 800 < len(first['hand_history']) < 1200
+
+    everything = run_simulation(1000, 5000, seed=9, hand_capture={'last_n': 25})
+    assert [record['round'] for record in everything['hand_history']] == list(range(4975, 5000))
+    assert everything['hand_capture']['matched'] == 5000
+
+    merged = merge_outcomes([everything, everything], 1000)
+    assert len(merged['hand_history']) == 25 and merged['hand_history'][-1]['shard'] == 1
+    assert merged['hand_capture']['matched'] == 10000
+
+def test_capture_policy_validation():
+    with pytest.raises(ValueError):
+        CapturePolicy(sample_rate=1.5)
+    with pytest.raises(ValueError):
+        CapturePolicy(actions=['insure'])
+    with pytest.raises(ValueError):
+        CapturePolicy(last_n=0, every_n=-1)
+    assert CapturePolicy(every_n=10, actions=['double']).to_dict() == {'every_n': 10, 'actions': ['double']}
+
+def test_run_form_sends_the_capture_policy(app, client, mock_celery_task):
+    from blackjack_simulator.app import db
+    from blackjack_simulator.models import Player, Casino, PlayingStrategy, BettingStrategy, Simulation
+
+    casino = Casino(name='Capture Casino', deck_count=6, dealer_stands_on_soft_17=True, blackjack_payout=1.5,
+                    allow_late_surrender=True, allow_early_surrender=False, allow_resplit_to_hands=4,
+                    allow_double_after_split=True, allow_double_on_any_two=True, reshuffle_penetration=0.75,
+                    offer_insurance=False, dealer_checks_for_blackjack=True)
+    player = Player(name='Capture Player', bankroll=1000)
+    playing = PlayingStrategy(name='Empty', hard_total_actions='{}', soft_total_actions='{}', pair_splitting_actions='{}')
+    betting = BettingStrategy(name='Flat', min_bet=10, bet_ramp='{}')
+    sim = Simulation(title='Capture Sim')
+    db.session.add_all([casino, player, playing, betting, sim])
+    db.session.commit()
+    form = {'player_id': player.id, 'casino_id': casino.id, 'playing_strategy_id': playing.id,
+            'betting_strategy_id': betting.id, 'iterations': 100}
+
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=dict(
+        form, capture_sample_rate='10', capture_actions=['split', 'double'], capture_last_n='50'))
+    sent_config = json.loads(mock_celery_task.call_args.kwargs['args'][0])
+    assert sent_config['hand_capture'] == {'sample_rate': 0.1, 'actions': ['split', 'double'], 'last_n': 50}
+
+    mock_celery_task.reset_mock()
+    response = client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=dict(
+        form, capture_every_n='10', log_hands='true'), follow_redirects=True)
+    assert b'Hand capture is only available' in response.data
+    assert not mock_celery_task.called
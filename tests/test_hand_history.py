@@ -0,0 +1,31 @@
+import json
+
+from blackjack_simulator.hand_history import HandHistoryWriter, iter_records, stream_json_array
+
+def make_records(count):
+    return [{'hand': i, 'cards': [10, i % 10 + 2], 'net': -10 if i % 3 else 15} for i in range(count)]
+
+def test_round_trip_across_chunks(tmp_path):
+    path = tmp_path / 'history.bjhh'
+    records = make_records(25)
+    with HandHistoryWriter(str(path), chunk_records=10) as writer:
+        writer.write_many(records)
+
+    assert [entry[2] for entry in writer.index] == [10, 10, 5]
+    assert list(iter_records(str(path))) == records
+
+def test_index_seeks_to_requested_range(tmp_path):
+    path = tmp_path / 'history.bjhh'
+    records = make_records(25)
+    with HandHistoryWriter(str(path), chunk_records=10) as writer:
+        writer.write_many(records)
+
+    assert list(iter_records(str(path), start=12, stop=15, index=writer.index)) == records[12:15]
+
+def test_stream_json_array_is_valid_json(tmp_path):
+    path = tmp_path / 'history.bjhh'
+    records = make_records(7)
+    with HandHistoryWriter(str(path), chunk_records=3) as writer:
+        writer.write_many(records)
+
+    assert json.loads(''.join(stream_json_array(str(path)))) == records
@@ -0,0 +1,31 @@
+import json
+import numpy as np
+from kombu.serialization import dumps, loads
+
+from blackjack_simulator.payloads import encode, decode, jsonable, RESULT_SERIALIZER, register_result_serializer
+
+def test_arrays_round_trip_as_typed_buffers():
+    trajectory = np.cumsum(np.random.default_rng(1).normal(size=100000)).astype(np.float32)
+    result = {'player': {'net_gain_loss': np.float64(-12.5), 'rounds_played': np.int64(100000),
+                         'bankroll_trajectory': trajectory, 3: 'int key'}}
+
+    data = encode(result)
+    decoded = decode(data)
+
+    assert len(data) < trajectory.nbytes + 200
+    assert decoded['player']['bankroll_trajectory'].dtype == np.float32
+    assert np.array_equal(decoded['player']['bankroll_trajectory'], trajectory)
+    assert decoded['player']['rounds_played'] == 100000
+    assert decoded['player'][3] == 'int key'
+
+def test_unknown_objects_fall_back_to_strings():
+    class Card:
+        def __str__(self):
+            return 'A♠'
+    assert decode(encode({'card': Card()})) == {'card': 'A♠'}
+
+def test_registered_with_kombu_and_json_fallback():
+    register_result_serializer()
+    content_type, encoding, data = dumps({'edge': np.arange(3, dtype=np.int16)}, serializer=RESULT_SERIALIZER)
+    decoded = loads(data, content_type, encoding, accept=[content_type])
+    assert json.loads(json.dumps(decoded, default=jsonable)) == {'edge': [0, 1, 2]}
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import pytest
+from flask import url_for
+
+from blackjack_simulator.profiles import import_profiles, read_directory
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'blackjack_simulator', 'data')
+
+@pytest.fixture(autouse=True)
+def setup_default_data(app):
+    from blackjack_simulator.app import db
+    from blackjack_simulator.models import Casino
+    casino = Casino(name='default_casino', is_default=True, deck_count=6, dealer_stands_on_soft_17=True, blackjack_payout=1.5, allow_late_surrender=True, allow_early_surrender=False, allow_resplit_to_hands=4, allow_double_after_split=True, allow_double_on_any_two=True, reshuffle_penetration=0.5, offer_insurance=True, dealer_checks_for_blackjack=True)
+    db.session.add(casino)
+    db.session.commit()
+
+def _casino(name, deck_count=6):
+    return {'kind': 'casino', 'name': name, 'deck_count': deck_count, 'dealer_stands_on_soft_17': True,
+            'blackjack_payout': 1.5, 'allow_late_surrender': False, 'allow_early_surrender': False,
+            'allow_resplit_to_hands': 4, 'allow_double_after_split': True, 'allow_double_on_any_two': True,
+            'reshuffle_penetration': 0.75, 'offer_insurance': False, 'dealer_checks_for_blackjack': True}
+
+def test_bundled_data_files_import_as_is(app):
+    from blackjack_simulator.models import BettingStrategy, PlayingStrategy
+    from blackjack_simulator.simulation import compile_strategy
+
+    summary = import_profiles(read_directory(DATA_DIR))
+
+    assert summary['betting_strategy']['created'] == 1
+    assert summary['playing_strategy']['created'] == 1
+    flat = BettingStrategy.query.filter_by(name='Flat Bet').one()
+    assert flat.to_dict() == {'name': 'Flat Bet', 'min_bet': 10, 'bet_ramp': {'-100': 1}, 'counting_system': 'hi_lo'}
+    with open(os.path.join(DATA_DIR, 'strategies', 'h17_basic_strategy.json')) as f:
+        expected = compile_strategy(json.load(f))
+    stored = PlayingStrategy.query.filter_by(name='Hit on 17 Basic Strategy').one()
+    assert (compile_strategy(stored.to_dict()) == expected).all()
+
+def test_api_round_trip_upserts_and_keeps_defaults(client):
+    from blackjack_simulator.models import Casino
+
+    body = ''.join(json.dumps(r) + '\n' for r in [_casino('Strip'), _casino('default_casino', 1)])
+    response = client.post(url_for('management.api_import_profiles'), data=body,
+                           content_type='application/x-ndjson')
+    assert response.get_json()['casino'] == {'created': 1, 'updated': 0, 'skipped': 1}
+    assert Casino.query.filter_by(name='default_casino').one().deck_count == 6
+
+    exported = client.get(url_for('management.api_export_profiles', kind='casino')).get_data(as_text=True)
+    records = [json.loads(line) for line in exported.splitlines()]
+    assert [r['name'] for r in records] == ['Strip', 'default_casino']
+
+    records[0]['rules']['deck_count'] = 2
+    response = client.post(url_for('management.api_import_profiles'), json=records)
+    assert response.get_json()['casino'] == {'created': 0, 'updated': 1, 'skipped': 1}
+    assert Casino.query.filter_by(name='Strip').one().deck_count == 2
+
+def test_invalid_record_rolls_back_the_whole_import(client):
+    from blackjack_simulator.models import Casino
+
+    bad = dict(_casino('Broken'))
+    del bad['deck_count']
+    body = json.dumps(_casino('Fine')) + '\n' + json.dumps(bad) + '\n'
+    response = client.post(url_for('management.api_import_profiles'), data=body,
+                           content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert 'deck_count' in response.get_json()['error']
+    assert Casino.query.filter_by(name='Fine').first() is None
+
+def test_cli_seeds_hundreds_of_profiles_quickly(app, tmp_path):
+    from blackjack_simulator.models import Casino
+
+    library = tmp_path / 'library.jsonl'
+    library.write_text(''.join(json.dumps(_casino(f'Casino {i}', 1 + i % 8)) + '\n' for i in range(500)))
+    runner = app.test_cli_runner()
+
+    started = time.perf_counter()
+    output = runner.invoke(args=['import-profiles', str(library)]).output
+    assert time.perf_counter() - started < 1.0
+    assert '500 created' in output
+    assert Casino.query.count() == 501
+
+    output = runner.invoke(args=['export-profiles', str(tmp_path / 'export'), '--kind', 'casino']).output
+    assert 'Exported 501 profiles' in output
+    assert len(os.listdir(tmp_path / 'export' / 'casinos')) == 501
+
+def test_betting_strategies_carry_their_counting_system(client):
+    from blackjack_simulator.models import BettingStrategy
+
+    records = [{'kind': 'betting_strategy', 'name': 'KO Ramp', 'min_bet': 10, 'bet_ramp': {'1': 2, '3': 8},
+                'counting_system': 'ko'},
+               {'kind': 'betting_strategy', 'name': 'Spread', 'min_bet': 10, 'bet_ramp': {'2': 4}}]
+    response = client.post(url_for('management.api_import_profiles'), json=records)
+    assert response.get_json()['betting_strategy'] == {'created': 2, 'updated': 0, 'skipped': 0}
+    assert BettingStrategy.query.filter_by(name='KO Ramp').one().counting_system == 'ko'
+    assert BettingStrategy.query.filter_by(name='Spread').one().counting_system == 'hi_lo'
+    assert 'Knock-Out (KO)' in client.get(url_for('management.list_betting_strategies')).get_data(as_text=True)
+
+    records[0]['counting_system'] = 'red_seven'
+    response = client.post(url_for('management.api_import_profiles'), json=records[:1])
+    assert response.status_code == 400
+    assert 'red_seven' in response.get_json()['error']
@@ -0,0 +1,97 @@
+import json
+import pytest
+import numpy as np
+from flask import url_for
+
+from blackjack_simulator.shoe_pool import generate_shoe_pool, open_pool, pool_path, ShoePool
+from blackjack_simulator.simulation import run_simulation, run_paired_simulation, run_table_simulation, DECK
+
+def test_generated_pool_is_mapped_shuffled_shoes(tmp_path):
+    path = generate_shoe_pool(str(tmp_path / 'shoes_2d.npy'), 1000, 2, seed=4, batch=300)
+
+    pool = open_pool(path)
+    assert isinstance(pool, np.memmap) and not pool.flags.writeable
+    assert pool.shape == (1000, 104) and pool.dtype == np.uint8
+    assert (np.sort(pool, axis=1) == np.sort(np.tile(DECK, 2))).all()
+    assert len({row.tobytes() for row in pool}) == 1000
+    assert open_pool(path) is pool
+    again = generate_shoe_pool(str(tmp_path / 'again.npy'), 1000, 2, seed=4)
+    assert np.array_equal(open_pool(again), pool)
+
+def test_seeded_runs_on_a_pool_reproduce_exactly(tmp_path):
+    path = generate_shoe_pool(str(tmp_path / 'shoes_6d.npy'), 2000, 6, seed=1)
+
+    first = run_simulation(1000, 20000, seed=9, shoe_pool=path)
+    second = run_simulation(1000, 20000, seed=9, shoe_pool=path)
+    other = run_simulation(1000, 20000, seed=10, shoe_pool=path)
+    assert first['net_gain_loss'] == second['net_gain_loss']
+    assert first['net_gain_loss'] != other['net_gain_loss']
+    # The same lane and shoe number deal the same pool rows on any table
+    assert np.array_equal(ShoePool(path, 8, seed=9).shoes(np.arange(8), np.zeros(8, dtype=np.int64)),
+                          ShoePool(path, 8, seed=9).shoes(np.arange(8), np.zeros(8, dtype=np.int64)))
+
+    same, _ = run_paired_simulation(1000, 20000, [{'rules': None}, {'rules': None}], seed=9, shoe_pool=path)
+    assert same['rounds_played'] == 20000
+    with pytest.raises(ValueError):
+        run_simulation(1000, 1000, rules={'deck_count': 2}, shoe_pool=path)
+
+def test_a_run_deals_every_pool_shoe_once_before_shuffling_live(tmp_path):
+    path = generate_shoe_pool(str(tmp_path / 'shoes_1d.npy'), 50, 1, seed=5)
+    rows = {row.tobytes() for row in open_pool(path)}
+    source = ShoePool(path, 10, seed=1)
+    lanes = np.arange(10)
+    blocks = [source.shoes(lanes, np.full(10, number)) for number in range(6)]
+
+    dealt = [shoe[:52].tobytes() for block in blocks[:5] for shoe in block]
+    assert set(dealt) == rows
+    for block in blocks[:5]:
+        # Past its own shoe, a lane continues into the next lane's shoe from the back
+        assert np.array_equal(block[:, 52:], np.roll(block[:, :52], -1, axis=0)[:, ::-1])
+    assert not {shoe[:52].tobytes() for shoe in blocks[5]} & rows
+    assert (np.sort(blocks[5], axis=1) == np.sort(np.tile(DECK, 2))).all()
+    assert not np.array_equal(ShoePool(path, 10, seed=2).shoes(lanes, np.zeros(10, dtype=np.int64)), blocks[0])
+
+    single = ShoePool(path, 1, seed=1).shoes(np.arange(1), np.zeros(1, dtype=np.int64))[0]
+    assert single[:52].tobytes() in rows and single[52:][::-1].tobytes() in rows
+    assert not np.array_equal(single[:52], single[52:][::-1])
+
+def test_cli_pool_is_sent_to_the_workers(app, client, tmp_path, mock_celery_task):
+    from blackjack_simulator.app import db
+    from blackjack_simulator.models import Player, Casino, PlayingStrategy, BettingStrategy, Simulation
+
+    app.config['SHOE_POOL_DIR'] = str(tmp_path)
+    output = app.test_cli_runner().invoke(args=['generate-shoe-pool', '--count', '500', '--seed', '2']).output
+    assert 'Wrote 500 shuffled 6-deck shoes' in output
+
+    casino = Casino(name='Six Deck', deck_count=6, dealer_stands_on_soft_17=True, blackjack_payout=1.5,
+                    allow_late_surrender=True, allow_early_surrender=False, allow_resplit_to_hands=4,
+                    allow_double_after_split=True, allow_double_on_any_two=True, reshuffle_penetration=0.75,
+                    offer_insurance=False, dealer_checks_for_blackjack=True)
+    player = Player(name='Pool Player', bankroll=1000)
+    playing = PlayingStrategy(name='Empty', hard_total_actions='{}', soft_total_actions='{}', pair_splitting_actions='{}')
+    betting = BettingStrategy(name='Flat', min_bet=10, bet_ramp='{}')
+    sim = Simulation(title='Pool Sim')
+    db.session.add_all([casino, player, playing, betting, sim])
+    db.session.commit()
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data={
+        'player_id': player.id, 'casino_id': casino.id, 'playing_strategy_id': playing.id,
+        'betting_strategy_id': betting.id, 'iterations': 100})
+
+    sent_config = json.loads(mock_celery_task.call_args.kwargs['args'][0])
+    assert sent_config['shoe_pool'] == pool_path(str(tmp_path), 6)
+
+def test_pool_runs_release_the_shoes_they_have_dealt(tmp_path, monkeypatch):
+    path = generate_shoe_pool(str(tmp_path / 'shoes_1d.npy'), 500, 1, seed=3)
+    held = []
+    block = ShoePool._block
+    def tracked_block(self, number):
+        rows = block(self, number)
+        held.append(len(self._blocks))
+        return rows
+    monkeypatch.setattr(ShoePool, '_block', tracked_block)
+
+    run_simulation(1000, 20000, rules={'deck_count': 1}, lanes=100, seed=3, shoe_pool=path)
+    assert len(held) > 50 and max(held) <= 3
+    held.clear()
+    run_table_simulation(20000, {'deck_count': 1}, [{'bankroll': 1000}, {'bankroll': 1000}], lanes=100, seed=3, shoe_pool=path)
+    assert len(held) > 50 and max(held) <= 3
@@ -1,3 +1,4 @@
+import json
 import pytest
 from flask import url_for
 from unittest.mock import MagicMock
@@ -113,3 +114,603 @@ def test_simulation_status_success(client, monkeypatch):
     json_response = response.get_json()
     assert json_response['state'] == 'SUCCESS'
     assert 'result_url' in json_response
+
+def test_run_simulation_post_shards_large_runs(client, monkeypatch, mock_celery_task):
+    """
+    Tests that a run larger than the minimum shard size is dispatched as a chord
+    of independently seeded shards instead of a single task.
+    """
+    from blackjack_simulator.models import Simulation, Player, Casino, PlayingStrategy, BettingStrategy
+    from blackjack_simulator.app import db
+
+    new_sim = Simulation(title="Test Sim Sharded")
+    db.session.add(new_sim)
+    db.session.commit()
+
+    chord_result = MagicMock()
+    chord_result.id = 'test_chord_12345'
+    mock_chord = MagicMock(return_value=MagicMock(return_value=chord_result))
+    monkeypatch.setattr('blackjack_simulator.celery_worker.chord', mock_chord)
+    client.application.config['SIMULATION_MAX_SHARDS'] = 4
+    client.application.config['SIMULATION_MIN_SHARD_ROUNDS'] = 1000
+
+    form_data = {
+        'player_id': Player.query.filter_by(name='default_player').first().id,
+        'casino_id': Casino.query.filter_by(name='default_casino').first().id,
+        'playing_strategy_id': PlayingStrategy.query.filter_by(name='basic_strategy').first().id,
+        'betting_strategy_id': BettingStrategy.query.filter_by(name='flat_bet').first().id,
+        'iterations': 10000
+    }
+    response = client.post(url_for('main.run_simulation_action', simulation_id=new_sim.id), data=form_data)
+
+    assert response.status_code == 302
+    mock_celery_task.assert_not_called()
+    header = list(mock_chord.call_args.args[0].tasks)
+    assert len(header) == 4
+    assert db.session.get(Simulation, new_sim.id).task_id == 'test_chord_12345'
+
+def test_task_status_polls_local_executor(client):
+    """
+    Tests that task_status reads results from the local process-pool executor
+    through the same AsyncResult-like interface as Celery.
+    """
+    from concurrent.futures import Future
+    from blackjack_simulator.executors import LocalExecutor, LocalResult
+    from blackjack_simulator.models import Simulation, Player, Casino, PlayingStrategy, BettingStrategy
+    from blackjack_simulator.app import db
+
+    executor = LocalExecutor(max_workers=1)
+    client.application.extensions['simulation_executor'] = executor
+    shards = []
+    for net in (100.0, -50.0):
+        future = Future()
+        future.set_result({"default_player": {
+            "final_bankroll": 1000.0 + net, "net_gain_loss": net, "total_wagered": 1000.0,
+            "player_edge": net / 1000.0, "player_win_rate": 0.5, "rounds_played": 100
+        }})
+        shards.append(future)
+    executor._results['local-test'] = LocalResult('local-test', shards, starting_bankroll=1000)
+
+    new_sim = Simulation(
+        title="Test Sim Local", task_id='local-test',
+        player=Player.query.first(), casino=Casino.query.first(),
+        playing_strategy=PlayingStrategy.query.first(), betting_strategy=BettingStrategy.query.first()
+    )
+    db.session.add(new_sim)
+    db.session.commit()
+
+    response = client.get(url_for('main.task_status', task_id='local-test'))
+    assert response.get_json()['state'] == 'SUCCESS'
+    result = new_sim.results[0]
+    assert json.loads(result.outcomes)['net_gain_loss'] == 50.0
+
+    response = client.get(url_for('main.task_status', task_id='local-missing'))
+    assert response.get_json()['state'] == 'FAILURE'
+
+def test_local_tasks_are_forgotten_once_their_result_is_stored():
+    """
+    Tests that the local executor drops a finished task once its completion
+    hook reports the result stored, and keeps it for status polls otherwise.
+    """
+    from concurrent.futures import Future
+    from blackjack_simulator.executors import LocalExecutor, LocalResult
+
+    completed = []
+    def on_complete(task_id, results, simulation_config):
+        completed.append((task_id, results['default_player']['net_gain_loss']))
+        return simulation_config['stored']
+
+    executor = LocalExecutor(max_workers=1, on_complete=on_complete)
+    for task_id, stored in (('local-stored', True), ('local-unstored', False)):
+        future = Future()
+        executor._results[task_id] = LocalResult(task_id, [future], starting_bankroll=1000)
+        executor._call_on_complete(executor._results[task_id], {'stored': stored})
+        future.set_result({"default_player": {
+            "final_bankroll": 1010.0, "net_gain_loss": 10.0, "total_wagered": 1000.0,
+            "player_edge": 0.01, "player_win_rate": 0.5, "rounds_played": 100
+        }})
+
+    assert completed == [('local-stored', 10.0), ('local-unstored', 10.0)]
+    assert list(executor._results) == ['local-unstored']
+    assert executor.result('local-unstored').state == 'SUCCESS'
+    assert executor.result('local-stored').state == 'FAILURE'
+
+def test_task_status_reports_progress(client, monkeypatch):
+    """
+    Tests that a running task's PROGRESS meta is exposed by task_status.
+    """
+    mock_result = MagicMock()
+    mock_result.id = 'running_task'
+    mock_result.state = 'PROGRESS'
+    mock_result.info = {
+        'rounds_done': 250000, 'total_rounds': 1000000, 'hands_per_second': 500000.0,
+        'net_gain_loss': -12500.0, 'total_wagered': 2500000.0, 'edge': -0.005,
+        'edge_std_error': 0.0023, 'ci_low': -0.0095, 'ci_high': -0.0005
+    }
+    monkeypatch.setattr('blackjack_simulator.routes.celery.AsyncResult', lambda id: mock_result)
+
+    response = client.get(url_for('main.task_status', task_id='running_task'))
+    json_response = response.get_json()
+    assert json_response['state'] == 'PROGRESS'
+    assert json_response['progress']['rounds_done'] == 250000
+    assert json_response['progress']['total_rounds'] == 1000000
+    assert '250,000 / 1,000,000 rounds' in json_response['status']
+
+def test_task_events_streams_progress_then_result(client, monkeypatch):
+    """
+    Tests that the event stream pushes progress changes, persists the result
+    as soon as the task succeeds, and that a later poll reuses that result.
+    """
+    from concurrent.futures import Future
+    from blackjack_simulator.executors import LocalExecutor, LocalResult
+    from blackjack_simulator.models import Simulation, Player, Casino, PlayingStrategy, BettingStrategy, Result
+    from blackjack_simulator.app import db
+
+    client.application.config['TASK_EVENTS_INTERVAL'] = 0.01
+    executor = LocalExecutor(max_workers=1)
+    client.application.extensions['simulation_executor'] = executor
+    future = Future()
+    executor._results['local-events'] = LocalResult('local-events', [future], starting_bankroll=1000)
+    def finish_after_first_check(task, shard_ids):
+        future.set_result({"default_player": {
+            "final_bankroll": 1100.0, "net_gain_loss": 100.0, "total_wagered": 1000.0,
+            "player_edge": 0.1, "player_win_rate": 0.5, "rounds_played": 100
+        }})
+        return None
+    monkeypatch.setattr(executor, 'progress', finish_after_first_check)
+
+    sim = Simulation(
+        title="Test Sim Events", task_id='local-events',
+        player=Player.query.first(), casino=Casino.query.first(),
+        playing_strategy=PlayingStrategy.query.first(), betting_strategy=BettingStrategy.query.first()
+    )
+    db.session.add(sim)
+    db.session.commit()
+
+    response = client.get(url_for('main.task_events', task_id='local-events'))
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    assert body.index('event: progress') < body.index('event: complete')
+    complete = json.loads(body.split('event: complete\ndata: ')[1].split('\n')[0])
+    result = db.session.query(Result).filter_by(task_id='local-events').one()
+    assert complete['result_url'] == url_for('main.result_page', result_id=result.id, _external=False)
+
+    response = client.get(url_for('main.task_status', task_id='local-events'))
+    assert response.get_json()['result_url'] == complete['result_url']
+    assert db.session.query(Result).filter_by(task_id='local-events').count() == 1
+
+def test_task_events_wait_for_the_result_backend_to_publish(client, monkeypatch):
+    """
+    Tests that a stream with a pub/sub watch reads the task only when a change
+    is published, and leaves storing the Result to the completion hook.
+    """
+    from blackjack_simulator.executors import PubSubWatch
+    from blackjack_simulator.results import store_task_result
+    from blackjack_simulator.models import Simulation, Player, Casino, PlayingStrategy, BettingStrategy
+    from blackjack_simulator.app import db
+
+    client.application.config['TASK_EVENTS_INTERVAL'] = 0.01
+    sim = Simulation(
+        title="Test Sim Pubsub", task_id='pubsub-task',
+        player=Player.query.first(), casino=Casino.query.first(),
+        playing_strategy=PlayingStrategy.query.first(), betting_strategy=BettingStrategy.query.first()
+    )
+    db.session.add(sim)
+    db.session.commit()
+    outcomes = {"default_player": {
+        "final_bankroll": 1100.0, "net_gain_loss": 100.0, "total_wagered": 1000.0,
+        "player_edge": 0.1, "player_win_rate": 0.5, "rounds_played": 100
+    }}
+
+    task = MagicMock(id='pubsub-task', state='PROGRESS', info={
+        'rounds_done': 50, 'total_rounds': 100, 'hands_per_second': 0.0, 'net_gain_loss': 0.0,
+        'total_wagered': 0.0, 'edge': 0.0, 'edge_std_error': None})
+    task.get.side_effect = AssertionError('the stream must not store the result itself')
+    monkeypatch.setattr('blackjack_simulator.routes.celery.AsyncResult', lambda id: task)
+    reads = []
+    monkeypatch.setattr('blackjack_simulator.routes.store_task_result',
+                        lambda *args, **kwargs: reads.append(args) or store_task_result(*args, **kwargs))
+
+    def finish():
+        task.state = 'SUCCESS'
+    def store():
+        with client.application.app_context():
+            store_task_result('pubsub-task', outcomes, sim.id)
+    published = [None, finish, None, store]  # subscribe confirmation, task-meta update, confirmation, hook event
+    class FakePubSub:
+        def subscribe(self, *channels):
+            self.channels = channels
+        def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+            if not published:
+                return None
+            event = published.pop(0)
+            if event is None:
+                return None
+            event()
+            return {'type': 'message'}
+        def close(self):
+            pass
+    pubsub = FakePubSub()
+    monkeypatch.setattr(client.application.extensions['simulation_executor'], 'watch',
+                        lambda task_id, shard_ids=(): PubSubWatch(pubsub, ['celery-task-meta-pubsub-task']))
+
+    body = client.get(url_for('main.task_events', task_id='pubsub-task')).get_data(as_text=True)
+    assert body.count('event: progress') == 2 and 'Storing the result' in body
+    assert 'event: complete' in body and not reads
+    assert pubsub.channels == ('celery-task-meta-pubsub-task',)
+
+def test_submitted_task_stores_its_own_result(client, mock_celery_task):
+    """
+    Tests that a simulation task is sent with a linked result-store task that
+    carries the task's own id and the simulation id.
+    """
+    from blackjack_simulator.models import Simulation
+    from blackjack_simulator.app import db
+
+    sim = Simulation(title="Test Sim Hook")
+    db.session.add(sim)
+    db.session.commit()
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=_default_form(100))
+
+    kwargs = mock_celery_task.call_args.kwargs
+    assert kwargs['link'].task == 'jost_store_result_task'
+    assert kwargs['link'].kwargs == {'task_id': kwargs['task_id'], 'simulation_id': sim.id}
+
+def test_stored_result_is_idempotent_and_skips_the_backend(client, monkeypatch):
+    """
+    Tests that storing a task's result twice keeps one row, and that
+    task_status answers from that row without asking the executor.
+    """
+    from blackjack_simulator.models import Simulation, Player, Casino, PlayingStrategy, BettingStrategy, Result
+    from blackjack_simulator.results import store_task_result
+    from blackjack_simulator.app import db
+
+    sim = Simulation(
+        title="Test Sim Store", task_id='stored_task',
+        player=Player.query.first(), casino=Casino.query.first(),
+        playing_strategy=PlayingStrategy.query.first(), betting_strategy=BettingStrategy.query.first()
+    )
+    db.session.add(sim)
+    db.session.commit()
+    results_data = {"default_player": {
+        "final_bankroll": 1100.0, "net_gain_loss": 100.0, "total_wagered": 1000.0,
+        "player_edge": 0.1, "player_win_rate": 0.5, "rounds_played": 100
+    }}
+
+    first, error = store_task_result('stored_task', results_data, sim.id)
+    second, _ = store_task_result('stored_task', results_data, sim.id)
+    assert error is None and first.id == second.id
+    assert db.session.query(Result).filter_by(task_id='stored_task').count() == 1
+
+    executor = MagicMock()
+    client.application.extensions['simulation_executor'] = executor
+    response = client.get(url_for('main.task_status', task_id='stored_task'))
+    assert response.get_json()['result_url'] == url_for('main.result_page', result_id=first.id, _external=False)
+    executor.result.assert_not_called()
+
+def test_result_page_charts_the_stored_trajectory(client):
+    """
+    Tests that the bankroll trajectory from the engine is stored in its typed
+    column and charted on the result page without any hand-history file.
+    """
+    import numpy as np
+    from blackjack_simulator.models import Simulation, Player, Casino, PlayingStrategy, BettingStrategy
+    from blackjack_simulator.results import store_task_result
+    from blackjack_simulator.simulation import run_simulation
+    from blackjack_simulator.app import db
+
+    sim = Simulation(
+        title="Test Sim Risk", task_id='risk_task',
+        player=Player.query.first(), casino=Casino.query.first(),
+        playing_strategy=PlayingStrategy.query.first(), betting_strategy=BettingStrategy.query.first()
+    )
+    db.session.add(sim)
+    db.session.commit()
+    outcomes = run_simulation(1000, 20000, seed=8)
+    result, _ = store_task_result('risk_task', {'default_player': outcomes}, sim.id)
+
+    assert 'bankroll_trajectory' not in json.loads(result.outcomes)
+    assert result.risk_of_ruin == outcomes['risk_of_ruin']
+    assert np.array_equal(result.trajectory()['bankroll'], outcomes['bankroll_trajectory'])
+    page = client.get(url_for('main.result_page', result_id=result.id)).get_data(as_text=True)
+    assert '<polyline' in page and 'Risk of Ruin' in page
+    data = client.get(url_for('main.api_result_trajectory', result_id=result.id)).get_json()
+    assert data['rounds'][-1] == 20000
+
+def _default_form(iterations):
+    from blackjack_simulator.models import Player, Casino, PlayingStrategy, BettingStrategy
+    return {
+        'player_id': Player.query.filter_by(name='default_player').first().id,
+        'casino_id': Casino.query.filter_by(name='default_casino').first().id,
+        'playing_strategy_id': PlayingStrategy.query.filter_by(name='basic_strategy').first().id,
+        'betting_strategy_id': BettingStrategy.query.filter_by(name='flat_bet').first().id,
+        'iterations': iterations
+    }
+
+def _store_result(sim, iterations):
+    from blackjack_simulator.models import Result
+    from blackjack_simulator.app import db
+    result = Result(
+        simulation_id=sim.id, player_name='default_player', casino_name='default_casino',
+        starting_bankroll=1000, iterations=iterations, rounds_played=iterations,
+        outcomes=json.dumps({'final_bankroll': 900.0, 'net_gain_loss': -100.0, 'total_wagered': 1000.0 * iterations / 100,
+                             'player_edge': -0.01, 'player_win_rate': 0.45, 'rounds_played': iterations}),
+        config_hash=sim.config_hash, config_family_hash=sim.config_family_hash
+    )
+    db.session.add(result)
+    db.session.commit()
+    return result
+
+def test_identical_config_reuses_stored_result(client, mock_celery_task):
+    """
+    Tests that rerunning an identical seeded configuration redirects to the
+    stored result instead of sending another task, without touching the
+    Simulation's last run, and that unseeded runs are always played.
+    """
+    from blackjack_simulator.models import Simulation
+    from blackjack_simulator.app import db
+
+    sim = Simulation(title="Cached Sim")
+    db.session.add(sim)
+    db.session.commit()
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=dict(_default_form(100), seed='77'))
+    stored = _store_result(sim, 100)
+    sim.task_id, sim.config_hash = 'last_task', 'last_hash'
+    db.session.commit()
+
+    response = client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=dict(_default_form(100), seed='77'))
+
+    assert mock_celery_task.call_count == 1
+    assert response.location == url_for('main.result_page', result_id=stored.id, _external=False)
+    sim = db.session.get(Simulation, sim.id)
+    assert (sim.task_id, sim.config_hash, sim.seed) == ('last_task', 'last_hash', 77)
+
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=_default_form(100))
+    assert mock_celery_task.call_count == 2
+
+def test_longer_run_only_plays_missing_rounds(client, mock_celery_task):
+    """
+    Tests that a longer run of an already stored configuration only sends the
+    missing rounds to the workers.
+    """
+    from blackjack_simulator.models import Simulation
+    from blackjack_simulator.app import db
+
+    sim = Simulation(title="Top-up Sim")
+    db.session.add(sim)
+    db.session.commit()
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=dict(_default_form(100), seed='77'))
+    stored = _store_result(sim, 100)
+
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=dict(_default_form(250), seed='77'))
+
+    sent_config = json.loads(mock_celery_task.call_args.kwargs['args'][0])
+    assert sent_config['iterations'] == 150
+    assert db.session.get(Simulation, sim.id).base_result_id == stored.id
+
+def test_multi_seat_run_stores_a_result_per_seat(client, mock_celery_task):
+    """
+    Tests that extra seats chosen on the run form travel with the task, that
+    the task plays them at one table, and that every seat gets its own Result.
+    """
+    from blackjack_simulator.models import Simulation, Player, Result
+    from blackjack_simulator.celery_worker import run_jost_simulation_task
+    from blackjack_simulator.results import store_task_result
+    from blackjack_simulator.app import db
+
+    second = Player(name='second_player', bankroll=500)
+    db.session.add(second)
+    sim = Simulation(title="Table Sim")
+    db.session.add(sim)
+    db.session.commit()
+    form = _default_form(2000)
+    form.update({
+        'seat_player_id': [second.id, '', form['player_id']],
+        'seat_playing_strategy_id': [form['playing_strategy_id']] * 3,
+        'seat_betting_strategy_id': [form['betting_strategy_id']] * 3,
+    })
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=form)
+
+    sent_config = json.loads(mock_celery_task.call_args.kwargs['args'][0])
+    assert [seat['player']['name'] for seat in sent_config['seats']] == ['second_player', 'default_player']
+    results_data = run_jost_simulation_task.run(dict(sent_config, seed=5))
+    assert list(results_data) == ['default_player (seat 1)', 'second_player', 'default_player (seat 3)']
+
+    sim = db.session.get(Simulation, sim.id)
+    sim.task_id = 'table_task'
+    db.session.commit()
+    first, error = store_task_result('table_task', results_data, sim.id)
+    assert error is None and first.seat == 1
+    store_task_result('table_task', results_data, sim.id)
+    rows = db.session.query(Result).filter_by(task_id='table_task').order_by(Result.seat).all()
+    assert [(r.seat, r.starting_bankroll) for r in rows] == [(1, 1000), (2, 500), (3, 1000)]
+    assert all(r.rounds_played == 2000 for r in rows)
+
+    response = client.get(url_for('main.task_status', task_id='table_task'))
+    assert response.get_json()['result_url'] == url_for('main.result_page', result_id=first.id, _external=False)
+    page = client.get(url_for('main.result_page', result_id=first.id)).get_data(as_text=True)
+    assert 'second_player' in page and 'default_player (seat 3)' in page
+
+def test_bad_target_precision_is_rejected(client, mock_celery_task):
+    """
+    Tests that a target precision that is not a positive, finite percentage
+    sends the user back to the form instead of failing the request.
+    """
+    from blackjack_simulator.models import Simulation
+    from blackjack_simulator.app import db
+
+    sim = Simulation(title="Precision Sim")
+    db.session.add(sim)
+    db.session.commit()
+    for precision in ('abc', '0', '-0.1', 'nan', 'inf'):
+        response = client.post(url_for('main.run_simulation_action', simulation_id=sim.id),
+                               data=dict(_default_form(100), target_std_error=precision), follow_redirects=True)
+        assert b'The target precision must be a positive percentage.' in response.data
+    assert mock_celery_task.call_count == 0
+    assert db.session.get(Simulation, sim.id).target_std_error is None
+
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=dict(_default_form(100), target_std_error='0.5'))
+    assert json.loads(mock_celery_task.call_args.kwargs['args'][0])['target_std_error'] == 0.005
+
+def test_extra_seats_are_checked_and_get_precision_and_capture(client, mock_celery_task):
+    """
+    Tests that extra seats with malformed or unknown ids are rejected on the
+    form, and that a multi-seat run sends its target precision and capture.
+    """
+    from blackjack_simulator.models import Simulation
+    from blackjack_simulator.app import db
+
+    sim = Simulation(title="Checked Table Sim")
+    db.session.add(sim)
+    db.session.commit()
+    form = _default_form(2000)
+    for player_id, playing_strategy_id, message in (('abc', form['playing_strategy_id'], b'seat 2 needs a player'),
+                                                    (form['player_id'], '', b'seat 2 needs a player'),
+                                                    (999, form['playing_strategy_id'], b'seat 2 refers to a player')):
+        response = client.post(url_for('main.run_simulation_action', simulation_id=sim.id), follow_redirects=True,
+                               data=dict(form, seat_player_id=[player_id], seat_playing_strategy_id=[playing_strategy_id],
+                                         seat_betting_strategy_id=[form['betting_strategy_id']]))
+        assert b'Invalid extra seat: ' + message in response.data
+    assert mock_celery_task.call_count == 0
+
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=dict(
+        form, seat_player_id=[form['player_id']], seat_playing_strategy_id=[form['playing_strategy_id']],
+        seat_betting_strategy_id=[form['betting_strategy_id']], target_std_error='0.5', capture_last_n='10'))
+    sent_config = json.loads(mock_celery_task.call_args.kwargs['args'][0])
+    assert len(sent_config['seats']) == 1
+    assert (sent_config['target_std_error'], sent_config['hand_capture']) == (0.005, {'last_n': 10})
+
+def test_every_run_records_the_seed_that_reproduces_it(client, mock_celery_task):
+    """
+    Tests that a blank seed draws a fresh one, an explicit seed is sent as
+    given, both are recorded on the Simulation and its Result, and a top-up
+    plays a child stream of the seed and records the result it extends.
+    """
+    from blackjack_simulator.models import Simulation
+    from blackjack_simulator.results import store_task_result
+    from blackjack_simulator.simulation import continuation_seed, shard_seeds, spawn_seed
+    from blackjack_simulator.celery_worker import build_shard_configs
+    from blackjack_simulator.app import db
+
+    sim = Simulation(title="Seeded Sim")
+    db.session.add(sim)
+    db.session.commit()
+    sent_seeds = []
+    for seed in ('', '', '1234'):
+        client.post(url_for('main.run_simulation_action', simulation_id=sim.id),
+                    data=dict(_default_form(100), seed=seed, force_rerun='true'))
+        sent_seeds.append(json.loads(mock_celery_task.call_args.kwargs['args'][0])['seed'])
+        assert db.session.get(Simulation, sim.id).seed == sent_seeds[-1]
+    assert sent_seeds[0] != sent_seeds[1] and sent_seeds[2] == 1234
+
+    response = client.post(url_for('main.run_simulation_action', simulation_id=sim.id),
+                           data=dict(_default_form(100), seed='-5'))
+    assert mock_celery_task.call_count == 3
+    assert response.location == url_for('main.run_simulation_page', simulation_id=sim.id, _external=False)
+
+    sim = db.session.get(Simulation, sim.id)
+    sim.task_id = 'seeded_task'
+    db.session.commit()
+    result, _ = store_task_result('seeded_task', {"default_player": {
+        "final_bankroll": 1000.0, "net_gain_loss": 0.0, "total_wagered": 1000.0,
+        "player_edge": 0.0, "player_win_rate": 0.5, "rounds_played": 100
+    }}, sim.id)
+    assert result.seed == 1234
+    assert 'Seed:</strong> 1234' in client.get(url_for('main.result_page', result_id=result.id)).get_data(as_text=True)
+
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=dict(_default_form(250), seed='1234'))
+    sent_config = json.loads(mock_celery_task.call_args.kwargs['args'][0])
+    assert sent_config['iterations'] == 150
+    assert sent_config['seed'] == continuation_seed(1234, 100)
+    sim = db.session.get(Simulation, sim.id)
+    assert sim.seed == 1234 and sim.base_result_id == result.id
+
+    # The topped-up result keeps its lineage instead of claiming the base result's seed
+    sim.task_id = 'top_up_task'
+    db.session.commit()
+    topped_up, _ = store_task_result('top_up_task', {"default_player": {
+        "final_bankroll": 1000.0, "net_gain_loss": 0.0, "total_wagered": 1500.0,
+        "player_edge": 0.0, "player_win_rate": 0.5, "rounds_played": 150
+    }}, sim.id)
+    assert (topped_up.base_result_id, topped_up.seed, topped_up.rounds_played) == (result.id, continuation_seed(1234, 100), 250)
+    page = client.get(url_for('main.result_page', result_id=topped_up.id)).get_data(as_text=True)
+    assert f'result {result.id}</a>, extra rounds seeded with {continuation_seed(1234, 100)}' in page
+
+    shards = build_shard_configs(dict(sent_config, iterations=1000, seed=1234), max_shards=4, min_rounds_per_shard=250)
+    assert [c['seed'] for c in shards] == shard_seeds(4, 1234) == [spawn_seed(1234, i) for i in range(4)]
+
+def test_aborting_a_local_run_stops_its_running_shard(client, mock_celery_task):
+    """
+    Tests that a running local shard reports its progress before it finishes,
+    and that aborting the task stops it with the rounds played so far, like
+    an aborted Celery task.
+    """
+    import time
+    from blackjack_simulator.executors import LocalExecutor
+    from blackjack_simulator.models import Simulation
+    from blackjack_simulator.app import db
+
+    sim = Simulation(title="Abort Sim")
+    db.session.add(sim)
+    db.session.commit()
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=_default_form(1000))
+    sent_config = json.loads(mock_celery_task.call_args.kwargs['args'][0])
+
+    executor = LocalExecutor(max_workers=1)
+    task = executor.submit(dict(sent_config, iterations=10 ** 9, seed=5))
+    try:
+        while not (task.progress() or {}).get('rounds_done'):
+            time.sleep(0.05)
+        assert task.state == 'STARTED' and task.progress()['total_rounds'] == 10 ** 9
+        assert executor.abort(task.id)
+        outcomes = task.get(timeout=60)['default_player']
+        assert outcomes['stopped_early'] and 0 < outcomes['rounds_played'] < 10 ** 9
+        assert task.state == 'SUCCESS'
+    finally:
+        executor.pool.shutdown(cancel_futures=True)
+        executor.manager.shutdown()
+
+def test_aborting_a_celery_chord_merges_its_partial_shards(client, monkeypatch, mock_celery_task):
+    """
+    Tests that aborting a sharded Celery run leaves stop keys in the result
+    backend instead of revoking the shards, so each shard returns the rounds it
+    played and the chord merges them into one partial result.
+    """
+    from blackjack_simulator.celery_worker import (celery, run_jost_simulation_task, merge_simulation_shards_task,
+                                                   build_shard_configs, stop_key)
+    from blackjack_simulator.models import Simulation
+    from blackjack_simulator.app import db
+
+    class FakeRedis:
+        def __init__(self):
+            self.keys = {}
+        def set(self, key, value, ex=None):
+            self.keys[key] = value
+        def exists(self, key):
+            return int(key in self.keys)
+    redis = FakeRedis()
+    monkeypatch.setattr(celery.backend, 'client', redis, raising=False)
+    monkeypatch.setattr(celery.control, 'revoke', MagicMock(side_effect=AssertionError('shards must not be revoked')))
+    reports = []
+    monkeypatch.setattr(run_jost_simulation_task, 'update_state', lambda state, meta: reports.append(meta))
+
+    sim = Simulation(title="Abort Chord Sim")
+    db.session.add(sim)
+    db.session.commit()
+    client.post(url_for('main.run_simulation_action', simulation_id=sim.id), data=_default_form(1000))
+    sent_config = json.loads(mock_celery_task.call_args.kwargs['args'][0])
+    shard_configs = build_shard_configs(dict(sent_config, iterations=10 ** 9, seed=5), 2, 1)
+    sim = db.session.get(Simulation, sim.id)
+    sim.task_id, sim.shard_task_ids = 'chord-task', json.dumps(['shard-0', 'shard-1'])
+    db.session.commit()
+
+    response = client.post(url_for('main.abort_simulation', simulation_id=sim.id), follow_redirects=True)
+    assert b'Stopping simulation' in response.data
+    assert set(redis.keys) == {stop_key('shard-0'), stop_key('shard-1')}
+
+    shard_results = [run_jost_simulation_task.apply(args=[json.dumps(shard_config)], task_id=f'shard-{i}').get()
+                     for i, shard_config in enumerate(shard_configs)]
+    merged = merge_simulation_shards_task.apply(args=[shard_results], kwargs={'starting_bankroll': 1000}).get()
+    outcomes = merged['default_player']
+    assert outcomes['stopped_early'] and 0 < outcomes['rounds_played'] < 10 ** 9
+    assert not reports  # each shard stopped at its first progress report
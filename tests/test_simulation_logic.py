@@ -1,11 +1,231 @@
+import json
+import os
+import pytest
+import numpy as np
 
-from blackjack_simulator.simulation import run_simulation
+from blackjack_simulator.counting import COUNTING_SYSTEMS, counting_system
+from blackjack_simulator.simulation import run_simulation, run_paired_simulation, run_table_simulation, BetRamp, compile_strategy, HARD, SOFT, PAIR, STAND, DOUBLE, SPLIT, SURRENDER, SURRENDER_STAND, SURRENDER_SPLIT, TRAJECTORY_KEYS
+
+STRATEGY_PATH = os.path.join(os.path.dirname(__file__), '..', 'blackjack_simulator', 'data', 'strategies', 'h17_basic_strategy.json')
+
+def load_strategy():
+    with open(STRATEGY_PATH) as f:
+        return json.load(f)
 
 def test_run_simulation():
     """
-    Tests the placeholder run_simulation function.
+    Tests that the vectorized engine plays the requested number of rounds
+    and returns the outcome keys rendered on the result page.
     """
     bankroll = 1000
     iterations = 100
-    result = run_simulation(bankroll, iterations)
-    assert result == []
+    result = run_simulation(bankroll, iterations, seed=42)
+    for key in ('final_bankroll', 'net_gain_loss', 'total_wagered', 'player_edge'):
+        assert key in result
+    assert result['rounds_played'] == iterations
+    assert result['final_bankroll'] == bankroll + result['net_gain_loss']
+    assert result['total_wagered'] >= 10 * iterations
+
+def test_run_simulation_is_reproducible_with_seed():
+    first = run_simulation(1000, 5000, strategy=load_strategy(), seed=7)
+    second = run_simulation(1000, 5000, strategy=load_strategy(), seed=7)
+    for key in TRAJECTORY_KEYS:
+        assert np.array_equal(first.pop(key), second.pop(key))
+    assert first == second
+
+def test_basic_strategy_edge_is_close_to_known_value():
+    """Basic strategy against 6-deck H17 should land within a fraction of a percent of -0.6%."""
+    result = run_simulation(1000, 200000, strategy=load_strategy(), seed=1)
+    assert -0.02 < result['player_edge'] < 0.01
+
+def test_compile_strategy_expands_ranges():
+    table = compile_strategy(load_strategy())
+    assert table[HARD, 18, 11] == STAND
+    assert table[HARD, 11, 6] == DOUBLE
+    assert table[HARD, 16, 10] == SURRENDER
+    assert table[SOFT, 19, 6] == DOUBLE
+    assert table[PAIR, 11, 4] == SPLIT
+
+
+def test_blocked_surrender_plays_the_cells_no_surrender_action():
+    """Hard 17 vs A under H17 surrenders where allowed and stands, not hits, where it is not."""
+    def with_cells(hard_17, pair_8):
+        strategy = load_strategy()
+        strategy['hard_totals'] = dict(strategy['hard_totals'], **{'17': {'2-10': 'S', '11': hard_17}})
+        strategy['pairs'] = dict(strategy['pairs'], **{'8': {'2-10': 'P', '11': pair_8}})
+        return strategy
+
+    assert compile_strategy(with_cells('Rs', 'Rp'))[HARD, 17, 11] == SURRENDER_STAND
+    assert compile_strategy(with_cells('R', 'Rp'))[PAIR, 8, 11] == SURRENDER_SPLIT
+    no_surrender = {'dealer_stands_on_soft_17': False, 'allow_late_surrender': False}
+    standing = run_simulation(1000, 20000, rules=no_surrender, strategy=with_cells('S', 'P'), seed=8)
+    for cells in (('R', 'Rp'), ('Rs', 'Rp')):
+        blocked = run_simulation(1000, 20000, rules=no_surrender, strategy=with_cells(*cells), seed=8)
+        assert blocked['net_gain_loss'] == standing['net_gain_loss']
+        assert blocked['total_wagered'] == standing['total_wagered']
+    hitting = run_simulation(1000, 20000, rules=no_surrender, strategy=with_cells('Rh', 'Rp'), seed=8)
+    assert hitting['net_gain_loss'] != standing['net_gain_loss']
+
+def test_merge_outcomes_recomputes_edge():
+    from blackjack_simulator.simulation import merge_outcomes, plan_shards
+    shards = [run_simulation(1000, 3000, seed=seed) for seed in (1, 2, 3)]
+    merged = merge_outcomes(shards, 1000)
+    assert merged['rounds_played'] == 9000
+    assert merged['total_wagered'] == sum(s['total_wagered'] for s in shards)
+    assert merged['player_edge'] == merged['net_gain_loss'] / merged['total_wagered']
+    assert plan_shards(10, 4, 1) == [3, 3, 2, 2]
+    assert plan_shards(10, 4, 100) == [10]
+
+def test_compiled_strategy_is_cached_by_content():
+    from blackjack_simulator.simulation import get_compiled_strategy, strategy_fingerprint
+    strategy = load_strategy()
+    reordered = dict(reversed(list(strategy.items())))
+    assert strategy_fingerprint(strategy) == strategy_fingerprint(reordered)
+    table = get_compiled_strategy(strategy)
+    assert get_compiled_strategy(reordered) is table
+    assert not table.flags.writeable
+
+def test_progress_callback_and_early_stop():
+    reports = []
+
+    class Stop(Exception):
+        pass
+
+    def callback(progress):
+        reports.append(progress)
+        if len(reports) == 2:
+            raise Stop()
+
+    result = run_simulation(1000, 10 ** 7, lanes=1000, seed=3, progress_callback=callback,
+                            progress_interval=0.0, stop_exceptions=(Stop,))
+    assert result['stopped_early']
+    assert result['rounds_played'] == reports[-1]['rounds_done'] == 2000
+    assert reports[-1]['ci_low'] < reports[-1]['edge'] < reports[-1]['ci_high']
+
+def test_target_std_error_stops_when_converged():
+    result = run_simulation(1000, 10 ** 7, lanes=2000, seed=4, target_std_error=0.01)
+    assert result['converged']
+    assert result['rounds_played'] < 10 ** 7
+    assert result['edge_std_error'] <= 0.01
+
+def test_risk_statistics_from_one_pass():
+    result = run_simulation(2000, 200000, strategy=load_strategy(), seed=5)
+    # Flat-betting basic strategy: about 1.15 units of standard deviation per round
+    assert 1.05 < result['std_dev_per_round_units'] < 1.25
+    trajectory = result['bankroll_trajectory']
+    assert trajectory.dtype == np.float32 and trajectory.size <= 501
+    assert result['trajectory_rounds'][-1] == 200000
+    assert trajectory[-1] == result['final_bankroll']
+    assert result['max_drawdown'] >= trajectory.max() - trajectory[-1]
+    # Negative expectation: ruin is certain in the long run
+    assert result['risk_of_ruin'] == 1.0
+
+def test_risk_of_ruin_and_path_merge():
+    from blackjack_simulator.simulation import risk_of_ruin, merge_outcomes
+    assert risk_of_ruin(0.1, 100.0, 1000) == np.exp(-2.0)
+    assert risk_of_ruin(-0.1, 100.0, 1000) == 1.0
+
+    up = run_simulation(1000, 50000, strategy=load_strategy(), seed=6)
+    down = run_simulation(1000, 50000, strategy=load_strategy(), seed=7)
+    merged = merge_outcomes([up, down], 1000)
+    assert merged['rounds_played'] == 100000
+    assert merged['trajectory_rounds'][-1] == 100000
+    assert merged['bankroll_trajectory'][-1] == merged['final_bankroll']
+    # The second shard starts where the first ended, so its drop counts from the first shard's peak
+    assert merged['max_drawdown'] >= max(up['max_drawdown'], down['max_drawdown'])
+    assert merged['path_trough'] == min(up['path_trough'], up['net_gain_loss'] + down['path_trough'])
+    assert abs(merged['net_variance'] - (up['net_variance'] + down['net_variance']) / 2) < 5
+
+def test_paired_simulation_plays_identical_shoes():
+    rules = {'deck_count': 6, 'dealer_stands_on_soft_17': False, 'reshuffle_penetration': 0.75}
+    configs = [
+        {'rules': rules, 'strategy': load_strategy(), 'min_bet': 10, 'bet_ramp': {}},
+        {'rules': rules, 'strategy': load_strategy(), 'min_bet': 10, 'bet_ramp': {}},
+        {'rules': dict(rules, dealer_stands_on_soft_17=True), 'strategy': load_strategy(), 'min_bet': 10, 'bet_ramp': {}},
+    ]
+    baseline, same, s17 = run_paired_simulation(1000, 200000, configs, seed=3)
+
+    # The same configuration on the same shoes plays the same hands
+    assert same['net_gain_loss'] == baseline['net_gain_loss']
+    assert same['paired_difference']['edge_difference'] == 0.0
+    assert 'paired_difference' not in baseline
+
+    diff = s17['paired_difference']
+    assert diff['shoes'] > 3000
+    # Pairing shrinks the standard error of the difference several-fold
+    assert diff['variance_reduction'] > 3
+    # Standing on soft 17 is worth about 0.2% to the player
+    assert abs(diff['edge_difference'] - 0.002) < 4 * diff['edge_difference_std_error']
+    assert diff['ci_low'] < diff['edge_difference'] < diff['ci_high']
+    repeat = run_paired_simulation(1000, 200000, configs, seed=3)
+    assert repeat[2]['paired_difference'] == diff
+
+def test_paired_simulation_needs_one_deck_count():
+    configs = [{'rules': {'deck_count': 6}}, {'rules': {'deck_count': 2}}]
+    with pytest.raises(ValueError):
+        run_paired_simulation(1000, 1000, configs)
+
+def test_table_simulation_seats_share_one_shoe():
+    seat = {'bankroll': 1000, 'strategy': load_strategy(), 'min_bet': 10, 'bet_ramp': {}}
+    alone = run_table_simulation(5000, None, [seat], seed=7)[0]
+    single = run_simulation(1000, 5000, strategy=load_strategy(), seed=7)
+    for key in TRAJECTORY_KEYS:
+        assert np.array_equal(alone.pop(key), single.pop(key))
+    assert alone == single
+
+    counter = dict(seat, bankroll=5000, bet_ramp={'-100': 1, '2': 4})
+    seats = run_table_simulation(100000, None, [seat, counter, seat], seed=7)
+    assert [s['rounds_played'] for s in seats] == [100000] * 3
+    # Identical players in different seats see different cards
+    assert seats[0]['net_gain_loss'] != seats[2]['net_gain_loss']
+    assert seats[1]['total_wagered'] > seats[0]['total_wagered']
+    assert seats[1]['final_bankroll'] == 5000 + seats[1]['net_gain_loss']
+    for outcomes in seats:
+        assert -0.03 < outcomes['player_edge'] < 0.02
+
+    with pytest.raises(ValueError):
+        run_table_simulation(100, None, [seat] * 8)
+
+def test_table_simulation_converges_and_captures_every_seat():
+    seat = {'bankroll': 1000, 'strategy': load_strategy(), 'min_bet': 10, 'bet_ramp': {}}
+    seats = run_table_simulation(10 ** 7, None, [seat, seat], lanes=2000, seed=4, target_std_error=0.01,
+                                 hand_capture={'last_n': 20})
+    assert all(s['converged'] and s['target_std_error'] == 0.01 for s in seats)
+    assert seats[0]['edge_std_error'] <= 0.01 and seats[0]['rounds_played'] < 10 ** 7
+    assert [len(s['hand_history']) for s in seats] == [20, 20]
+    assert seats[0]['hand_history'] != seats[1]['hand_history']
+
+    # A lone seat captures the same hands as the single-player engine
+    policy = {'sample_rate': 0.05}
+    alone = run_table_simulation(5000, None, [seat], seed=9, hand_capture=policy)[0]
+    assert alone['hand_history'] == run_simulation(1000, 5000, strategy=load_strategy(), seed=9, hand_capture=policy)['hand_history']
+
+def test_bet_ramp_lookup_matches_the_tiers():
+    ramp = BetRamp(10, {'-100': 1, '1': 2, '3': 4, '5': 8})
+    assert ramp.table is not None
+    counts = np.array([-200.0, -3.5, 0.99, 1.0, 2.7, 3.0, 4.99, 5.0, 12.0])
+    expected = [10, 10, 10, 20, 20, 40, 40, 80, 80]
+    assert ramp.bets(counts).tolist() == expected
+    assert [ramp.bet(c) for c in counts] == expected
+
+    fractional = BetRamp(10, [{'count_threshold': 1.5, 'bet_multiplier': 3}])
+    assert fractional.table is None
+    assert fractional.bets(np.array([1.49, 1.5])).tolist() == [10, 30]
+    assert [fractional.bet(1.49), fractional.bet(1.5)] == [10, 30]
+
+def test_counting_systems():
+    for key, system in COUNTING_SYSTEMS.items():
+        assert (system.deck_total() == 0) == system.balanced
+    assert counting_system('ko').initial_count(6) == -20
+    with pytest.raises(ValueError):
+        counting_system('red_seven')
+
+    ramp = {'-100': 1, '2': 8}
+    hi_lo = run_simulation(1000, 50000, strategy=load_strategy(), bet_ramp=ramp, seed=11)
+    zen = run_simulation(1000, 50000, strategy=load_strategy(), bet_ramp=ramp, seed=11, counting_system='zen')
+    ko = run_simulation(1000, 50000, strategy=load_strategy(), bet_ramp=ramp, seed=11, counting_system='ko')
+    # Same cards, different counts: only the bets change
+    assert hi_lo['rounds_played'] == zen['rounds_played'] == ko['rounds_played']
+    assert len({hi_lo['total_wagered'], zen['total_wagered'], ko['total_wagered']}) == 3
+    # A level-two count reaches +2 more often than Hi-Lo
+    assert zen['total_wagered'] > hi_lo['total_wagered']
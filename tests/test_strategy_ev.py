@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import pytest
+from flask import url_for
+
+from blackjack_simulator.simulation import compile_strategy, DOUBLE, SURRENDER, SPLIT, NO_ACTION
+from blackjack_simulator.strategy_ev import (expected_value, evaluate_strategy, dealer_outcomes, optimal_strategy,
+                                             EV_ERROR_BAND)
+
+STRATEGY_PATH = os.path.join(os.path.dirname(__file__), '..', 'blackjack_simulator', 'data', 'strategies', 'h17_basic_strategy.json')
+H17_RULES = {'deck_count': 6, 'dealer_stands_on_soft_17': False, 'blackjack_payout': 1.5,
+             'allow_late_surrender': True, 'allow_early_surrender': False, 'allow_resplit_to_hands': 4,
+             'allow_double_after_split': True, 'allow_double_on_any_two': True, 'reshuffle_penetration': 0.75,
+             'offer_insurance': False, 'dealer_checks_for_blackjack': True}
+
+@pytest.fixture
+def basic_table():
+    with open(STRATEGY_PATH) as f:
+        return compile_strategy(json.load(f))
+
+def test_dealer_outcomes_are_a_distribution():
+    for upcard in (2, 6, 10, 11):
+        outcome = dealer_outcomes(6, True, True, upcard)
+        assert outcome.sum() == pytest.approx(1.0)
+        assert outcome[6] == 0  # peeked: no blackjack left
+    # The dealer busts most often showing a 6 and least often showing an ace
+    assert dealer_outcomes(6, False, True, 6)[5] == pytest.approx(0.42, abs=0.01)
+    assert dealer_outcomes(6, False, True, 11)[5] < 0.2
+
+def test_basic_strategy_ev_matches_published_figures(basic_table):
+    optimal = expected_value(H17_RULES)
+    assert -0.0075 < optimal < -0.0045
+    assert optimal - 0.001 < expected_value(H17_RULES, basic_table) <= optimal
+    # Standing on soft 17 and paying 6:5 move the edge the well-known amounts
+    assert expected_value(dict(H17_RULES, dealer_stands_on_soft_17=True)) - optimal == pytest.approx(0.002, abs=0.001)
+    assert expected_value(dict(H17_RULES, blackjack_payout=1.2)) - optimal == pytest.approx(-0.0136, abs=0.001)
+
+def test_ev_matches_published_and_simulated_values(basic_table):
+    # Published off-the-top edges: 6D S17 DAS -0.40%, 1D S17 DAS +0.15%
+    s17 = dict(H17_RULES, dealer_stands_on_soft_17=True, allow_late_surrender=False)
+    assert expected_value(s17) == pytest.approx(-0.0040, abs=0.0003)
+    assert expected_value(dict(s17, deck_count=1)) == pytest.approx(0.0015, abs=0.0003)
+    # 10M rounds of the bundled chart reshuffled every round: -0.591% +- 0.036% per initial bet
+    assert expected_value(H17_RULES, basic_table) == pytest.approx(-0.00591, abs=EV_ERROR_BAND)
+    assert evaluate_strategy(H17_RULES, basic_table)['error_band'] == EV_ERROR_BAND
+
+def test_mimicking_the_dealer_costs_about_five_and_a_half_percent():
+    mimic = compile_strategy({'hard': {'4-16': {'2-11': 'H'}, '17-21': {'2-11': 'S'}},
+                              'soft': {'12-17': {'2-11': 'H'}, '18-21': {'2-11': 'S'}}, 'pairs': {}})
+    assert expected_value(H17_RULES, mimic) == pytest.approx(-0.057, abs=0.005)
+
+def test_bad_cells_are_flagged(basic_table):
+    table = basic_table.copy()
+    table[0, 12, 10] = compile_strategy({'hard': {'12': {'10': 'S'}}})[0, 12, 10]
+    table[2, 8, 10] = compile_strategy({'pairs': {'8': {'10': 'H'}}})[2, 8, 10]
+
+    report = evaluate_strategy(H17_RULES, table)
+
+    cells = {(c['section'], c['player'], c['dealer']): c for c in report['cells']}
+    assert cells['hard', 12, '10']['action'] == 'stand' and cells['hard', 12, '10']['best'] == 'hit'
+    assert cells['pairs', 8, '10']['best'] in ('split', 'surrender')
+    assert report['ev'] < expected_value(H17_RULES, basic_table)
+
+def test_editor_api_answers_in_milliseconds(client):
+    from blackjack_simulator.app import db
+    from blackjack_simulator.models import Casino
+    casino = Casino(name='Strip', is_default=False, **{k: v for k, v in H17_RULES.items()})
+    db.session.add(casino)
+    db.session.commit()
+    with open(STRATEGY_PATH) as f:
+        strategy = json.load(f)
+
+    client.post(url_for('management.api_strategy_ev'), json={'casino_id': casino.id, 'strategy': strategy})
+    started = time.perf_counter()
+    response = client.post(url_for('management.api_strategy_ev'), json={'casino_id': casino.id, 'strategy': strategy})
+    assert time.perf_counter() - started < 0.25
+
+    data = response.get_json()
+    assert data['casino'] == 'Strip'
+    assert data['ev'] <= data['optimal_ev']
+    assert all(cell['loss'] > 0 for cell in data['cells'])
+    assert client.post(url_for('management.api_strategy_ev'), json={'casino_id': 999, 'strategy': strategy}).status_code == 404
+
+def test_blocked_surrender_cells_are_valued_by_their_fallback():
+    rules = dict(H17_RULES, allow_late_surrender=False)
+    def ev(hard_17):
+        return expected_value(rules, compile_strategy({'hard': {'17': {'A': hard_17}}, 'soft': {}, 'pairs': {}}))
+    assert ev('R') == ev('Rs') == ev('S') != ev('H')
+    assert ev('Rh') == ev('H')
+
+def test_optimal_strategy_reaches_optimal_ev():
+    for rules in (H17_RULES, dict(H17_RULES, dealer_stands_on_soft_17=True, allow_late_surrender=False),
+                  dict(H17_RULES, deck_count=1, allow_double_on_any_two=False)):
+        strategy = optimal_strategy(rules)
+        assert expected_value(rules, compile_strategy(strategy)) == pytest.approx(expected_value(rules), abs=1e-4)
+    strategy = optimal_strategy(H17_RULES)
+    assert strategy['hard']['11']['A'] == 'd'  # H17 doubles 11 against an ace
+    assert strategy['pairs']['A']['10'] == 'p'
+    assert strategy['hard']['16']['10'] == 'u'
+
+def test_optimal_strategy_matches_the_published_h17_chart(basic_table):
+    # The bundled chart is the 6D H17 DAS chart without surrender or soft doubles against 4-6
+    optimal = compile_strategy(optimal_strategy(H17_RULES))
+    differences = {(section, player, upcard): int(optimal[section, player, upcard])
+                   for section in range(3) for player in range(2, 22) for upcard in range(2, 12)
+                   if optimal[section, player, upcard] != basic_table[section, player, upcard]
+                   and not (section == 2 and basic_table[section, player, upcard] == NO_ACTION
+                            and optimal[section, player, upcard] != SPLIT)}
+    assert differences == {
+        (0, 15, 10): SURRENDER, (0, 15, 11): SURRENDER, (0, 17, 11): SURRENDER, (2, 8, 11): SURRENDER,
+        (1, 13, 5): DOUBLE, (1, 13, 6): DOUBLE, (1, 14, 5): DOUBLE, (1, 14, 6): DOUBLE,
+        (1, 15, 4): DOUBLE, (1, 15, 5): DOUBLE, (1, 15, 6): DOUBLE,
+        (1, 16, 4): DOUBLE, (1, 16, 5): DOUBLE, (1, 16, 6): DOUBLE,
+    }
+
+def test_optimal_strategy_follows_the_deck_count():
+    s17 = dict(H17_RULES, dealer_stands_on_soft_17=True, allow_late_surrender=False)
+    cells = [('hard', '8', '5'), ('hard', '8', '6'), ('hard', '9', '2'), ('hard', '11', 'A'), ('soft', '17', '2'),
+             ('soft', '18', 'A'), ('pairs', '7', '10'), ('pairs', '6', '7'), ('pairs', '3', '8'), ('pairs', '4', '4')]
+    single = optimal_strategy(dict(s17, deck_count=1))
+    assert [single[section][player][dealer] for section, player, dealer in cells] == list('dddddssppp')
+    six = optimal_strategy(s17)
+    assert [six[section][player][dealer] for section, player, dealer in cells] == list('hhhhhhhhhh')
+
+def test_optimal_strategy_is_saved_for_a_casino(client, app):
+    from blackjack_simulator.app import db
+    from blackjack_simulator.models import Casino, PlayingStrategy
+    casino = Casino(name='Downtown', is_default=False, **dict(H17_RULES, dealer_stands_on_soft_17=True))
+    db.session.add(casino)
+    db.session.commit()
+
+    data = client.post(url_for('management.api_optimal_strategy', casino_id=casino.id)).get_json()
+    assert data['name'] == 'Downtown Optimal Strategy'
+    assert data['strategy']['soft']['19']['6'] == 's'  # only H17 doubles soft 19
+    assert compile_strategy(data['strategy']).shape == (3, 32, 12)
+
+    output = app.test_cli_runner().invoke(args=['optimal-strategy', 'Downtown']).output
+    assert "Saved playing strategy 'Downtown Optimal Strategy'" in output
+    assert PlayingStrategy.query.filter_by(name='Downtown Optimal Strategy').count() == 1
+
+    page = client.get(url_for('management.create_playing_strategy', casino_id=casino.id))
+    assert b'Optimal strategy for the rules at Downtown' in page.data
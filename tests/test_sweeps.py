@@ -0,0 +1,122 @@
+import json
+import pytest
+from flask import url_for
+
+from blackjack_simulator.sweeps import expand_values, expand_grid, complete_sweep_task, schedule_sweep
+
+@pytest.fixture(autouse=True)
+def setup_default_data(app):
+    from blackjack_simulator.app import db
+    from blackjack_simulator.models import Player, Casino, PlayingStrategy, BettingStrategy
+    player = Player(name='default_player', bankroll=1000, is_default=True)
+    casino = Casino(name='default_casino', is_default=True, deck_count=6, dealer_stands_on_soft_17=True, blackjack_payout=1.5, allow_late_surrender=True, allow_early_surrender=False, allow_resplit_to_hands=4, allow_double_after_split=True, allow_double_on_any_two=True, reshuffle_penetration=0.5, offer_insurance=True, dealer_checks_for_blackjack=True)
+    playing_strategy = PlayingStrategy(name='basic_strategy', is_default=True, hard_total_actions='{}', soft_total_actions='{}', pair_splitting_actions='{}')
+    betting_strategy = BettingStrategy(name='flat_bet', is_default=True, min_bet=10, bet_ramp='{}')
+    db.session.add_all([player, casino, playing_strategy, betting_strategy])
+    db.session.commit()
+
+def test_expand_values():
+    assert expand_values([1, 2, 6]) == [1, 2, 6]
+    assert expand_values({'start': 0.5, 'stop': 0.8, 'step': 0.1}) == [0.5, 0.6, 0.7, 0.8]
+    assert expand_values(1.5) == [1.5]
+
+def test_expand_grid_is_cartesian_product():
+    defaults = {'casino_id': 1, 'playing_strategy_id': 1, 'betting_strategy_id': 1}
+    grid = expand_grid({'rules': {'deck_count': [1, 2, 6], 'blackjack_payout': [1.5, 1.2]}}, defaults)
+    assert len(grid) == 6
+    assert (1, 1, 1, {'blackjack_payout': 1.2, 'deck_count': 2}) in grid
+
+def test_create_sweep_schedules_bounded_concurrency(client, mock_celery_task):
+    """
+    Tests that creating a sweep expands its grid and only starts as many
+    points as max_concurrency allows.
+    """
+    spec = {'title': 'Deck sweep', 'iterations': 1000, 'max_concurrency': 2,
+            'rules': {'deck_count': [1, 2, 4, 6, 8]}}
+    response = client.post(url_for('sweeps.api_create_sweep'), json=spec)
+
+    assert response.status_code == 201
+    assert response.get_json()['points'] == 5
+    assert mock_celery_task.call_count == 2
+    sent_rules = json.loads(mock_celery_task.call_args_list[0].kwargs['args'][0])['casino']['rules']
+    assert sent_rules['deck_count'] == 1
+
+def test_finished_points_schedule_the_next_ones_exactly_once(client, mock_celery_task):
+    from blackjack_simulator.app import db
+    from blackjack_simulator.models import Sweep
+
+    spec = {'iterations': 1000, 'max_concurrency': 2, 'rules': {'deck_count': [1, 2, 4, 6, 8]}}
+    sweep_id = client.post(url_for('sweeps.api_create_sweep'), json=spec).get_json()['id']
+    sweep = db.session.get(Sweep, sweep_id)
+
+    # Page views and repeated scheduling never submit a point twice or go past max_concurrency
+    client.get(url_for('sweeps.api_sweep', sweep_id=sweep_id))
+    client.get(url_for('sweeps.sweep_details', sweep_id=sweep_id))
+    schedule_sweep(sweep)
+    assert mock_celery_task.call_count == 2
+
+    first = json.loads(mock_celery_task.call_args_list[0].kwargs['args'][0])
+    assert mock_celery_task.call_args_list[0].kwargs['link'].task == 'jost_sweep_result_task'
+    outcomes = {'default_player': {'net_gain_loss': -5.0, 'total_wagered': 1000.0, 'player_edge': -0.005}}
+    complete_sweep_task(first['sweep_id'], first['sweep_point_ids'], outcomes)
+    complete_sweep_task(first['sweep_id'], first['sweep_point_ids'], outcomes)
+    assert mock_celery_task.call_count == 3
+    assert json.loads(mock_celery_task.call_args.kwargs['args'][0])['casino']['rules']['deck_count'] == 4
+
+    second = json.loads(mock_celery_task.call_args_list[1].kwargs['args'][0])
+    complete_sweep_task(second['sweep_id'], second['sweep_point_ids'], {'error': 'worker lost'})
+    states = [p['state'] for p in client.get(url_for('sweeps.api_sweep', sweep_id=sweep_id)).get_json()['points']]
+    assert states == ['SUCCESS', 'FAILURE', 'RUNNING', 'RUNNING', 'PENDING']
+
+def test_sweep_points_play_independent_streams_of_a_recorded_seed(client, mock_celery_task):
+    from blackjack_simulator.models import Sweep
+    from blackjack_simulator.simulation import spawn_seed
+
+    spec = {'iterations': 1000, 'max_concurrency': 2, 'rules': {'deck_count': [1, 2]}}
+    client.post(url_for('sweeps.api_create_sweep'), json=spec)
+
+    seed = json.loads(Sweep.query.one().spec)['seed']
+    sent_seeds = [json.loads(call.kwargs['args'][0])['seed'] for call in mock_celery_task.call_args_list]
+    assert sent_seeds == [spawn_seed(seed, 0), spawn_seed(seed, 1)]
+
+def test_sweep_points_deal_from_the_pool_for_their_own_deck_count(client, app, tmp_path, mock_celery_task):
+    from blackjack_simulator.shoe_pool import generate_shoe_pool, pool_path
+
+    app.config['SHOE_POOL_DIR'] = str(tmp_path)
+    generate_shoe_pool(pool_path(str(tmp_path), 6), 10, 6, seed=1)
+    generate_shoe_pool(pool_path(str(tmp_path), 2), 10, 2, seed=1)
+    spec = {'iterations': 1000, 'max_concurrency': 3, 'rules': {'deck_count': [1, 2, 6]}}
+    client.post(url_for('sweeps.api_create_sweep'), json=spec)
+
+    sent_pools = [json.loads(call.kwargs['args'][0]).get('shoe_pool') for call in mock_celery_task.call_args_list]
+    assert sent_pools == [None, pool_path(str(tmp_path), 2), pool_path(str(tmp_path), 6)]
+
+def test_create_sweep_rejects_unknown_rules(client):
+    response = client.post(url_for('sweeps.api_create_sweep'), json={'rules': {'table_color': ['green']}})
+    assert response.status_code == 400
+
+def test_paired_sweep_runs_every_point_on_one_shoe_sequence(client, mock_celery_task):
+    from blackjack_simulator.celery_worker import run_jost_simulation_task
+
+    spec = {'title': 'S17 vs H17', 'iterations': 20000, 'paired': True, 'seed': 11,
+            'rules': {'dealer_stands_on_soft_17': [False, True], 'blackjack_payout': [1.5, 1.2]}}
+    response = client.post(url_for('sweeps.api_create_sweep'), json=spec)
+
+    assert response.status_code == 201
+    assert mock_celery_task.call_count == 1
+    sent = json.loads(mock_celery_task.call_args.kwargs['args'][0])
+    assert len(sent['paired_configs']) == 4
+
+    complete_sweep_task(sent['sweep_id'], sent['sweep_point_ids'], run_jost_simulation_task.run(sent))
+    points = client.get(url_for('sweeps.api_sweep', sweep_id=response.get_json()['id'])).get_json()['points']
+
+    assert [p['state'] for p in points] == ['SUCCESS'] * 4
+    assert points[0]['outcomes'].get('paired_difference') is None
+    # Points vary blackjack_payout first: point 2 is 6:5 with the baseline's H17
+    assert points[2]['rule_overrides'] == {'blackjack_payout': 1.2, 'dealer_stands_on_soft_17': False}
+    assert points[2]['outcomes']['paired_difference']['edge_difference'] < 0
+    assert b'Edge vs #0' in client.get(url_for('sweeps.sweep_details', sweep_id=1)).data
+
+def test_paired_sweep_rejects_mixed_deck_counts(client):
+    response = client.post(url_for('sweeps.api_create_sweep'), json={'paired': True, 'rules': {'deck_count': [1, 6]}})
+    assert response.status_code == 400